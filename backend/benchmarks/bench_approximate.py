@@ -0,0 +1,59 @@
+"""Memory and accuracy comparison of exact and approximate word counting.
+
+Counts a page with a very large vocabulary (e.g. generated IDs or hashes mixed
+into ordinary text) exactly and with bounded numbers of distinct words, and
+reports peak memory, time and how many of the exact top 10 words were kept.
+
+Run with: pipenv run python benchmarks/bench_approximate.py
+"""
+import tracemalloc
+
+from common import best_of, generate_text, report
+
+from libs.counting import count_information
+
+
+def generate_huge_vocabulary_html(num_paragraphs, unique_per_paragraph=200):
+    paragraphs = "\n".join(
+        f"<p>{generate_text(200, i)} "
+        + " ".join(f"id{i}x{j}" for j in range(unique_per_paragraph))
+        + "</p>"
+        for i in range(num_paragraphs)
+    )
+    return f"<html><body>\n{paragraphs}\n</body></html>"
+
+
+def peak_memory(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    html = generate_huge_vocabulary_html(500)
+    exact = count_information(html)
+    exact_top = {word for word, _ in exact["words_list"][0:10]}
+    print(f"{exact['word_count']:,} words, {len(exact['words_list']):,} distinct")
+
+    baseline = best_of(lambda: count_information(html), repeat=3)
+    memory = peak_memory(lambda: count_information(html))
+    report("exact", baseline)
+    print(f"{'':<40} peak {memory / 1_000:>9.1f} kB")
+
+    for max_words in (10_000, 1_000, 100):
+        approximate = count_information(html, max_words=max_words)
+        assert approximate["word_count"] == exact["word_count"]
+        kept = exact_top & {word for word, _ in approximate["words_list"][0:10]}
+        seconds = best_of(
+            lambda: count_information(html, max_words=max_words), repeat=3)
+        memory = peak_memory(lambda: count_information(html, max_words=max_words))
+        report(f"approximate max_words={max_words:,}", seconds, baseline)
+        print(f"{'':<40} peak {memory / 1_000:>9.1f} kB, "
+              f"max error {approximate['max_count_error']:,}, top 10 kept {len(kept)}/10")
+
+
+if __name__ == "__main__":
+    main()
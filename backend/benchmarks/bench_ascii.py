@@ -0,0 +1,75 @@
+"""Throughput and memory of the ASCII tokenizing fast path.
+
+Compares the regex word pattern (still used for non-ASCII text) against the
+split based ASCII fast path, on its own and when counting a whole page. Also
+reports the time spent decoding a page compared with counting it: ASCII text
+is already stored one byte per character, so tokenizing bytes directly would
+save less than the decode itself costs.
+
+Run with: pipenv run python benchmarks/bench_ascii.py
+"""
+import tracemalloc
+from collections import Counter
+
+from common import best_of, generate_html, generate_text, report
+
+from libs import tokenizing
+from libs.counting import count_information
+from libs.fetching import CHUNK_SIZE, decode_chunks
+from libs.scanning import Scanner
+
+
+def regex_tokenize(text):
+    return tokenizing.WORD_PATTERN.findall(text.lower())
+
+
+def count_with_regex(func):
+    fast_tokenize = tokenizing.tokenize
+    tokenizing.tokenize = regex_tokenize
+    try:
+        return func()
+    finally:
+        tokenizing.tokenize = fast_tokenize
+
+
+def peak_memory(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    text = generate_text(200_000).replace("café", "cafe")
+    html = generate_html(2_000).replace("café", "cafe")
+    chunks = [chunk.encode() for chunk in (html[i:i + CHUNK_SIZE]
+                                           for i in range(0, len(html), CHUNK_SIZE))]
+
+    assert regex_tokenize(text) == tokenizing.tokenize(text)
+
+    print("Tokenizing 200,000 words of ASCII text")
+    regex = count_with_regex(lambda: best_of(
+        lambda: tokenizing.count_words(text, Counter())))
+    report("regex word pattern", regex)
+    report("ASCII fast path", best_of(
+        lambda: tokenizing.count_words(text, Counter())), regex)
+    regex_peak = count_with_regex(lambda: peak_memory(lambda: tokenizing.tokenize(text)))
+    print(f"{'regex word pattern peak':<40} {regex_peak / 1_000:>10.1f} kB")
+    fast_peak = peak_memory(lambda: tokenizing.tokenize(text))
+    print(f"{'ASCII fast path peak':<40} {fast_peak / 1_000:>10.1f} kB")
+
+    print(f"Counting a {len(html) / 1_000:.0f} kB ASCII page from UTF-8 chunks")
+
+    def count():
+        return count_information(decode_chunks(chunks), Scanner)
+
+    regex = count_with_regex(lambda: best_of(count))
+    report("scanner, regex word pattern", regex)
+    report("scanner, ASCII fast path", best_of(count), regex)
+    report("decoding only", best_of(lambda: list(decode_chunks(chunks))))
+
+
+if __name__ == "__main__":
+    main()
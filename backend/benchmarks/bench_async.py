@@ -0,0 +1,80 @@
+"""Throughput and latency of the asyncio server against the threaded one for slow pages.
+
+Replays generated pages with a high latency, as from slow upstream servers,
+and sends /count requests from many concurrent clients. PooledHTTPServer can
+only have as many fetches in flight as it has worker threads, while the
+asyncio server waits on every fetch at once. MongoDB is replaced with
+in-memory stand-ins, as in bench_pipeline.
+
+Run with: pipenv run python benchmarks/bench_async.py [num_requests] [num_clients]
+"""
+import asyncio
+import logging
+import sys
+import threading
+from unittest.mock import AsyncMock, MagicMock
+
+from bench_pipeline import BANDWIDTH, PAGE, load_test, report_load, start_server
+
+from async_main import AsyncHTTPRequestHandler
+from libs.async_serving import start_server as start_async_server
+from libs.replay import AsyncReplayTransport, ReplayTransport
+from libs.serving import PooledHTTPServer
+
+NUM_REQUESTS = 400
+NUM_CLIENTS = 200
+LATENCY = 0.2
+
+
+class QuietAsyncHandler(AsyncHTTPRequestHandler):
+    def log_request(self, code):
+        pass
+
+
+def make_async_mongo_client():
+    client = MagicMock()
+    counts_collection = MagicMock()
+    counts_collection.find_one = AsyncMock(return_value=None)
+    counts_collection.insert_one = AsyncMock()
+    counts_collection.find.return_value.to_list = AsyncMock(return_value=[])
+    client.__getitem__.return_value = {"counts_collection": counts_collection}
+    return client
+
+
+def start_async(transport):
+    """Function to start the asyncio server on a free port in a background thread."""
+    mongo_client = make_async_mongo_client()
+    loop = asyncio.new_event_loop()
+
+    def handler(*args, **kwargs):
+        return QuietAsyncHandler(*args, mongo_client=mongo_client,
+                                 fetch_client=transport, **kwargs)
+
+    server = loop.run_until_complete(start_async_server(handler, "127.0.0.1", 0, backlog=1024))
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop, server
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    num_requests = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_REQUESTS
+    num_clients = int(sys.argv[2]) if len(sys.argv) > 2 else NUM_CLIENTS
+    pages = {f"https://example.com/{i}": {"body": PAGE} for i in range(num_requests)}
+
+    print(f"{num_requests} /count requests from {num_clients} clients, {len(PAGE) / 1_000:.0f} kB "
+          f"pages replayed with {LATENCY * 1000:.0f} ms latency")
+    server = start_server(PooledHTTPServer, ReplayTransport(pages, LATENCY, BANDWIDTH),
+                          max_workers=8, max_queue=num_clients, backlog=1024, retry_after=1)
+    report_load("PooledHTTPServer, 8 workers",
+                *load_test(server.server_port, num_requests, num_clients))
+    server.shutdown()
+    server.server_close()
+
+    loop, server = start_async(AsyncReplayTransport(pages, LATENCY, BANDWIDTH))
+    report_load("asyncio server",
+                *load_test(server.sockets[0].getsockname()[1], num_requests, num_clients))
+    loop.call_soon_threadsafe(server.close)
+
+
+if __name__ == "__main__":
+    main()
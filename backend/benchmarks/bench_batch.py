@@ -0,0 +1,73 @@
+"""Latency of counting a batch of URLs one by one versus with add_new_counts.
+
+Counts the same pages from a local stub server, once with add_new_count per
+URL and once with add_new_counts fetching them concurrently. The stub server
+delays each response to stand in for a real site's server and network time.
+MongoDB is replaced with an in-memory stand-in, so only fetching and counting
+are timed.
+
+Run with: pipenv run python benchmarks/bench_batch.py
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock
+
+from common import generate_html, report
+
+from db.mongo import add_new_count, add_new_counts
+
+NUM_URLS = 16
+MAX_CONCURRENCY = 8
+RESPONSE_DELAY = 0.05
+PAGE = generate_html(20).encode("utf-8")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        time.sleep(RESPONSE_DELAY)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(PAGE)))
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_client():
+    client = MagicMock()
+    counts_collection = MagicMock()
+    counts_collection.find.return_value = []
+    client.__getitem__.return_value = {"counts_collection": counts_collection}
+    return client
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    urls = [f"http://127.0.0.1:{server.server_port}/page/{i}" for i in range(NUM_URLS)]
+
+    print(f"Counting {NUM_URLS} {len(PAGE) / 1_000:.0f} kB pages, "
+          f"{RESPONSE_DELAY * 1000:.0f} ms per response")
+    start = time.perf_counter()
+    for url in urls:
+        add_new_count(url, make_client())
+    baseline = time.perf_counter() - start
+    report("add_new_count per URL", baseline)
+
+    start = time.perf_counter()
+    errors = add_new_counts(urls, make_client(), max_concurrency=MAX_CONCURRENCY)
+    assert errors == {}
+    report(f"add_new_counts, {MAX_CONCURRENCY} at once", time.perf_counter() - start, baseline)
+
+    server.shutdown()
+    server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Size and cost of compressing the /count fragment as more URLs are counted.
+
+The /count fragment renders a table for every stored URL, so it grows with
+the number of counted pages. Compares the raw fragment with its gzip (and,
+when installed, brotli) compressed size, and the time to compress it against
+reusing the compressed bytes of an identical fragment from ResponseCompressor.
+
+Run with: pipenv run python benchmarks/bench_compression.py
+"""
+import random
+import timeit
+
+from libs import compression
+from libs.compression import ResponseCompressor
+from libs.templating import counts_html
+
+NUM_URLS = (1, 10, 50, 200)
+WORDS = [f"word{i}" for i in range(5_000)]
+REPEAT = 20
+
+
+def make_word_counts(num_urls):
+    random.seed(num_urls)
+    return [{
+        "url": f"https://example.com/page/{i}",
+        "display": True,
+        "word_count": random.randint(100, 10_000),
+        "paginated_words_list": [[random.choice(WORDS), random.randint(1, 500)] for _ in range(5)],
+        "current_page": 1,
+        "num_pages": 20,
+    } for i in range(num_urls)]
+
+
+def main():
+    print(f"{'URLs':>5} {'raw kB':>8} " + " ".join(
+        f"{encoding + ' kB':>8} {encoding + ' ms':>8}" for encoding in compression.ENCODINGS)
+        + f" {'reuse ms':>9}")
+    for num_urls in NUM_URLS:
+        content = counts_html(make_word_counts(num_urls)).encode("utf-8")
+        row = f"{num_urls:>5} {len(content) / 1_000:>8.1f} "
+        for encoding in compression.ENCODINGS:
+            compressed = compression.compress(content, encoding)
+            seconds = timeit.timeit(lambda: compression.compress(content, encoding), number=REPEAT)
+            row += f"{len(compressed) / 1_000:>8.1f} {seconds * 1000 / REPEAT:>8.3f} "
+
+        compressor = ResponseCompressor(min_size=0, max_entries=8)
+        compressor.compress(content, "gzip")
+        seconds = timeit.timeit(lambda: compressor.compress(content, "gzip"), number=REPEAT)
+        print(row + f"{seconds * 1000 / REPEAT:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
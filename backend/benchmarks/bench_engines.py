@@ -0,0 +1,40 @@
+"""Comparative benchmark of the counting engines.
+
+Run with: pipenv run python benchmarks/bench_engines.py
+"""
+from common import best_of, generate_html, generate_text, report
+
+from libs.counting import count_information
+from libs.engines import ENGINES
+
+
+def attribute_heavy_html(num_blocks):
+    block = (
+        '<div class="card card--large" data-id="{i}" data-tracking=\'{{"a": 1}}\'>'
+        '<a href="https://example.com/{i}?ref=nav&amp;x=1" class="link" title="Link {i}">{text}</a>'
+        '<script>window.dataLayer.push({{"event": "card", "id": {i}}});</script>'
+        '<!-- card {i} --><p style="margin: 0">{text}</p></div>'
+    )
+    body = "".join(block.format(i=i, text=generate_text(10, i)) for i in range(num_blocks))
+    return f"<html><head><style>.card {{ color: red }}</style></head><body>{body}</body></html>"
+
+
+def main():
+    pages = {
+        "text heavy page": generate_html(2_000),
+        "attribute and script heavy page": attribute_heavy_html(5_000),
+    }
+    for name, html in pages.items():
+        results = {engine: count_information(html, engine_class) for engine, engine_class in ENGINES.items()}
+        assert results["scanner"] == results["html_parser"]
+
+        print(f"Counting a {len(html) / 1_000:.0f} kB {name}")
+        baseline = None
+        for engine, engine_class in ENGINES.items():
+            seconds = best_of(lambda: count_information(html, engine_class), repeat=3)
+            report(engine, seconds, baseline)
+            baseline = baseline or seconds
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Latency of fetching pages over pooled keep-alive connections versus urlopen.
+
+Fetches the same page repeatedly from a local stub server, once with a new
+urllib.request.urlopen connection per page and once with a FetchClient. The
+stub server delays each new connection to stand in for the TCP and TLS
+handshake latency of a real site.
+
+Run with: pipenv run python benchmarks/bench_fetching.py
+"""
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from common import generate_html, report
+
+from libs.fetch_client import FetchClient
+from libs.fetching import CHUNK_SIZE, read_chunks
+
+NUM_FETCHES = 50
+HANDSHAKE_DELAY = 0.01
+PAGE = generate_html(200).encode("utf-8")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes, so Nagle's algorithm would stall
+    # every kept-alive response behind the client's delayed ACK.
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        time.sleep(HANDSHAKE_DELAY)
+        super().setup()
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(PAGE)))
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def fetch_all(open_url, url):
+    start = time.perf_counter()
+    for _ in range(NUM_FETCHES):
+        with open_url(url) as response:
+            assert b"".join(read_chunks(response, CHUNK_SIZE)) == PAGE
+    return (time.perf_counter() - start) / NUM_FETCHES
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # "localhost" rather than the IP address, so name resolution is included.
+    url = f"http://localhost:{server.server_port}/page"
+
+    print(f"Fetching a {len(PAGE) / 1_000:.0f} kB page {NUM_FETCHES} times, "
+          f"{HANDSHAKE_DELAY * 1000:.0f} ms per new connection")
+    baseline = fetch_all(urllib.request.urlopen, url)
+    report("urlopen, new connection per page", baseline)
+    client = FetchClient(max_connections_per_host=4, max_hosts=32, dns_cache_ttl=60)
+    report("FetchClient, pooled keep-alive", fetch_all(client.open, url), baseline)
+    client.close()
+
+    server.shutdown()
+    server.server_close()
+
+
+if __name__ == "__main__":
+    main()
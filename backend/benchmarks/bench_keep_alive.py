@@ -0,0 +1,70 @@
+"""Latency of sequential htmx requests with and without kept alive connections.
+
+A browser sends each htmx request from the frontend as a CORS preflight
+OPTIONS request followed by the GET. Without keep-alive every request opens
+a new connection, and without Access-Control-Max-Age every GET is preceded by
+a preflight. With both, the GETs are sent one after another over a single
+connection. MongoDB is replaced with in-memory stand-ins, as in bench_pipeline.
+
+Run with: pipenv run python benchmarks/bench_keep_alive.py [num_requests]
+"""
+import http.client
+import logging
+import sys
+import time
+
+from bench_pipeline import start_server
+
+from libs.replay import ReplayTransport
+from libs.serving import PooledHTTPServer
+
+NUM_REQUESTS = 500
+HEADERS = {"HX-Request": "true", "Connection": "close"}
+
+
+def request(connection, method, headers):
+    connection.request(method, "/reset", headers=headers)
+    response = connection.getresponse()
+    response.read()
+    return response.status
+
+
+def new_connections(port, num_requests):
+    """Function to send a preflight and a GET for every request, each on a new connection."""
+    for _ in range(num_requests):
+        for method in ("OPTIONS", "GET"):
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            request(connection, method, HEADERS)
+            connection.close()
+
+
+def kept_alive_connection(port, num_requests):
+    """Function to send one preflight, then every GET, on a single connection."""
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    headers = {"HX-Request": "true"}
+    request(connection, "OPTIONS", headers)
+    for _ in range(num_requests):
+        request(connection, "GET", headers)
+    connection.close()
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    num_requests = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_REQUESTS
+    server = start_server(PooledHTTPServer, ReplayTransport({}), max_workers=8,
+                          max_queue=32, backlog=128, retry_after=1)
+
+    print(f"{num_requests} sequential /reset requests")
+    for name, send in (("new connection and preflight per request", new_connections),
+                       ("kept alive connection, cached preflight", kept_alive_connection)):
+        start = time.perf_counter()
+        send(server.server_port, num_requests)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<42} {elapsed * 1000 / num_requests:7.3f} ms per request")
+
+    server.shutdown()
+    server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""Latency of counting a page against looking it up in the parse cache.
+
+An identical page body only has to be hashed to be found in the cache, so a
+hit costs a SHA-256 of the body rather than a full parse.
+
+Run with: pipenv run python benchmarks/bench_parse_cache.py
+"""
+from common import best_of, generate_html, report
+
+from db.parse_cache import ParseCache
+from libs.counting import count_information
+from libs.fetching import CHUNK_SIZE, decode_chunks
+from libs.scanning import Scanner
+
+
+def main():
+    for num_paragraphs in (200, 2_000):
+        body = generate_html(num_paragraphs).encode("utf-8")
+        chunks = [body[i:i + CHUNK_SIZE] for i in range(0, len(body), CHUNK_SIZE)]
+        cache = ParseCache(max_entries=8, max_body_size=len(body))
+        key, _ = cache.read(chunks, Scanner)
+        cache.put(key, count_information(decode_chunks(chunks), Scanner))
+
+        def hit():
+            key, _ = cache.read(chunks, Scanner)
+            return cache.get(key)
+
+        print(f"{len(body) / 1_000:.0f} kB page")
+        baseline = best_of(lambda: count_information(decode_chunks(chunks), Scanner))
+        report("count with the scanner", baseline)
+        report("parse cache hit", best_of(hit), baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""Benchmark of Parser tag-context tracking on deeply nested and malformed documents.
+
+Total time should grow linearly with document size, so the time per element stays flat.
+
+Run with: pipenv run python benchmarks/bench_parser_context.py
+"""
+from common import best_of
+
+from libs.counting import Parser
+
+
+def nested_html(depth):
+    return "<html><body>" + "<b>word " * depth + "</b>" * depth + "</body></html>"
+
+
+def malformed_html(num_paragraphs):
+    return "<html><body>" + "<p>some words<br>more words<li>item<img src=x>" * num_paragraphs
+
+
+def parse(html):
+    parser = Parser()
+    parser.feed(html)
+    parser.close()
+    return parser
+
+
+def main():
+    for name, generate in (("deeply nested", nested_html), ("malformed", malformed_html)):
+        print(f"Parsing {name} documents")
+        for size in (1_000, 4_000, 16_000):
+            html = generate(size)
+            seconds = best_of(lambda: parse(html), repeat=3)
+            print(f"  {size:>6} elements {seconds * 1000:>10.3f} ms "
+                  f"{seconds / size * 1_000_000:>8.3f} us/element")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Throughput and latency of the full /count pipeline with replayed pages.
+
+Starts the backend's HTTP server with a ReplayTransport serving generated
+pages with a simulated latency and bandwidth, and sends /count requests from
+concurrent clients: each request fetches, parses and stores a new page and
+renders the counts. MongoDB is replaced with an in-memory stand-in, so the
+benchmark runs on a single offline machine. The single threaded HTTPServer is
+compared with PooledHTTPServer, including one with too few workers for the
+clients, where the extra requests are rejected with a fast 503.
+
+Run with: pipenv run python benchmarks/bench_pipeline.py [num_requests] [num_clients]
+"""
+import logging
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer
+from unittest.mock import MagicMock
+
+from common import generate_html
+
+from libs.replay import ReplayTransport
+from libs.serving import PooledHTTPServer
+from main import HTTPRequestHandler
+
+NUM_REQUESTS = 200
+NUM_CLIENTS = 8
+LATENCY = 0.02
+BANDWIDTH = 10 * 1024 * 1024
+PAGE = generate_html(20).encode("utf-8")
+
+
+class QuietHandler(HTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def make_mongo_client():
+    client = MagicMock()
+    counts_collection = MagicMock()
+    counts_collection.find.return_value = []
+    client.__getitem__.return_value = {"counts_collection": counts_collection}
+    return client
+
+
+def start_server(server_class, transport, **server_kwargs):
+    """Function to start the backend server on a free port in a background thread."""
+    mongo_client = make_mongo_client()
+
+    def handler(*args, **kwargs):
+        return QuietHandler(*args, mongo_client=mongo_client,
+                            fetch_client=transport, **kwargs)
+
+    server = server_class(("127.0.0.1", 0), handler, **server_kwargs)
+    threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True).start()
+    return server
+
+
+def load_test(port, num_requests, num_clients):
+    """Function to send /count requests concurrently, returning latencies and throughput."""
+    def request(i):
+        url = f"http://127.0.0.1:{port}/count?url=https://example.com/{i}"
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(url) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as err:
+            status = err.code
+        return time.perf_counter() - start, status
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=num_clients) as executor:
+        results = list(executor.map(request, range(num_requests)))
+    elapsed = time.perf_counter() - start
+    return sorted(latency for latency, _ in results), [status for _, status in results], elapsed
+
+
+def report_load(name, latencies, statuses, elapsed):
+    """Function to print the throughput, tail latencies and error responses of a load test."""
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+
+    errors = sum(1 for status in statuses if status != 200)
+    print(f"{name:<40} {len(latencies) / elapsed:>8.1f} req/s  p50 {percentile(0.5):>7.1f} ms"
+          f"  p99 {percentile(0.99):>7.1f} ms  non-200 {errors}")
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    num_requests = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_REQUESTS
+    num_clients = int(sys.argv[2]) if len(sys.argv) > 2 else NUM_CLIENTS
+    transport = ReplayTransport(
+        {f"https://example.com/{i}": {"body": PAGE} for i in range(num_requests)},
+        latency=LATENCY, bandwidth=BANDWIDTH)
+
+    print(f"{num_requests} /count requests from {num_clients} clients, {len(PAGE) / 1_000:.0f} kB "
+          f"pages replayed with {LATENCY * 1000:.0f} ms latency")
+    server = start_server(HTTPServer, transport)
+    report_load("HTTPServer", *load_test(server.server_port, num_requests, num_clients))
+    server.shutdown()
+    server.server_close()
+
+    for max_workers, max_queue in ((8, 32), (2, 2)):
+        server = start_server(PooledHTTPServer, transport, max_workers=max_workers,
+                              max_queue=max_queue, backlog=128, retry_after=1)
+        report_load(f"PooledHTTPServer, {max_workers} workers, queue {max_queue}",
+                    *load_test(server.server_port, num_requests, num_clients))
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
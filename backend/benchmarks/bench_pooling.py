@@ -0,0 +1,53 @@
+"""Benchmark of counting throughput inline versus in the counting process pool.
+
+Pages are counted concurrently from threads, as concurrent request handlers would.
+Inline counting is serialised by the GIL, while pool throughput scales with the
+number of worker processes, up to the number of cores.
+
+Run with: pipenv run python benchmarks/bench_pooling.py
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import generate_html
+
+from libs.counting import count_information
+from libs.pooling import CountingPool
+
+NUM_PAGES = 16
+
+
+def throughput(count, html):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=NUM_PAGES) as executor:
+        list(executor.map(lambda _: count([html]), range(NUM_PAGES)))
+    return NUM_PAGES / (time.perf_counter() - start)
+
+
+def main():
+    html = generate_html(1_000)
+    cores = os.cpu_count()
+    print(f"Counting {NUM_PAGES} pages of {len(html) / 1_000:.0f} kB on {cores} cores")
+    print(f"{'inline':<20} {throughput(count_information, html):>8.2f} pages/s")
+
+    workers = 1
+    while workers <= cores:
+        pool = CountingPool(
+            max_workers=workers,
+            max_queue=NUM_PAGES,
+            max_tasks_per_worker=100,
+            size_threshold=0,
+            timeout=300,
+        )
+        try:
+            # Warm up the worker processes before timing.
+            throughput(pool.count, html)
+            print(f"{f'pool, {workers} workers':<20} {throughput(pool.count, html):>8.2f} pages/s")
+        finally:
+            pool.close()
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Throughput of CPU bound /count requests with pre-forked worker processes.
+
+Replays large generated pages with no latency, so each /count request is
+dominated by parsing the page, and compares one server process with a
+Supervisor of one worker process per core sharing the listening socket.
+MongoDB is replaced with in-memory stand-ins, as in bench_pipeline. The
+speed up is bounded by the number of cores.
+
+Run with: pipenv run python benchmarks/bench_prefork.py [num_requests] [num_clients]
+"""
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+
+from bench_pipeline import QuietHandler, load_test, make_mongo_client, report_load
+from common import generate_html
+
+from libs.prefork import Supervisor, adopt_socket, listen
+from libs.replay import ReplayTransport
+from libs.serving import PooledHTTPServer
+
+NUM_REQUESTS = 200
+NUM_CLIENTS = 8
+PAGE = generate_html(200).encode("utf-8")
+
+
+def serve_worker(sock, pages):
+    """Function to run a backend server on a listening socket until SIGTERM."""
+    mongo_client = make_mongo_client()
+    transport = ReplayTransport(pages)
+
+    def handler(*args, **kwargs):
+        return QuietHandler(*args, mongo_client=mongo_client, fetch_client=transport, **kwargs)
+
+    server = PooledHTTPServer(("127.0.0.1", 0), handler, max_workers=8, max_queue=64,
+                              backlog=128, retry_after=1, bind_and_activate=False)
+    adopt_socket(server, sock)
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(
+        target=server.shutdown).start())
+    server.serve_forever(0.01)
+    server.server_close()
+
+
+def supervise(sock, pages, num_workers):
+    logging.disable(logging.CRITICAL)
+    Supervisor(num_workers, lambda: serve_worker(sock, pages), shutdown_timeout=5).run()
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    num_requests = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_REQUESTS
+    num_clients = int(sys.argv[2]) if len(sys.argv) > 2 else NUM_CLIENTS
+    pages = {f"https://example.com/{i}": {"body": PAGE} for i in range(num_requests)}
+    cores = os.cpu_count() or 1
+
+    print(f"{num_requests} /count requests from {num_clients} clients, "
+          f"{len(PAGE) / 1_000:.0f} kB pages, {cores} cores")
+    for num_workers in sorted({1, cores}):
+        sock = listen(("127.0.0.1", 0), 128)
+        supervisor = multiprocessing.get_context("fork").Process(
+            target=supervise, args=(sock, pages, num_workers))
+        supervisor.start()
+        report_load(f"{num_workers} worker processes",
+                    *load_test(sock.getsockname()[1], num_requests, num_clients))
+        supervisor.terminate()
+        supervisor.join()
+        sock.close()
+
+
+if __name__ == "__main__":
+    main()
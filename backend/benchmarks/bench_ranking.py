@@ -0,0 +1,36 @@
+"""Benchmark of ranking the first page of words against fully sorting the vocabulary.
+
+Run with: pipenv run python benchmarks/bench_ranking.py
+"""
+import random
+
+from common import best_of, report
+
+from libs.ranking import RankedWords
+
+
+def full_sort(counts):
+    words_list = []
+    for key, value in counts.items():
+        words_list.append([key, value])
+    words_list.sort(key=lambda item: item[1], reverse=True)
+    return words_list[0:5]
+
+
+def main():
+    rng = random.Random(0)
+    for vocabulary_size in (10_000, 100_000, 1_000_000):
+        counts = {f"word{i}": rng.randint(1, 1000) for i in range(vocabulary_size)}
+        assert full_sort(counts) == RankedWords(counts)[0:5]
+
+        print(f"First page of a {vocabulary_size:,} word vocabulary")
+        baseline = best_of(lambda: full_sort(counts), repeat=3)
+        report("full sort of [word, count] lists", baseline)
+        report("heap top-5", best_of(
+            lambda: RankedWords(counts)[0:5], repeat=3), baseline)
+        report("heap page 10", best_of(
+            lambda: RankedWords(counts)[45:50], repeat=3), baseline)
+
+
+if __name__ == "__main__":
+    main()
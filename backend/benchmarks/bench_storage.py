@@ -0,0 +1,48 @@
+"""Size and latency comparison of stored word count encodings.
+
+Compares the legacy BSON array of [word, count] arrays against the compact
+words and counts blobs, with and without compression.
+
+Run with: pipenv run python benchmarks/bench_storage.py
+"""
+import bson
+from common import best_of, generate_html
+
+from db.encoding import decode_words_page, encode_words
+from libs.counting import count_information
+
+
+def main():
+    words_list = list(count_information(generate_html(200, seed=1)).get("words_list"))
+    # Widen the vocabulary to something like a large real page.
+    words_list += [[f"word{i}", (i % 50) + 1] for i in range(50_000)]
+    words = [word for word, _ in words_list]
+    counts = [count for _, count in words_list]
+    print(f"Storing {len(words_list):,} words")
+
+    legacy_doc = {"words_list": words_list}
+    legacy_bson = bson.encode(legacy_doc)
+    legacy_size = len(legacy_bson)
+    legacy_page = best_of(lambda: bson.decode(legacy_bson)["words_list"][500:505])
+    print(f"{'legacy words_list':<24} {legacy_size / 1_000:>9.1f} kB "
+          f"encode {best_of(lambda: bson.encode(legacy_doc)) * 1000:>7.2f} ms "
+          f"page decode {legacy_page * 1000:>7.2f} ms")
+
+    for compress in (False, True):
+        compact_doc = encode_words(words, counts, compress)
+        compact_bson = bson.encode(compact_doc)
+
+        def page():
+            return decode_words_page(bson.decode(compact_bson), 500, 505)
+
+        assert page() == words_list[500:505]
+        name = "compact + zlib" if compress else "compact"
+        encode = best_of(lambda: bson.encode(encode_words(words, counts, compress)))
+        print(f"{name:<24} {len(compact_bson) / 1_000:>9.1f} kB "
+              f"encode {encode * 1000:>7.2f} ms "
+              f"page decode {best_of(page) * 1000:>7.2f} ms "
+              f"({legacy_size / len(compact_bson):.1f}x smaller)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Memory benchmark of streamed versus buffered fetch-and-count on multi-megabyte pages.
+
+Peak memory of the streamed pipeline should stay roughly flat as the page grows,
+while the buffered pipeline grows with the page size.
+
+Run with: pipenv run python benchmarks/bench_streaming.py
+"""
+import io
+import tracemalloc
+
+from common import generate_html
+
+from libs.counting import count_information
+from libs.fetching import CHUNK_SIZE, decode_chunks, read_chunks
+
+
+def buffered(response):
+    return count_information(response.read().decode("utf-8"))
+
+
+def streamed(response):
+    return count_information(decode_chunks(read_chunks(response, CHUNK_SIZE)))
+
+
+def peak_memory(pipeline, body):
+    response = io.BytesIO(body)
+    tracemalloc.start()
+    pipeline(response)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    for num_paragraphs in (5_000, 20_000, 40_000):
+        body = generate_html(num_paragraphs).encode("utf-8")
+        assert buffered(io.BytesIO(body)) == streamed(io.BytesIO(body))
+        print(f"{len(body) / 1_000_000:>6.1f} MB page: "
+              f"buffered peak {peak_memory(buffered, body) / 1_000_000:>7.2f} MB, "
+              f"streamed peak {peak_memory(streamed, body) / 1_000_000:>7.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
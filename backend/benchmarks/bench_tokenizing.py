@@ -0,0 +1,61 @@
+"""Micro-benchmark of the single-pass tokenizer against the original word rules.
+
+Run with: pipenv run python benchmarks/bench_tokenizing.py
+"""
+import re
+from collections import Counter
+
+from common import best_of, generate_html, generate_text, report
+
+from libs.counting import Parser
+from libs.tokenizing import count_words
+
+
+def legacy_count_words(data, words_list):
+    data_list = re.split(r"\s", data)
+    final_list = []
+    for word in data_list:
+        updated_word = re.sub("[.,!?]+$", "", word)
+        if not re.search("[^a-zA-Z0-9]", updated_word) and updated_word != "":
+            final_list.append(updated_word.lower())
+
+    for word in final_list:
+        if word in words_list:
+            words_list[word] += 1
+        else:
+            words_list[word] = 1
+    return len(final_list)
+
+
+class LegacyParser(Parser):
+    def handle_data(self, data):
+        if self.currently_opened_tags.count("body") == 1 and self.currently_opened_tags[-1] in self.accepted_html_tags:
+            self.word_count += legacy_count_words(data, self.words_list)
+
+
+def main():
+    text = generate_text(200_000)
+    html = generate_html(2_000)
+
+    assert legacy_count_words(text, {}) == count_words(text, Counter())
+
+    print("Tokenizing 200,000 words of text")
+    legacy = best_of(lambda: legacy_count_words(text, {}))
+    report("legacy re.split/re.sub/re.search", legacy)
+    report("compiled single pass", best_of(
+        lambda: count_words(text, Counter())), legacy)
+
+    print("Parsing a 2,000 paragraph page")
+
+    def parse(parser_class):
+        parser = parser_class()
+        parser.feed(html)
+        return parser
+
+    legacy = best_of(lambda: parse(LegacyParser))
+    report("Parser with legacy tokenizer", legacy)
+    report("Parser with compiled tokenizer", best_of(lambda: parse(Parser)), legacy)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import random
+import sys
+import timeit
+from pathlib import Path
+
+# Benchmarks are run as scripts, so make the application modules importable.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+WORDS = [
+    "sample", "text", "word", "count", "Python", "HTMX", "page", "the", "of", "and",
+    "Lorem", "ipsum", "dolor", "sit", "amet", "2024", "end.", "really?!", "it's",
+    "e.g.", "-", "(aside)", "café",
+]
+
+
+def generate_text(num_words, seed=0):
+    """Function to generate a deterministic run of words for benchmarking.
+
+    Args:
+        num_words (int): Number of words to generate.
+        seed (int): Seed for the random word choice.
+
+    Returns:
+        A space separated string of words.
+
+    """
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(num_words))
+
+
+def generate_html(num_paragraphs, words_per_paragraph=50, seed=0):
+    """Function to generate a deterministic HTML page for benchmarking.
+
+    Args:
+        num_paragraphs (int): Number of <p> elements in the page body.
+        words_per_paragraph (int): Number of words in each paragraph.
+        seed (int): Seed for the random word choice.
+
+    Returns:
+        The HTML page as a string.
+
+    """
+    paragraphs = "\n".join(
+        f"<p>{generate_text(words_per_paragraph, seed + i)}</p>"
+        for i in range(num_paragraphs)
+    )
+    return f"<!DOCTYPE html><html><head><title>Benchmark</title></head><body>\n{paragraphs}\n</body></html>"
+
+
+def best_of(func, repeat=5, number=1):
+    """Function to time a callable, returning the best time per call in seconds."""
+    return min(timeit.repeat(func, repeat=repeat, number=number)) / number
+
+
+def report(name, seconds, baseline=None):
+    """Function to print a single benchmark result line."""
+    line = f"{name:<40} {seconds * 1000:>10.3f} ms"
+    if baseline is not None:
+        line += f"  ({baseline / seconds:.2f}x)"
+    print(line)
@@ -0,0 +1,287 @@
+import asyncio
+import json
+import logging
+import os
+from urllib.parse import urlparse
+
+from pymongo import AsyncMongoClient, MongoClient
+
+import config
+from db.async_mongo import add_new_count, get_counts, recount, update_display, update_page
+from db.mongo import UrlError, create_indexes
+from db.parse_cache import ParseCache
+from libs.async_fetching import AsyncFetchClient
+from libs.async_serving import AsyncBaseHTTPRequestHandler, start_server
+from libs.compression import ResponseCompressor
+from libs.engines import get_engine
+from libs.metrics import metrics
+from libs.pooling import CountingPool
+from libs.replay import AsyncReplayTransport
+from libs.templating import counts_html, reset_html
+from main import HTTPRequestHandler, parse_count_query
+
+logging.basicConfig(level=logging.DEBUG)
+
+
+class AsyncHTTPRequestHandler(AsyncBaseHTTPRequestHandler):
+    """An asyncio HTTP handler responding with HTMX HTML for word counts web page.
+
+    Serves the /reset, /count and /metrics routes and OPTIONS requests of
+    HTTPRequestHandler with the same responses, but fetches pages and talks to
+    MongoDB without blocking, so a slow page holds a socket rather than a
+    thread. Batches, crawls and count jobs are only served by HTTPRequestHandler.
+
+    Attributes:
+        mongo_client: AsyncMongoClient for storing word counts information.
+        fetch_client: AsyncFetchClient, or AsyncReplayTransport, for fetching pages.
+        counting_pool: Optional CountingPool for counting large pages.
+        parse_cache: Optional ParseCache, so identical pages are only parsed once.
+        response_compressor: Optional ResponseCompressor, compressing responses
+            for clients that accept it.
+
+    """
+
+    counting_pool = None
+    parse_cache = None
+    response_compressor = None
+
+    def __init__(self, *args, mongo_client, fetch_client, counting_pool=None, parse_cache=None,
+                 response_compressor=None, **kwargs):
+        self.mongo_client = mongo_client
+        self.fetch_client = fetch_client
+        self.counting_pool = counting_pool
+        self.parse_cache = parse_cache
+        self.response_compressor = response_compressor
+        super().__init__(*args, **kwargs)
+
+    complete_response = HTTPRequestHandler.complete_response
+
+    async def respond_with_counts(self):
+        """Method to respond with the counts HTML of every searched URL."""
+        try:
+            word_counts = await get_counts(self.mongo_client)
+            content = counts_html(word_counts).encode("utf-8")
+            self.complete_response(200, content)
+        except UrlError as e:
+            error = f"UrlError during getting of all counts: {
+                e.message}"
+            logging.error(error)
+            self.complete_response(e.code, error.encode("utf-8"))
+        except Exception as e:
+            error = f"Exception during getting of all counts: {
+                e}"
+            logging.error(error)
+            self.complete_response(500, error.encode("utf-8"))
+
+    async def do_OPTIONS(self):
+        """Method to handle OPTIONS requests."""
+        logging.info("OPTIONS request,\nHeaders:\n%s\n", str(self.headers))
+        self.complete_response(204)
+
+    async def do_GET(self):
+        """Method to handle GET requests."""
+        logging.info("GET request,\nPath: %s\nHeaders:\n%s\n",
+                     str(self.path), str(self.headers))
+
+        parsed_query = urlparse(str(self.path))
+        path = parsed_query.path
+
+        match path:
+            case "/reset":
+                try:
+                    content = reset_html().encode("utf-8")
+                    self.complete_response(200, content)
+                    return
+                except Exception as e:
+                    error = f"Exception during rendering of reset_form_template: {
+                        e}"
+                    logging.error(error)
+                    self.complete_response(500, error.encode("utf-8"))
+                    return
+
+            case "/count":
+                url, action, value = parse_count_query(parsed_query.query)
+
+                # Add words information for new URL, recount it, or update pagination or display.
+                if action == "page":
+                    try:
+                        await update_page(url, int(value), self.mongo_client)
+                    except UrlError as e:
+                        error = f"UrlError during updating of page: {
+                            e.message}"
+                        logging.error(error)
+                        self.complete_response(e.code, error.encode("utf-8"))
+                        return
+                    except Exception as e:
+                        error = f"Exception during updating of page: {
+                            e}"
+                        logging.error(error)
+                        self.complete_response(500, error.encode("utf-8"))
+                        return
+                elif action == "display":
+                    try:
+                        await update_display(url, False if value ==
+                                             "false" else True, self.mongo_client)
+                    except UrlError as e:
+                        error = f"UrlError during updating of display: {
+                            e.message}"
+                        logging.error(error)
+                        self.complete_response(e.code, error.encode("utf-8"))
+                        return
+                    except Exception as e:
+                        error = f"Exception during updating of display: {
+                            e}"
+                        logging.error(error)
+                        self.complete_response(500, error.encode("utf-8"))
+                        return
+                elif action == "recount":
+                    try:
+                        await recount(url, self.mongo_client, self.fetch_client,
+                                      counting_pool=self.counting_pool,
+                                      parse_cache=self.parse_cache)
+                    except UrlError as e:
+                        error = f"UrlError during recount of URL: {
+                            e.message}"
+                        logging.error(error)
+                        self.complete_response(e.code, error.encode("utf-8"))
+                        return
+                    except Exception as e:
+                        error = f"Exception during recount of URL: {
+                            e}"
+                        logging.error(error)
+                        self.complete_response(500, error.encode("utf-8"))
+                        return
+                else:
+                    try:
+                        await add_new_count(url, self.mongo_client, self.fetch_client,
+                                            counting_pool=self.counting_pool,
+                                            parse_cache=self.parse_cache)
+                    except UrlError as e:
+                        error = f"UrlError during addition of new URL count: {
+                            e.message}"
+                        logging.error(error)
+                        self.complete_response(e.code, error.encode("utf-8"))
+                        return
+                    except Exception as e:
+                        error = f"Exception during addition of new URL count: {
+                            e}"
+                        logging.error(error)
+                        self.complete_response(500, error.encode("utf-8"))
+                        return
+
+                # Return updated words information
+                await self.respond_with_counts()
+                return
+
+            case "/metrics":
+                content = json.dumps(metrics.snapshot()).encode("utf-8")
+                self.complete_response(200, content)
+                return
+
+            case _:
+                content = b"Not Found"
+                self.complete_response(404, content)
+
+
+async def run(mongo_client, fetch_client, counting_pool=None, parse_cache=None,
+              response_compressor=None):
+    """Function to run the asyncio HTTP server until it is cancelled.
+
+    Args:
+        mongo_client: AsyncMongoClient.
+        fetch_client: AsyncFetchClient, or AsyncReplayTransport, for fetching pages.
+        counting_pool: Optional CountingPool for counting large pages.
+        parse_cache: Optional ParseCache, so identical pages are only parsed once.
+        response_compressor: Optional ResponseCompressor, compressing responses.
+
+    """
+    def handler_with_mongo_client(*args, **kwargs):
+        return AsyncHTTPRequestHandler(*args, mongo_client=mongo_client,
+                                       fetch_client=fetch_client,
+                                       counting_pool=counting_pool,
+                                       parse_cache=parse_cache,
+                                       response_compressor=response_compressor, **kwargs)
+    server_port = os.getenv("SERVER_PORT", "8080")
+    server = await start_server(handler_with_mongo_client, "0.0.0.0", int(server_port),
+                                backlog=config.SERVER_BACKLOG)
+
+    logging.info("Starting asyncio httpd...\n")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        logging.info("Stopping asyncio httpd...\n")
+
+
+async def main():
+    """Function to run the asyncio HTTP server with clients built from the configuration."""
+    logging.info("Initiating async MongoDb client")
+    mongo_client_url = os.getenv(
+        "MONGO_CLIENT_ENDPOINT", "mongodb://localhost:27017/")
+    mongo_client = AsyncMongoClient(mongo_client_url)
+    try:
+        with MongoClient(mongo_client_url) as index_client:
+            create_indexes(index_client)
+    except Exception as e:
+        logging.error(f"Error creating MongoDB indexes: {e}")
+
+    counting_pool = None
+    if config.COUNTING_POOL_WORKERS > 0:
+        logging.info("Starting counting pool with %d workers",
+                     config.COUNTING_POOL_WORKERS)
+        counting_pool = CountingPool(
+            max_workers=config.COUNTING_POOL_WORKERS,
+            max_queue=config.COUNTING_POOL_MAX_QUEUE,
+            max_tasks_per_worker=config.COUNTING_POOL_MAX_TASKS_PER_WORKER,
+            size_threshold=config.COUNTING_POOL_SIZE_THRESHOLD,
+            timeout=config.COUNTING_POOL_TIMEOUT,
+        )
+
+    if config.FETCH_REPLAY_DIR:
+        logging.info("Replaying pages recorded in %s", config.FETCH_REPLAY_DIR)
+        fetch_client = AsyncReplayTransport.from_directory(
+            config.FETCH_REPLAY_DIR,
+            latency=config.FETCH_REPLAY_LATENCY,
+            bandwidth=config.FETCH_REPLAY_BANDWIDTH or None,
+        )
+    else:
+        fetch_client = AsyncFetchClient(
+            max_connections_per_host=config.FETCH_POOL_CONNECTIONS_PER_HOST,
+            max_hosts=config.FETCH_POOL_MAX_HOSTS,
+            dns_cache_ttl=config.FETCH_DNS_CACHE_TTL,
+        )
+
+    parse_cache = None
+    if config.PARSE_CACHE_MAX_ENTRIES > 0 or config.PARSE_CACHE_PERSISTENT:
+        # Pages are counted on threads, so the persistent tier uses a blocking client.
+        parse_cache = ParseCache(
+            max_entries=config.PARSE_CACHE_MAX_ENTRIES,
+            max_body_size=config.PARSE_CACHE_MAX_BODY_SIZE,
+            collection=(MongoClient(mongo_client_url)["local_database"]["parse_cache_collection"]
+                        if config.PARSE_CACHE_PERSISTENT else None),
+        )
+
+    response_compressor = None
+    if config.RESPONSE_COMPRESSION:
+        response_compressor = ResponseCompressor(
+            min_size=config.RESPONSE_COMPRESSION_MIN_SIZE,
+            max_entries=config.RESPONSE_COMPRESSION_CACHE_ENTRIES,
+        )
+
+    try:
+        await run(mongo_client, fetch_client, counting_pool, parse_cache, response_compressor)
+    finally:
+        if counting_pool is not None:
+            counting_pool.close()
+        if isinstance(fetch_client, AsyncFetchClient):
+            fetch_client.close()
+        await mongo_client.close()
+
+
+if __name__ == "__main__":
+    # An unknown COUNTING_ENGINE stops the server here, rather than failing every count.
+    get_engine(config.COUNTING_ENGINE)
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logging.warning("Stopping server due to keyboard interruption")
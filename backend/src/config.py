@@ -0,0 +1,152 @@
+import os
+
+
+def env_int(name, default):
+    """Function to read an integer setting from the environment.
+
+    Args:
+        name (str): Environment variable name.
+        default (int): Value used when the variable is not set.
+
+    Returns:
+        The integer value of the setting.
+
+    """
+    return int(os.getenv(name, str(default)))
+
+
+def env_bool(name, default):
+    """Function to read a boolean setting from the environment.
+
+    Args:
+        name (str): Environment variable name.
+        default (bool): Value used when the variable is not set.
+
+    Returns:
+        True if the variable is "true" or "1" (case insensitive), otherwise False.
+
+    """
+    return os.getenv(name, str(default)).lower() in ("true", "1")
+
+
+def env_float(name, default):
+    """Function to read a float setting from the environment.
+
+    Args:
+        name (str): Environment variable name.
+        default (float): Value used when the variable is not set.
+
+    Returns:
+        The float value of the setting.
+
+    """
+    return float(os.getenv(name, str(default)))
+
+
+# Worker processes forked by a supervisor, sharing the listening socket, 0 serves
+# from a single process.
+SERVER_PROCESSES = env_int("SERVER_PROCESSES", 0)
+# Seconds a stopped worker process has to finish its requests before it is killed.
+SERVER_SHUTDOWN_TIMEOUT = env_float("SERVER_SHUTDOWN_TIMEOUT", 30)
+# Worker threads handling requests concurrently, 0 handles one request at a time.
+SERVER_WORKERS = env_int("SERVER_WORKERS", 8)
+# Accepted connections that may wait for a free worker before new ones get a 503.
+SERVER_MAX_QUEUE = env_int("SERVER_MAX_QUEUE", 32)
+# Listen backlog of connections not yet accepted.
+SERVER_BACKLOG = env_int("SERVER_BACKLOG", 128)
+# Seconds sent in the Retry-After header of 503 responses.
+SERVER_RETRY_AFTER = env_int("SERVER_RETRY_AFTER", 1)
+# Seconds a kept alive connection may be idle (or a request take to arrive) before it is closed.
+SERVER_KEEP_ALIVE_TIMEOUT = env_float("SERVER_KEEP_ALIVE_TIMEOUT", 5)
+# Requests handled on a connection before it is closed, 1 closes it after every response.
+SERVER_KEEP_ALIVE_MAX_REQUESTS = env_int("SERVER_KEEP_ALIVE_MAX_REQUESTS", 100)
+# Seconds browsers may cache the response to a CORS preflight OPTIONS request.
+CORS_MAX_AGE = env_int("CORS_MAX_AGE", 600)
+
+# Compress responses with gzip, or brotli when the brotli package is installed, if accepted.
+RESPONSE_COMPRESSION = env_bool("RESPONSE_COMPRESSION", True)
+# Smallest response content in bytes that is compressed.
+RESPONSE_COMPRESSION_MIN_SIZE = env_int("RESPONSE_COMPRESSION_MIN_SIZE", 1024)
+# Number of compressed responses kept for reuse when the same content is served again.
+RESPONSE_COMPRESSION_CACHE_ENTRIES = env_int("RESPONSE_COMPRESSION_CACHE_ENTRIES", 32)
+
+# Name of the counting engine, see libs.engines.ENGINES.
+COUNTING_ENGINE = os.getenv("COUNTING_ENGINE", "html_parser")
+
+# Number of worker processes for counting large pages, 0 counts every page inline.
+COUNTING_POOL_WORKERS = env_int("COUNTING_POOL_WORKERS", 0)
+# Number of pages that may wait for a free worker before new pages are rejected.
+COUNTING_POOL_MAX_QUEUE = env_int("COUNTING_POOL_MAX_QUEUE", 8)
+# Number of pages a worker process counts before it is replaced with a fresh one.
+COUNTING_POOL_MAX_TASKS_PER_WORKER = env_int(
+    "COUNTING_POOL_MAX_TASKS_PER_WORKER", 100)
+# Pages with at least this many characters of HTML are counted in the pool.
+COUNTING_POOL_SIZE_THRESHOLD = env_int(
+    "COUNTING_POOL_SIZE_THRESHOLD", 256 * 1024)
+# Seconds to wait for a page to be counted in the pool.
+COUNTING_POOL_TIMEOUT = env_float("COUNTING_POOL_TIMEOUT", 30)
+
+# Compress the words and counts stored for each count document.
+WORDS_COMPRESSION = env_bool("WORDS_COMPRESSION", False)
+# Maximum distinct words held in memory while counting a page, 0 counts every word
+# exactly. When set, word counts are approximate but use a fixed amount of memory.
+APPROXIMATE_MAX_WORDS = env_int("APPROXIMATE_MAX_WORDS", 0)
+
+# Idle keep-alive connections kept open per host for fetching pages, 0 opens a new
+# urllib connection for every page.
+FETCH_POOL_CONNECTIONS_PER_HOST = env_int("FETCH_POOL_CONNECTIONS_PER_HOST", 4)
+# Number of hosts that idle connections are kept open for.
+FETCH_POOL_MAX_HOSTS = env_int("FETCH_POOL_MAX_HOSTS", 32)
+# Seconds that resolved host addresses are cached for.
+FETCH_DNS_CACHE_TTL = env_float("FETCH_DNS_CACHE_TTL", 60)
+
+# Number of count results cached in memory by a hash of the page body, 0 disables
+# the in-memory cache.
+PARSE_CACHE_MAX_ENTRIES = env_int("PARSE_CACHE_MAX_ENTRIES", 64)
+# Largest page body in bytes that is buffered to be hashed for the cache.
+PARSE_CACHE_MAX_BODY_SIZE = env_int("PARSE_CACHE_MAX_BODY_SIZE", 8 * 1024 * 1024)
+# Also cache count results in MongoDB, shared by every server process.
+PARSE_CACHE_PERSISTENT = env_bool("PARSE_CACHE_PERSISTENT", False)
+
+# Seconds to wait for a connection to a fetched page's server, 0 waits forever.
+FETCH_CONNECT_TIMEOUT = env_float("FETCH_CONNECT_TIMEOUT", 10)
+# Seconds to wait for each read of a fetched page, 0 waits forever.
+FETCH_READ_TIMEOUT = env_float("FETCH_READ_TIMEOUT", 30)
+# Seconds for fetching a whole page, 0 for no deadline.
+FETCH_DEADLINE = env_float("FETCH_DEADLINE", 60)
+# Maximum bytes of a fetched page body, 0 for no limit.
+FETCH_MAX_BODY_SIZE = env_int("FETCH_MAX_BODY_SIZE", 32 * 1024 * 1024)
+# Store the count of the part of a page fetched before a limit was hit, flagged as
+# truncated, rather than failing.
+FETCH_ALLOW_PARTIAL = env_bool("FETCH_ALLOW_PARTIAL", False)
+# Directory of pages recorded with `pipenv run record`, replayed instead of fetching
+# pages from the network, for load testing offline.
+FETCH_REPLAY_DIR = os.getenv("FETCH_REPLAY_DIR", "")
+# Seconds before each replayed response.
+FETCH_REPLAY_LATENCY = env_float("FETCH_REPLAY_LATENCY", 0)
+# Bytes per second that replayed pages are read at, 0 for unlimited.
+FETCH_REPLAY_BANDWIDTH = env_float("FETCH_REPLAY_BANDWIDTH", 0)
+# Accept gzip, deflate and (when the brotli package is installed) brotli compressed pages.
+FETCH_COMPRESSION = env_bool("FETCH_COMPRESSION", True)
+
+# Largest number of URLs accepted by one /count/batch request.
+BATCH_MAX_URLS = env_int("BATCH_MAX_URLS", 50)
+# Number of pages of a batch fetched and counted at once.
+BATCH_MAX_CONCURRENCY = env_int("BATCH_MAX_CONCURRENCY", 8)
+
+# Number of worker threads counting new and recounted URLs in the background, with
+# the counts page polling until they are done. 0 counts them within the request.
+COUNT_JOBS_WORKERS = env_int("COUNT_JOBS_WORKERS", 0)
+# Count jobs that may wait for a free worker before new ones get a 503.
+COUNT_JOBS_MAX_QUEUE = env_int("COUNT_JOBS_MAX_QUEUE", 16)
+# Seconds a count job may take before it is failed.
+COUNT_JOBS_TIMEOUT = env_float("COUNT_JOBS_TIMEOUT", 120)
+# Seconds between polls of the counts page for a count job.
+COUNT_JOBS_POLL_INTERVAL = env_float("COUNT_JOBS_POLL_INTERVAL", 1)
+
+# Links followed from the first page of a crawled site.
+CRAWL_MAX_DEPTH = env_int("CRAWL_MAX_DEPTH", 2)
+# Largest number of pages fetched when crawling a site.
+CRAWL_MAX_PAGES = env_int("CRAWL_MAX_PAGES", 20)
+# Number of pages of a crawled site fetched and counted at once.
+CRAWL_MAX_CONCURRENCY = env_int("CRAWL_MAX_CONCURRENCY", 4)
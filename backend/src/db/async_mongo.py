@@ -0,0 +1,364 @@
+import asyncio
+import http.client
+import urllib.error
+
+from pymongo.errors import DuplicateKeyError
+
+import config
+from db.mongo import (
+    COUNTS_PROJECTION,
+    WORDS_PROJECTION,
+    UrlError,
+    _conditional_headers,
+    _count_document,
+    _count_response,
+    _default_budget,
+    _recount_document,
+    _validators,
+    _words_page,
+    url_filter,
+)
+from libs.async_fetching import BufferedResponse, open_url, read_body
+from libs.engines import get_engine
+from libs.fetching import FetchBudget, FetchBudgetError
+from libs.metrics import metrics
+from libs.single_flight import AsyncSingleFlight
+from libs.urls import normalise_url
+
+# Counts and recounts in flight, so concurrent requests for the same URL share one.
+in_flight = AsyncSingleFlight()
+
+
+async def has_url_been_searched(url, client, raise_if_found, raise_if_not_found):
+    """Function to check if a searched URL already exists in MongoDB, without blocking.
+
+    URLs are compared by url_key, like db.mongo.has_url_been_searched.
+
+    Args:
+        url (str): URL that existing count information is checked for.
+        client: AsyncMongoClient.
+        raise_if_found (bool): Raise if URL information is found.
+        raise_if_not_found (bool): Raise if URL information is not found.
+
+    Raises:
+        UrlError: If error getting current searched URLs in MongoDB.
+        UrlError: If URL has already been searched for.
+
+    """
+    counts_collection = client["local_database"]["counts_collection"]
+
+    try:
+        is_url_found = await counts_collection.find_one(url_filter(url), {"_id": 1}) is not None
+    except Exception as err:
+        raise UrlError(
+            f"error getting searched URLs: {err}", 500)
+
+    if is_url_found and raise_if_found:
+        raise UrlError(
+            f"already searched for analysis of URL: {url}",
+            400)
+
+    if not is_url_found and raise_if_not_found:
+        raise UrlError(
+            f"URL has not been analysed yet: {url}",
+            400)
+
+
+async def _fetch(url, fetch_client, budget, headers=None):
+    """Function to fetch a whole page without blocking, as a BufferedResponse."""
+    if not config.FETCH_COMPRESSION:
+        headers = {"Accept-Encoding": "identity", **(headers or {})}
+    try:
+        response = await open_url(url, fetch_client, headers, budget)
+    except urllib.error.URLError as err:
+        code = 504 if isinstance(err.reason, TimeoutError) else 500
+        raise UrlError(f"error fetching HTML for URL: {
+            url}, err: {err.reason}", code)
+    except TimeoutError as err:
+        raise UrlError(
+            f"error fetching HTML for URL: {url}, err: {err}", 504)
+
+    async with response:
+        try:
+            body = await read_body(response, budget)
+        except FetchBudgetError as err:
+            code = 502 if err.reason == "max_body_size" else 504
+            raise UrlError(
+                f"error reading HTML for URL: {url}, err: {err.message}", code)
+        except (OSError, http.client.HTTPException) as err:
+            raise UrlError(
+                f"error reading HTML for URL: {url}, err: {err}", 500)
+    return BufferedResponse(getattr(response, "url", url), response.status,
+                            response.reason, response.headers, body)
+
+
+async def _count(url, response, counting_pool, engine, max_words, parse_cache, budget):
+    """Function to count a fetched page on a thread, so the event loop is not blocked."""
+    # The time limits were enforced while the body was read, so only the size
+    # limit and any truncation carry over to decompressing and counting it.
+    count_budget = FetchBudget(max_body_size=budget.max_body_size,
+                               allow_partial=budget.allow_partial)
+    count_budget.truncated = budget.truncated
+    return await asyncio.to_thread(
+        _count_response, url, response, counting_pool, engine, max_words, parse_cache,
+        count_budget)
+
+
+async def add_new_count(url, client, fetch_client, counting_pool=None, engine=None,
+                        compress=None, max_words=None, parse_cache=None, budget=None):
+    """Function to add new URL count information into MongoDB, without blocking.
+
+    The asyncio counterpart of db.mongo.add_new_count, storing the same count
+    document. The page is fetched without blocking and read into memory
+    (limited by the budget's max_body_size), then decompressed and counted on
+    a thread, or in the counting pool for large pages. Concurrent calls for the
+    same URL (after normalise_url) are coalesced.
+
+    Args:
+        url (str): URL that count information is added for.
+        client: AsyncMongoClient.
+        fetch_client: AsyncFetchClient, or another client with its open coroutine.
+        counting_pool: Optional CountingPool for counting large pages.
+        engine: Counting engine parser class, defaults to the configured COUNTING_ENGINE.
+        compress (bool): Compress the stored words, defaults to the configured WORDS_COMPRESSION.
+        max_words (int): Bound on distinct words for approximate counting, defaults
+            to the configured APPROXIMATE_MAX_WORDS (0 counts exactly).
+        parse_cache: Optional ParseCache, so identical pages are only parsed once.
+        budget: FetchBudget limiting the fetch, defaults to the configured FETCH_* limits.
+
+    Raises:
+        UrlError: If error getting current searched URLs in MongoDB (from has_url_been_searched).
+        UrlError: If URL has already been searched for (from has_url_been_searched).
+        UrlError: If error fetching HTML for searched URL.
+        UrlError: If error reading HTML for searched URL.
+        UrlError: If the fetch budget is hit and partial counts are not allowed.
+        UrlError: If the counting pool is full or times out.
+        UrlError: If error inserting count information into MongoDB.
+
+    """
+    return await in_flight.do(
+        ("add_new_count", normalise_url(url)), _add_new_count, url, client, fetch_client,
+        counting_pool, engine, compress, max_words, parse_cache, budget)
+
+
+async def _add_new_count(url, client, fetch_client, counting_pool, engine, compress, max_words,
+                         parse_cache, budget):
+    await has_url_been_searched(url, client, True, False)
+
+    counts_collection = client["local_database"]["counts_collection"]
+    if engine is None:
+        engine = get_engine(config.COUNTING_ENGINE)
+    if compress is None:
+        compress = config.WORDS_COMPRESSION
+    if max_words is None:
+        max_words = config.APPROXIMATE_MAX_WORDS
+    max_words = max_words or None
+    if budget is None:
+        budget = _default_budget()
+
+    response = await _fetch(url, fetch_client, budget)
+    count_info = await _count(
+        url, response, counting_pool, engine, max_words, parse_cache, budget)
+    info = _count_document(url, count_info, compress)
+    info.update(_validators(response.headers))
+
+    try:
+        await counts_collection.insert_one(info)
+    except DuplicateKeyError:
+        # Stored by another process since has_url_been_searched.
+        raise UrlError(
+            f"already searched for analysis of URL: {url}", 400)
+    except Exception as err:
+        raise UrlError(
+            f"error inserting data for URL: {url}, err: {err}", 500)
+
+
+async def recount(url, client, fetch_client, counting_pool=None, engine=None, compress=None,
+                  max_words=None, parse_cache=None, budget=None):
+    """Function to count an already searched URL again if it has changed, without blocking.
+
+    The asyncio counterpart of db.mongo.recount: the page is revalidated with
+    its stored etag/last_modified, and on a 304 Not Modified the stored count
+    is kept. Concurrent calls for the same URL share one recount. Crawled
+    sites can't be recounted, as sites are only crawled by db.mongo.
+
+    Args:
+        url (str): URL that count information is counted again for.
+        client: AsyncMongoClient.
+        fetch_client: AsyncFetchClient, or another client with its open coroutine.
+        counting_pool: Optional CountingPool for counting large pages.
+        engine: Counting engine parser class, defaults to the configured COUNTING_ENGINE.
+        compress (bool): Compress the stored words, defaults to the configured WORDS_COMPRESSION.
+        max_words (int): Bound on distinct words for approximate counting, defaults
+            to the configured APPROXIMATE_MAX_WORDS (0 counts exactly).
+        parse_cache: Optional ParseCache, so identical pages are only parsed once.
+        budget: FetchBudget limiting the fetch, defaults to the configured FETCH_* limits.
+
+    Returns:
+        The fetch outcome, "revalidated" or "refetched".
+
+    Raises:
+        UrlError: If error getting current searched URLs in MongoDB (from has_url_been_searched).
+        UrlError: If URL has not been searched for yet (from has_url_been_searched).
+        UrlError: If error finding word count information for URL.
+        UrlError: If the URL is a crawled site.
+        UrlError: If error fetching HTML for searched URL.
+        UrlError: If error reading HTML for searched URL.
+        UrlError: If the fetch budget is hit and partial counts are not allowed.
+        UrlError: If the counting pool is full or times out.
+        UrlError: If error updating count information in MongoDB.
+
+    """
+    return await in_flight.do(
+        ("recount", normalise_url(url)), _recount, url, client, fetch_client, counting_pool,
+        engine, compress, max_words, parse_cache, budget)
+
+
+async def _recount(url, client, fetch_client, counting_pool, engine, compress, max_words,
+                   parse_cache, budget):
+    await has_url_been_searched(url, client, False, True)
+
+    counts_collection = client["local_database"]["counts_collection"]
+    if engine is None:
+        engine = get_engine(config.COUNTING_ENGINE)
+    if compress is None:
+        compress = config.WORDS_COMPRESSION
+    if max_words is None:
+        max_words = config.APPROXIMATE_MAX_WORDS
+    max_words = max_words or None
+    if budget is None:
+        budget = _default_budget()
+
+    try:
+        count_doc = await counts_collection.find_one(
+            url_filter(url),
+            {"url": 1, "display": 1, "etag": 1, "last_modified": 1, "crawled_pages": 1},
+        )
+    except Exception as err:
+        raise UrlError(
+            f"error finding word count information for URL: {url}, err: {err}", 500)
+    if count_doc is None:
+        raise UrlError(
+            f"URL has not been analysed yet: {url}", 400)
+    # The URL as it was stored, which may be spelt differently.
+    url = count_doc.get("url", url)
+
+    # Replacing a site count with a count of its first page would lose the site's other pages.
+    if "crawled_pages" in count_doc:
+        raise UrlError(
+            f"crawled sites are only recounted by the threaded server, URL: {url}", 400)
+
+    response = await _fetch(url, fetch_client, budget, _conditional_headers(count_doc))
+    count_info = None
+    if response.status != http.HTTPStatus.NOT_MODIFIED:
+        count_info = await _count(
+            url, response, counting_pool, engine, max_words, parse_cache, budget)
+
+    outcome, info = _recount_document(url, count_doc, count_info, response.headers, compress)
+
+    try:
+        if count_info is not None:
+            await counts_collection.replace_one(url_filter(url), info)
+        else:
+            await counts_collection.update_one(url_filter(url), {"$set": info})
+    except Exception as err:
+        raise UrlError(
+            f"error updating count information for URL: {url}, err: {err}", 500)
+
+    metrics.increment(f"revalidation.{outcome}")
+    return outcome
+
+
+async def update_page(url, new_page, client):
+    """Function to update page in MongoDB for a given URL, without blocking.
+
+    Args:
+        url (str): URL that page is updated for.
+        new_page (int): New page value that URL page is updated to.
+        client: AsyncMongoClient.
+
+    Raises:
+        UrlError: If error getting current searched URLs in MongoDB (from has_url_been_searched).
+        UrlError: If URL has not been searched for yet (from has_url_been_searched).
+        UrlError: If error finding word count information for URL.
+        UrlError: If error updating page value for URL in MongoDB.
+
+    """
+    await has_url_been_searched(url, client, False, True)
+
+    counts_collection = client["local_database"]["counts_collection"]
+
+    try:
+        count_doc = await counts_collection.find_one(url_filter(url), WORDS_PROJECTION)
+    except Exception as err:
+        raise UrlError(
+            f"error finding word count information for URL: {url}, err: {err}", 500)
+    if count_doc is None:
+        raise UrlError(
+            f"URL has not been analysed yet: {url}", 400)
+    is_ranked = count_doc.get("words_list_is_ranked", True)
+
+    paginated_words_list = _words_page(count_doc, new_page, is_ranked)
+
+    try:
+        await counts_collection.update_one(
+            url_filter(url),
+            {"$set": {"current_page": new_page,
+                      "paginated_words_list": paginated_words_list}}
+        )
+    except Exception as err:
+        raise UrlError(
+            f"error updating page for URL: {url}, err: {err}", 500)
+
+
+async def update_display(url, display, client):
+    """Function to update display property in MongoDB for a given URL, without blocking.
+
+    Args:
+        url (str): URL that page is updated for.
+        display (bool): Dictates if the table of word counts information is displayed.
+        client: AsyncMongoClient.
+
+    Raises:
+        UrlError: If error getting current searched URLs in MongoDB (from has_url_been_searched).
+        UrlError: If URL has not been searched for yet (from has_url_been_searched).
+        UrlError: If error updating display value for URL in MongoDB.
+
+    """
+    await has_url_been_searched(url, client, False, True)
+
+    counts_collection = client["local_database"]["counts_collection"]
+
+    try:
+        result = await counts_collection.update_one(
+            url_filter(url),
+            {"$set": {"display": display}},
+        )
+    except Exception as err:
+        raise UrlError(
+            f"error updating display value for URL: {url}, err: {err}", 500)
+    if result.matched_count == 0:
+        raise UrlError(
+            f"URL has not been analysed yet: {url}", 400)
+
+
+async def get_counts(client):
+    """Function to get all counts in MongoDB, without blocking.
+
+    Args:
+        client: AsyncMongoClient.
+
+    Returns:
+        A list of the information on all word counts in MongoDB count collection.
+
+    Raises:
+        UrlError: If error getting counts.
+
+    """
+    counts_collection = client["local_database"]["counts_collection"]
+
+    try:
+        return await counts_collection.find({}, COUNTS_PROJECTION).to_list()
+    except Exception as err:
+        raise UrlError(
+            f"error getting all counts, err: {err}", 500)
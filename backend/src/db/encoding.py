@@ -0,0 +1,153 @@
+import heapq
+import sys
+import zlib
+from array import array
+
+from libs.ranking import RankedWords
+
+# Words are only ever made of ASCII letters and digits, so a newline can delimit them.
+WORDS_SEPARATOR = b"\n"
+COUNTS_TYPECODE = "I"
+
+
+def _pack_counts(counts):
+    packed = array(COUNTS_TYPECODE, counts)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _unpack_counts(data):
+    counts = array(COUNTS_TYPECODE)
+    counts.frombytes(data)
+    if sys.byteorder == "big":
+        counts.byteswap()
+    return counts
+
+
+def encode_words(words, counts, compress=False):
+    """Function to encode words and their counts into compact MongoDB fields.
+
+    Args:
+        words: An iterable of words.
+        counts: An iterable of the number of occurences of each word, in the same order.
+        compress (bool): Compress the encoded words and counts with zlib.
+
+    Returns:
+        Dictionary of MongoDB fields with: words_blob (newline delimited words),
+        counts_blob (little-endian unsigned 32-bit integers) and words_compression.
+
+    """
+    words_blob = WORDS_SEPARATOR.join(word.encode("ascii") for word in words)
+    counts_blob = _pack_counts(counts)
+    if compress:
+        words_blob = zlib.compress(words_blob)
+        counts_blob = zlib.compress(counts_blob)
+
+    return {
+        "words_blob": words_blob,
+        "counts_blob": counts_blob,
+        "words_compression": "zlib" if compress else None,
+    }
+
+
+def encode_words_list(words_list, compress=False):
+    """Function to encode a count's ranked words list into compact MongoDB fields.
+
+    If the words list is a RankedWords that has only been partly ranked, the
+    words are encoded in the order they were counted rather than ranking them
+    all, and words_list_is_ranked is set to False.
+
+    Args:
+        words_list: A sequence of [word, count] pairs, most frequent word first.
+        compress (bool): Compress the encoded words and counts with zlib.
+
+    Returns:
+        Dictionary of MongoDB fields from encode_words, plus words_list_is_ranked
+        if the words are not encoded in ranked order.
+
+    """
+    if isinstance(words_list, RankedWords) and not words_list.is_fully_ranked:
+        fields = encode_words(words_list.counts.keys(),
+                              words_list.counts.values(), compress)
+        fields["words_list_is_ranked"] = False
+        return fields
+    return encode_words((word for word, _ in words_list),
+                        (count for _, count in words_list), compress)
+
+
+def decode_words_list(count_doc):
+    """Function to decode a words list encoded with encode_words_list.
+
+    Args:
+        count_doc: A MongoDB count document with fields from encode_words_list.
+
+    Returns:
+        The ranked sequence of [word, count] pairs.
+
+    """
+    words = decode_words(count_doc)
+    if count_doc.get("words_list_is_ranked", True):
+        return words
+    return RankedWords(dict(words))
+
+
+def _blobs(count_doc):
+    words_blob = count_doc["words_blob"]
+    counts_blob = count_doc["counts_blob"]
+    if count_doc.get("words_compression") == "zlib":
+        words_blob = zlib.decompress(words_blob)
+        counts_blob = zlib.decompress(counts_blob)
+    return words_blob, counts_blob
+
+
+def _split_words(words_blob):
+    if not words_blob:
+        return []
+    return [word.decode("ascii") for word in words_blob.split(WORDS_SEPARATOR)]
+
+
+def decode_words(count_doc):
+    """Function to decode all of a document's words and counts.
+
+    Args:
+        count_doc: A MongoDB count document with fields from encode_words.
+
+    Returns:
+        A list of [word, count] pairs, in the order they were encoded.
+
+    """
+    words_blob, counts_blob = _blobs(count_doc)
+    return [list(item) for item in zip(_split_words(words_blob), _unpack_counts(counts_blob))]
+
+
+def decode_words_page(count_doc, start, stop, is_ranked=True):
+    """Function to decode a range of a document's ranked [word, count] pairs.
+
+    For ranked documents only the words and counts up to the end of the range
+    are decoded. For unranked documents all counts are decoded to select the
+    range with a heap, but only the selected words are decoded.
+
+    Args:
+        count_doc: A MongoDB count document with fields from encode_words.
+        start (int): Index of the first ranked pair in the range.
+        stop (int): Index after the last ranked pair in the range.
+        is_ranked (bool): Whether the words were encoded in ranked order.
+
+    Returns:
+        A list of [word, count] pairs, most frequent word first.
+
+    """
+    words_blob, counts_blob = _blobs(count_doc)
+    item_size = array(COUNTS_TYPECODE).itemsize
+
+    if is_ranked:
+        counts = _unpack_counts(
+            memoryview(counts_blob)[start * item_size:stop * item_size])
+        words = words_blob.split(WORDS_SEPARATOR, stop)[start:stop] if words_blob else []
+        return [[word.decode("ascii"), count] for word, count in zip(words, counts)]
+
+    counts = _unpack_counts(counts_blob)
+    indexes = heapq.nlargest(stop, range(len(counts)), key=counts.__getitem__)[start:stop]
+    words = words_blob.split(WORDS_SEPARATOR) if words_blob else []
+    return [[words[i].decode("ascii"), counts[i]] for i in indexes]
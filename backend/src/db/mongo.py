@@ -1,7 +1,66 @@
+import http.client
+import logging
 import math
-import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urldefrag, urljoin, urlsplit
 
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+import config
+from db.encoding import decode_words_page, encode_words, encode_words_list
 from libs.counting import count_information
+from libs.engines import get_engine
+from libs.fetching import (
+    CHUNK_SIZE,
+    ContentEncodingError,
+    FetchBudget,
+    FetchBudgetError,
+    decode_chunks,
+    open_url,
+    read_chunks,
+)
+from libs.metrics import metrics
+from libs.pooling import CountingPoolFullError, CountingPoolTimeoutError
+from libs.ranking import RankedWords
+from libs.single_flight import SingleFlight
+from libs.summaries import WordCounts
+from libs.urls import normalise_url
+
+# Number of words shown per page of a count table.
+PAGE_SIZE = 5
+# Stored count fields for the response headers used to revalidate a page.
+VALIDATOR_HEADERS = {"etag": "ETag", "last_modified": "Last-Modified"}
+# Request headers sent with each stored validator when recounting a page.
+CONDITIONAL_HEADERS = {"etag": "If-None-Match", "last_modified": "If-Modified-Since"}
+
+# Stored count fields rendered in the counts HTML.
+COUNTS_PROJECTION = {
+    "display": 1,
+    "word_count": 1,
+    "paginated_words_list": 1,
+    "url": 1,
+    "current_page": 1,
+    "num_pages": 1,
+    "is_approximate": 1,
+    "is_truncated": 1,
+    "crawled_pages": 1,
+}
+# Stored count fields read to rank another page of words.
+WORDS_PROJECTION = {
+    "words_list": 1,
+    "words_blob": 1,
+    "counts_blob": 1,
+    "words_compression": 1,
+    "words_list_is_ranked": 1,
+}
+
+# Error code of a write rejected by a unique index.
+DUPLICATE_KEY_ERROR = 11000
+
+# Counts and recounts in flight, so concurrent requests for the same URL share one.
+in_flight = SingleFlight()
 
 
 class UrlError(Exception):
@@ -23,9 +82,43 @@ class UrlError(Exception):
         super().__init__(self.message)
 
 
+def url_filter(url):
+    """Function to get the MongoDB filter of the count document of a URL.
+
+    Count documents are looked up and written by their url_key, the URL after
+    normalise_url, so every spelling of a URL finds the same document.
+
+    Args:
+        url (str): URL of the count document.
+
+    Returns:
+        The filter dictionary.
+
+    """
+    return {"url_key": normalise_url(url)}
+
+
+def create_indexes(client):
+    """Function to create the indexes of the counts collection, if they don't exist.
+
+    url_key is uniquely indexed, so a URL can only be stored once even when
+    counts of it in different processes finish together. Documents stored
+    before url_key was added have none until migrate_url_keys is run.
+
+    Args:
+        client: MongoDB client.
+
+    """
+    client["local_database"]["counts_collection"].create_index(
+        "url_key", unique=True, partialFilterExpression={"url_key": {"$type": "string"}})
+
+
 def has_url_been_searched(url, client, raise_if_found, raise_if_not_found):
     """Function to check if a searched URL already exists in MonggoDB.
 
+    URLs are compared by url_key (see url_filter), the key that concurrent
+    counts of a URL are coalesced by.
+
     Args:
         URL (str): URL that exisiting count information is checked for.
         client: MongoDB client.
@@ -40,15 +133,11 @@ def has_url_been_searched(url, client, raise_if_found, raise_if_not_found):
     counts_collection = client["local_database"]["counts_collection"]
 
     try:
-        searched_urls = counts_collection.find({}, {'url': 1, '_id': 0})
+        is_url_found = counts_collection.find_one(url_filter(url), {"_id": 1}) is not None
     except Exception as err:
         raise UrlError(
             f"error getting searched URLs: {err}", 500)
 
-    urls_list = [doc['url'] for doc in searched_urls]
-
-    is_url_found = url in urls_list
-
     if is_url_found and raise_if_found:
         raise UrlError(
             f"already searched for analysis of URL: {url}",
@@ -60,50 +149,631 @@ def has_url_been_searched(url, client, raise_if_found, raise_if_not_found):
             400)
 
 
-def add_new_count(url, client):
+def _default_budget():
+    """Function to create a FetchBudget from the configured FETCH_* limits."""
+    return FetchBudget(
+        connect_timeout=config.FETCH_CONNECT_TIMEOUT or None,
+        read_timeout=config.FETCH_READ_TIMEOUT or None,
+        deadline=config.FETCH_DEADLINE or None,
+        max_body_size=config.FETCH_MAX_BODY_SIZE or None,
+        allow_partial=config.FETCH_ALLOW_PARTIAL,
+    )
+
+
+def _fetch(url, fetch_client, budget, headers=None):
+    if not config.FETCH_COMPRESSION:
+        headers = {"Accept-Encoding": "identity", **(headers or {})}
+    try:
+        return open_url(url, fetch_client, headers, budget)
+    except urllib.error.URLError as err:
+        code = 504 if isinstance(err.reason, TimeoutError) else 500
+        raise UrlError(f"error fetching HTML for URL: {
+            url}, err: {err.reason}", code)
+    except TimeoutError as err:
+        raise UrlError(
+            f"error fetching HTML for URL: {url}, err: {err}", 504)
+
+
+def _count_response(url, response, counting_pool, engine, max_words, parse_cache, budget,
+                    collect_links=False):
+    chunks = read_chunks(response, CHUNK_SIZE, budget)
+    try:
+        if parse_cache is not None:
+            key, chunks = parse_cache.read(chunks, engine, max_words)
+            # Parts of pages are never cached, the rest of the page may differ.
+            if budget.truncated is not None:
+                key = None
+            count_info = parse_cache.get(key) if key is not None else None
+            if count_info is not None:
+                return count_info
+
+        chunks = decode_chunks(
+            chunks, errors="replace" if budget.allow_partial else "strict")
+        if counting_pool is None:
+            count_info = count_information(chunks, engine, max_words, collect_links)
+        else:
+            count_info = counting_pool.count(chunks, engine, max_words, collect_links)
+
+        if budget.truncated is not None:
+            count_info["is_truncated"] = True
+            count_info["truncated_reason"] = budget.truncated
+        elif parse_cache is not None and key is not None:
+            parse_cache.put(key, count_info)
+        return count_info
+    except FetchBudgetError as err:
+        code = 502 if err.reason == "max_body_size" else 504
+        raise UrlError(
+            f"error reading HTML for URL: {url}, err: {err.message}", code)
+    except ContentEncodingError as err:
+        raise UrlError(
+            f"error reading HTML for URL: {url}, err: {err.message}", 502)
+    except (OSError, http.client.HTTPException) as err:
+        raise UrlError(
+            f"error reading HTML for URL: {url}, err: {err}", 500)
+    except CountingPoolFullError as err:
+        raise UrlError(
+            f"error counting HTML for URL: {url}, err: {err.message}", 503)
+    except CountingPoolTimeoutError as err:
+        raise UrlError(
+            f"error counting HTML for URL: {url}, err: {err.message}", 504)
+
+
+def _validators(headers):
+    """Function to get the stored revalidation fields from response headers."""
+    validators = {}
+    for field, header in VALIDATOR_HEADERS.items():
+        value = headers.get(header)
+        if value is not None:
+            validators[field] = value
+    return validators
+
+
+def _count_document(url, count_info, compress):
+    words_list = count_info["words_list"]
+    info = {
+        "url": url,
+        "url_key": normalise_url(url),
+        "current_page": 1,
+        "display": True,
+        "num_pages": math.ceil(len(words_list) / PAGE_SIZE),
+        "paginated_words_list": words_list[0:PAGE_SIZE],
+    }
+    info.update(count_info)
+
+    del info["words_list"]
+
+    # Only the first page has been ranked, so the words may be stored in the
+    # order they were counted and later pages ranked on demand in update_page.
+    info.update(encode_words_list(words_list, compress))
+    return info
+
+
+def _count_url(url, counting_pool, engine, compress, max_words, fetch_client, parse_cache,
+               budget):
+    """Function to fetch and count a page, returning its count document."""
+    response = _fetch(url, fetch_client, budget)
+    with response:
+        count_info = _count_response(
+            url, response, counting_pool, engine, max_words, parse_cache, budget)
+
+    info = _count_document(url, count_info, compress)
+    info.update(_validators(response.headers))
+    return info
+
+
+def add_new_count(url, client, counting_pool=None, engine=None, compress=None, max_words=None,
+                  fetch_client=None, parse_cache=None, budget=None):
     """Function to add new URL count information into MongoDB.
 
+    The page is streamed: response chunks are decoded and parsed as they arrive,
+    so the full page body is never held in memory. With a counting pool, pages
+    over the pool's size threshold are instead counted in a worker process.
+    Words and counts are stored compactly, see db.encoding.encode_words. Counts
+    made with a bound on distinct words are stored with is_approximate and
+    max_count_error. The page's ETag and Last-Modified headers are stored as
+    etag and last_modified, for revalidating the page in recount. Fetching is
+    limited by the budget; if it is hit with partial counts allowed, the count
+    of the page read so far is stored with is_truncated and truncated_reason.
+    Concurrent calls for the same URL (after normalise_url) are coalesced: only
+    the first fetches and stores the page, and the others share its outcome,
+    including any error.
+
     Args:
         URL (str): URL that count information is added for.
         client: MongoDB client.
+        counting_pool: Optional CountingPool for counting large pages.
+        engine: Counting engine parser class, defaults to the configured COUNTING_ENGINE.
+        compress (bool): Compress the stored words, defaults to the configured WORDS_COMPRESSION.
+        max_words (int): Bound on distinct words for approximate counting, defaults
+            to the configured APPROXIMATE_MAX_WORDS (0 counts exactly).
+        fetch_client: Optional FetchClient for fetching over pooled connections.
+        parse_cache: Optional ParseCache, so identical pages are only parsed once.
+        budget: FetchBudget limiting the fetch, defaults to the configured FETCH_* limits.
 
     Raises:
         UrlError: If error getting current searched URLs in MongoDB (from has_url_been_searched).
         UrlError: If URL has already been searched for (from has_url_been_searched).
         UrlError: If error fetching HTML for searched URL.
+        UrlError: If error reading HTML for searched URL.
+        UrlError: If the fetch budget is hit and partial counts are not allowed.
+        UrlError: If the counting pool is full or times out.
         UrlError: If error inserting count information into MongoDB.
 
     """
+    return in_flight.do(
+        ("add_new_count", normalise_url(url)), _add_new_count, url, client, counting_pool,
+        engine, compress, max_words, fetch_client, parse_cache, budget)
+
+
+def _add_new_count(url, client, counting_pool, engine, compress, max_words, fetch_client,
+                   parse_cache, budget):
     has_url_been_searched(url, client, True, False)
 
     counts_collection = client["local_database"]["counts_collection"]
+    if engine is None:
+        engine = get_engine(config.COUNTING_ENGINE)
+    if compress is None:
+        compress = config.WORDS_COMPRESSION
+    if max_words is None:
+        max_words = config.APPROXIMATE_MAX_WORDS
+    max_words = max_words or None
+    if budget is None:
+        budget = _default_budget()
+
+    info = _count_url(url, counting_pool, engine, compress, max_words,
+                      fetch_client, parse_cache, budget)
 
     try:
-        contents = urllib.request.urlopen(url).read()
-    except urllib.error.URLError as err:
-        raise UrlError(f"error fetching HTML for URL: {
-            url}, err: {err.reason}", 500)
+        counts_collection.insert_one(info)
+    except DuplicateKeyError:
+        # Stored by another process since has_url_been_searched.
+        raise UrlError(
+            f"already searched for analysis of URL: {url}", 400)
+    except Exception as err:
+        raise UrlError(
+            f"error inserting data for URL: {url}, err: {err}", 500)
 
-    count_info = count_information(contents.decode('utf-8'))
-    info = {
-        "url": url,
-        "current_page": 1,
-        "display": True,
-        "num_pages": math.ceil(len(count_info["words_list"]) / 5),
-        "paginated_words_list": count_info["words_list"][0:5],
-    }
-    info.update(count_info)
+
+def add_new_counts(urls, client, max_concurrency=None, counting_pool=None, engine=None,
+                   compress=None, max_words=None, fetch_client=None, parse_cache=None):
+    """Function to add new count information for many URLs into MongoDB.
+
+    Pages are fetched and counted concurrently, by up to max_concurrency
+    threads, each with its own fetch budget, and the counts are inserted with
+    one unordered bulk write. Each URL is counted under the same in-flight key
+    as add_new_count, so a URL already being counted, by another batch or a
+    single /count, is left to that count and not stored twice. Unlike
+    add_new_count, a URL that fails does not fail the batch: its error is
+    returned and the other URLs are still added.
+
+    Args:
+        urls: A list of URLs that count information is added for, duplicates
+            (after normalise_url) are only counted once.
+        client: MongoDB client.
+        max_concurrency (int): Pages fetched and counted at once, defaults to the
+            configured BATCH_MAX_CONCURRENCY.
+        counting_pool: Optional CountingPool for counting large pages.
+        engine: Counting engine parser class, defaults to the configured COUNTING_ENGINE.
+        compress (bool): Compress the stored words, defaults to the configured WORDS_COMPRESSION.
+        max_words (int): Bound on distinct words for approximate counting, defaults
+            to the configured APPROXIMATE_MAX_WORDS (0 counts exactly).
+        fetch_client: Optional FetchClient for fetching over pooled connections.
+        parse_cache: Optional ParseCache, so identical pages are only parsed once.
+
+    Returns:
+        A dictionary of error messages for the URLs that could not be added, in
+        the order the URLs were given.
+
+    """
+    counts_collection = client["local_database"]["counts_collection"]
+    if max_concurrency is None:
+        max_concurrency = config.BATCH_MAX_CONCURRENCY
+    if engine is None:
+        engine = get_engine(config.COUNTING_ENGINE)
+    if compress is None:
+        compress = config.WORDS_COMPRESSION
+    if max_words is None:
+        max_words = config.APPROXIMATE_MAX_WORDS
+    max_words = max_words or None
+
+    unique_urls = {}
+    for url in urls:
+        unique_urls.setdefault(normalise_url(url), url)
+    urls = list(unique_urls.values())
+
+    infos = []
+    errors = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(urls)))) as executor:
+        futures = {
+            url: executor.submit(
+                in_flight.do, ("add_new_count", normalise_url(url)), _count_batch_url, url,
+                client, counting_pool, engine, compress, max_words, fetch_client, parse_cache,
+                _default_budget(), infos)
+            for url in urls
+        }
+        for url, future in futures.items():
+            try:
+                future.result()
+            except UrlError as err:
+                errors[url] = err.message
+            except Exception as err:
+                errors[url] = f"error counting HTML for URL: {url}, err: {err}"
+
+    if infos:
+        try:
+            counts_collection.insert_many(infos, ordered=False)
+        except BulkWriteError as err:
+            for write_error in err.details.get("writeErrors", []):
+                url = infos[write_error["index"]]["url"]
+                if write_error.get("code") == DUPLICATE_KEY_ERROR:
+                    errors[url] = f"already searched for analysis of URL: {url}"
+                else:
+                    errors[url] = f"error inserting data for URL: {url}, err: {write_error['errmsg']}"
+        except Exception as err:
+            for info in infos:
+                errors[info["url"]] = f"error inserting data for URL: {info['url']}, err: {err}"
+
+    return {url: errors[url] for url in urls if url in errors}
+
+
+def _count_batch_url(url, client, counting_pool, engine, compress, max_words, fetch_client,
+                     parse_cache, budget, infos):
+    """Function to count a URL of a batch, adding its count document to the batch's infos.
+
+    Only runs for a URL that isn't already in flight, callers that join
+    another count of the URL get None and have nothing to store.
+
+    """
+    has_url_been_searched(url, client, True, False)
+    infos.append(_count_url(url, counting_pool, engine, compress, max_words,
+                            fetch_client, parse_cache, budget))
+
+
+def crawl_site(url, client, max_depth=None, max_pages=None, max_concurrency=None,
+               counting_pool=None, engine=None, compress=None, max_words=None,
+               fetch_client=None):
+    """Function to count a site by crawling the same origin links from a URL.
+
+    Pages are crawled breadth first, one link depth at a time, with up to
+    max_concurrency pages of a depth fetched and counted at once. Links are
+    collected by the counting engine in the same pass that counts the words of
+    a page, and links to other origins or to pages already in the frontier
+    (after normalise_url) are skipped. Each page's count is stored in the
+    pages_collection with its site and depth, and the merged count of every
+    page is stored as the site's count in the counts_collection, with
+    crawled_pages, the number of pages counted.
+
+    Args:
+        url (str): URL of the first page of the site.
+        client: MongoDB client.
+        max_depth (int): Links followed from the first page, defaults to the
+            configured CRAWL_MAX_DEPTH.
+        max_pages (int): Pages fetched, including pages that fail, defaults to the
+            configured CRAWL_MAX_PAGES.
+        max_concurrency (int): Pages fetched and counted at once, defaults to the
+            configured CRAWL_MAX_CONCURRENCY.
+        counting_pool: Optional CountingPool for counting large pages.
+        engine: Counting engine parser class, defaults to the configured COUNTING_ENGINE.
+        compress (bool): Compress the stored words, defaults to the configured WORDS_COMPRESSION.
+        max_words (int): Bound on distinct words for approximate counting, defaults
+            to the configured APPROXIMATE_MAX_WORDS (0 counts exactly).
+        fetch_client: Optional FetchClient for fetching over pooled connections.
+
+    Returns:
+        A dictionary of error messages for the pages after the first that could
+        not be counted, in the order they were crawled.
+
+    Raises:
+        UrlError: If error getting current searched URLs in MongoDB (from has_url_been_searched).
+        UrlError: If URL has already been searched for (from has_url_been_searched).
+        UrlError: If the first page can't be fetched or counted.
+        UrlError: If error inserting count information into MongoDB.
+
+    """
+    return in_flight.do(
+        ("crawl_site", normalise_url(url)), _crawl_site, url, client, max_depth, max_pages,
+        max_concurrency, counting_pool, engine, compress, max_words, fetch_client)
+
+
+def _crawl_site(url, client, max_depth, max_pages, max_concurrency, counting_pool, engine,
+                compress, max_words, fetch_client):
+    has_url_been_searched(url, client, True, False)
+
+    database = client["local_database"]
+    page_docs, info, errors = _crawl(url, max_depth, max_pages, max_concurrency, counting_pool,
+                                     engine, compress, max_words, fetch_client)
 
     try:
-        counts_collection.insert_one(info)
+        database["pages_collection"].insert_many(page_docs, ordered=False)
+        database["counts_collection"].insert_one(info)
     except Exception as err:
         raise UrlError(
             f"error inserting data for URL: {url}, err: {err}", 500)
 
+    return errors
+
+
+def _crawl(url, max_depth, max_pages, max_concurrency, counting_pool, engine, compress,
+           max_words, fetch_client):
+    """Function to crawl a site, returning its page documents, site count document and errors."""
+    if max_depth is None:
+        max_depth = config.CRAWL_MAX_DEPTH
+    if max_pages is None:
+        max_pages = config.CRAWL_MAX_PAGES
+    if max_concurrency is None:
+        max_concurrency = config.CRAWL_MAX_CONCURRENCY
+    if engine is None:
+        engine = get_engine(config.COUNTING_ENGINE)
+    if compress is None:
+        compress = config.WORDS_COMPRESSION
+    if max_words is None:
+        max_words = config.APPROXIMATE_MAX_WORDS
+    max_words = max_words or None
+
+    origin = _origin(url)
+    frontier = {normalise_url(url)}
+    depth_urls = [url]
+    num_fetched = 0
+    pages = []
+    errors = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+        for depth in range(max_depth + 1):
+            depth_urls = depth_urls[:max_pages - num_fetched]
+            if not depth_urls:
+                break
+            num_fetched += len(depth_urls)
+            futures = [
+                (page_url, executor.submit(_crawl_page, page_url, counting_pool, engine,
+                                           max_words, fetch_client))
+                for page_url in depth_urls
+            ]
+
+            depth_urls = []
+            for page_url, future in futures:
+                result = _crawl_result(url, page_url, future, errors)
+                if result is None:
+                    continue
+                count_info, validators, final_url = result
+                links = count_info.pop("links")
+                pages.append((page_url, depth, count_info, validators))
+                frontier.add(normalise_url(final_url))
+                if depth < max_depth:
+                    depth_urls.extend(_new_links(links, final_url, origin, frontier))
+
+    page_docs, info = _site_documents(url, pages, compress)
+    return page_docs, info, errors
+
+
+def _crawl_result(url, page_url, future, errors):
+    """Function to get a crawled page's count, adding the error to errors if it failed.
+
+    Raises:
+        UrlError: If the first page, url, failed.
+
+    """
+    try:
+        return future.result()
+    except UrlError as err:
+        if page_url == url:
+            raise
+        errors[page_url] = err.message
+    except Exception as err:
+        if page_url == url:
+            raise UrlError(
+                f"error counting HTML for URL: {url}, err: {err}", 500)
+        errors[page_url] = f"error counting HTML for URL: {page_url}, err: {err}"
+    return None
+
+
+def _new_links(links, page_url, origin, frontier):
+    """Function to get the links of a page to the origin that are not in the frontier yet, adding them to it."""
+    new_links = []
+    for link in links:
+        link_url = urldefrag(urljoin(page_url, link)).url
+        if _origin(link_url) != origin:
+            continue
+        key = normalise_url(link_url)
+        if key not in frontier:
+            frontier.add(key)
+            new_links.append(link_url)
+    return new_links
+
+
+def _site_documents(url, pages, compress):
+    """Function to get the page documents and the site count document of a crawled site."""
+    page_docs = []
+    summary = WordCounts()
+    for page_url, depth, count_info, validators in pages:
+        summary.update(WordCounts(count_info["word_count"], count_info["words_list"].counts))
+        page_doc = {"site": url, "url": page_url, "depth": depth}
+        page_doc.update((field, value) for field, value in count_info.items()
+                        if field != "words_list")
+        page_doc.update(encode_words_list(count_info["words_list"], compress))
+        page_doc.update(validators)
+        page_docs.append(page_doc)
+
+    site_info = summary.to_count_information()
+    if any(count_info.get("is_truncated", False) for _, _, count_info, _ in pages):
+        site_info["is_truncated"] = True
+    info = _count_document(url, site_info, compress)
+    info["crawled_pages"] = len(pages)
+    return page_docs, info
+
+
+def _crawl_page(url, counting_pool, engine, max_words, fetch_client):
+    budget = _default_budget()
+    response = _fetch(url, fetch_client, budget)
+    with response:
+        count_info = _count_response(
+            url, response, counting_pool, engine, max_words, None, budget, collect_links=True)
+    return count_info, _validators(response.headers), getattr(response, "url", None) or url
+
+
+def _origin(url):
+    """Function to get the scheme, host and port of a URL, None if it is not a web URL."""
+    parts = urlsplit(normalise_url(url))
+    if parts.scheme not in ("http", "https"):
+        return None
+    return parts.scheme, parts.netloc.rpartition("@")[2]
+
+
+def recount(url, client, counting_pool=None, engine=None, compress=None, max_words=None,
+            fetch_client=None, parse_cache=None, budget=None):
+    """Function to count an already searched URL again, if it has changed.
+
+    The page is requested with If-None-Match/If-Modified-Since from its stored
+    etag/last_modified. If the server responds 304 Not Modified the stored count
+    is kept, otherwise the page is counted again and its count replaced. The
+    outcome is stored as fetch_outcome ("revalidated" or "refetched") and
+    recorded in the revalidation metrics. Like add_new_count, concurrent calls
+    for the same URL share one recount. A crawled site (a count with
+    crawled_pages) is crawled again with the configured CRAWL_* limits, and
+    its site count and page counts are replaced.
+
+    Args:
+        url (str): URL that count information is counted again for.
+        client: MongoDB client.
+        counting_pool: Optional CountingPool for counting large pages.
+        engine: Counting engine parser class, defaults to the configured COUNTING_ENGINE.
+        compress (bool): Compress the stored words, defaults to the configured WORDS_COMPRESSION.
+        max_words (int): Bound on distinct words for approximate counting, defaults
+            to the configured APPROXIMATE_MAX_WORDS (0 counts exactly).
+        fetch_client: Optional FetchClient for fetching over pooled connections.
+        parse_cache: Optional ParseCache, so identical pages are only parsed once.
+        budget: FetchBudget limiting the fetch, defaults to the configured FETCH_* limits.
+
+    Returns:
+        The fetch outcome, "revalidated" or "refetched".
+
+    Raises:
+        UrlError: If error getting current searched URLs in MongoDB (from has_url_been_searched).
+        UrlError: If URL has not been searched for yet (from has_url_been_searched).
+        UrlError: If error finding word count information for URL.
+        UrlError: If error fetching HTML for searched URL.
+        UrlError: If error reading HTML for searched URL.
+        UrlError: If the fetch budget is hit and partial counts are not allowed.
+        UrlError: If the counting pool is full or times out.
+        UrlError: If error updating count information in MongoDB.
+
+    """
+    return in_flight.do(
+        ("recount", normalise_url(url)), _recount, url, client, counting_pool, engine,
+        compress, max_words, fetch_client, parse_cache, budget)
+
+
+def _recount(url, client, counting_pool, engine, compress, max_words, fetch_client,
+             parse_cache, budget):
+    has_url_been_searched(url, client, False, True)
+
+    counts_collection = client["local_database"]["counts_collection"]
+    if engine is None:
+        engine = get_engine(config.COUNTING_ENGINE)
+    if compress is None:
+        compress = config.WORDS_COMPRESSION
+    if max_words is None:
+        max_words = config.APPROXIMATE_MAX_WORDS
+    max_words = max_words or None
+    if budget is None:
+        budget = _default_budget()
+
+    try:
+        count_doc = counts_collection.find_one(
+            url_filter(url),
+            {"url": 1, "display": 1, "etag": 1, "last_modified": 1, "crawled_pages": 1},
+        )
+    except Exception as err:
+        raise UrlError(
+            f"error finding word count information for URL: {url}, err: {err}", 500)
+    if count_doc is None:
+        raise UrlError(
+            f"URL has not been analysed yet: {url}", 400)
+    # The URL as it was stored, which may be spelt differently.
+    url = count_doc.get("url", url)
+
+    if "crawled_pages" in count_doc:
+        return _recrawl_site(url, client, count_doc, counting_pool, engine, compress,
+                             max_words, fetch_client)
+
+    response = _fetch(url, fetch_client, budget, _conditional_headers(count_doc))
+    with response:
+        is_modified = response.status != http.HTTPStatus.NOT_MODIFIED
+        count_info = None
+        if is_modified:
+            count_info = _count_response(
+                url, response, counting_pool, engine, max_words, parse_cache, budget)
+
+    outcome, info = _recount_document(url, count_doc, count_info, response.headers, compress)
+
+    try:
+        if is_modified:
+            counts_collection.replace_one(url_filter(url), info)
+        else:
+            counts_collection.update_one(url_filter(url), {"$set": info})
+    except Exception as err:
+        raise UrlError(
+            f"error updating count information for URL: {url}, err: {err}", 500)
+
+    metrics.increment(f"revalidation.{outcome}")
+    return outcome
+
+
+def _recrawl_site(url, client, count_doc, counting_pool, engine, compress, max_words,
+                  fetch_client):
+    """Function to crawl a site again, replacing its site count and page counts."""
+    database = client["local_database"]
+    page_docs, info, errors = _crawl(url, None, None, None, counting_pool, engine, compress,
+                                     max_words, fetch_client)
+    info["display"] = count_doc.get("display", True)
+    info["fetch_outcome"] = "refetched"
+
+    try:
+        database["pages_collection"].delete_many({"site": url})
+        database["pages_collection"].insert_many(page_docs, ordered=False)
+        database["counts_collection"].replace_one(url_filter(url), info)
+    except Exception as err:
+        raise UrlError(
+            f"error updating count information for URL: {url}, err: {err}", 500)
+
+    # A recount only reports its outcome, so errors of pages after the first are logged.
+    for message in errors.values():
+        logging.warning("Recrawling site %s: %s", url, message)
+    metrics.increment("revalidation.refetched")
+    return "refetched"
+
+
+def _conditional_headers(count_doc):
+    """Function to get the request headers revalidating a page from its stored validators."""
+    return {header: count_doc[field]
+            for field, header in CONDITIONAL_HEADERS.items() if field in count_doc}
+
+
+def _recount_document(url, count_doc, count_info, headers, compress):
+    """Function to get the outcome and the stored fields of a recount.
+
+    Returns:
+        "refetched" and the replacement count document if the page was counted
+        again, otherwise "revalidated" and the fields updated in the stored one.
+
+    """
+    if count_info is not None:
+        outcome = "refetched"
+        info = _count_document(url, count_info, compress)
+        info["display"] = count_doc.get("display", True)
+    else:
+        outcome = "revalidated"
+        info = {}
+    # A 304 may also carry newer validators for the same page.
+    info.update(_validators(headers))
+    info["fetch_outcome"] = outcome
+    return outcome, info
+
 
 def update_page(url, new_page, client):
     """Function to update page in MongoDB for a given URL.
 
+    Only the words on the new page are decoded, and words stored unranked (see
+    add_new_count) are ranked only as far as the new page.
+
     Args:
         url (str): URL that page is updated for.
         new_page (int): New page value that URL page is updated to.
@@ -121,25 +791,41 @@ def update_page(url, new_page, client):
     counts_collection = client["local_database"]["counts_collection"]
 
     try:
-        words_list = counts_collection.find_one(
-            {"url": {"$eq": url}},
-            {"words_list": 1},
-        )["words_list"]
+        count_doc = counts_collection.find_one(url_filter(url), WORDS_PROJECTION)
     except Exception as err:
         raise UrlError(
             f"error finding word count information for URL: {url}, err: {err}", 500)
+    if count_doc is None:
+        raise UrlError(
+            f"URL has not been analysed yet: {url}", 400)
+    is_ranked = count_doc.get("words_list_is_ranked", True)
+
+    paginated_words_list = _words_page(count_doc, new_page, is_ranked)
 
     try:
         counts_collection.update_one(
-            {"url": url},
-            {"$set": {"current_page": new_page, "paginated_words_list": words_list[(
-                new_page - 1) * 5: new_page * 5]}}
+            url_filter(url),
+            {"$set": {"current_page": new_page,
+                      "paginated_words_list": paginated_words_list}}
         )
     except Exception as err:
         raise UrlError(
             f"error updating page for URL: {url}, err: {err}", 500)
 
 
+def _words_page(count_doc, page, is_ranked):
+    """Function to get the ranked words and counts on a page of a count document."""
+    start = (page - 1) * PAGE_SIZE
+    stop = page * PAGE_SIZE
+    if "words_list" in count_doc:
+        # Documents stored before words were compactly encoded.
+        words_list = count_doc["words_list"]
+        if not is_ranked:
+            words_list = RankedWords(dict(words_list))
+        return words_list[start:stop]
+    return decode_words_page(count_doc, start, stop, is_ranked)
+
+
 def update_display(url, display, client):
     """Function to update display property in MongoDB for a given URL.
 
@@ -159,13 +845,16 @@ def update_display(url, display, client):
     counts_collection = client["local_database"]["counts_collection"]
 
     try:
-        counts_collection.update_one(
-            {"url": url},
+        result = counts_collection.update_one(
+            url_filter(url),
             {"$set": {"display": display}},
         )
     except Exception as err:
         raise UrlError(
             f"error updating display value for URL: {url}, err: {err}", 500)
+    if result.matched_count == 0:
+        raise UrlError(
+            f"URL has not been analysed yet: {url}", 400)
 
 
 def get_counts(client):
@@ -184,19 +873,93 @@ def get_counts(client):
     counts_collection = client["local_database"]["counts_collection"]
 
     try:
-        word_counts = counts_collection.find(
-            {},
-            {
-                "display": 1,
-                "word_count": 1,
-                "paginated_words_list": 1,
-                "url": 1,
-                "current_page": 1,
-                "num_pages": 1,
-            },
-        )
+        word_counts = counts_collection.find({}, COUNTS_PROJECTION)
     except Exception as err:
         raise UrlError(
             f"error getting all counts, err: {err}", 500)
 
     return word_counts
+
+
+def migrate_url_keys(client, batch_size=100):
+    """Function to add the url_key of count documents stored before it was added.
+
+    Args:
+        client: MongoDB client.
+        batch_size (int): Number of documents updated per bulk write.
+
+    Returns:
+        The number of migrated documents.
+
+    Raises:
+        UrlError: If error migrating the count documents.
+
+    """
+    counts_collection = client["local_database"]["counts_collection"]
+
+    migrated = 0
+    try:
+        updates = []
+        for count_doc in counts_collection.find(
+            {"url_key": {"$exists": False}},
+            {"url": 1},
+        ):
+            updates.append(UpdateOne(
+                {"_id": count_doc["_id"]},
+                {"$set": {"url_key": normalise_url(count_doc["url"])}},
+            ))
+            if len(updates) == batch_size:
+                migrated += counts_collection.bulk_write(updates).modified_count
+                updates = []
+        if updates:
+            migrated += counts_collection.bulk_write(updates).modified_count
+    except Exception as err:
+        raise UrlError(
+            f"error migrating URL keys, err: {err}", 500)
+
+    return migrated
+
+
+def migrate_words_lists(client, compress=False, batch_size=100):
+    """Function to migrate count documents from words_list arrays to compact encoded words.
+
+    Args:
+        client: MongoDB client.
+        compress (bool): Compress the encoded words.
+        batch_size (int): Number of documents updated per bulk write.
+
+    Returns:
+        The number of migrated documents.
+
+    Raises:
+        UrlError: If error migrating the count documents.
+
+    """
+    counts_collection = client["local_database"]["counts_collection"]
+
+    migrated = 0
+    try:
+        updates = []
+        for count_doc in counts_collection.find(
+            {"words_list": {"$exists": True}},
+            {"words_list": 1},
+        ):
+            words_list = count_doc["words_list"]
+            updates.append(UpdateOne(
+                {"_id": count_doc["_id"]},
+                {
+                    "$set": encode_words((word for word, _ in words_list),
+                                         (count for _, count in words_list), compress),
+                    "$unset": {"words_list": ""},
+                },
+            ))
+            if len(updates) == batch_size:
+                migrated += counts_collection.bulk_write(updates).modified_count
+                updates = []
+        if updates:
+            migrated += counts_collection.bulk_write(updates).modified_count
+    except Exception as err:
+        raise UrlError(
+            f"error migrating words lists, err: {err}", 500)
+
+    return migrated
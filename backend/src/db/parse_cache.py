@@ -0,0 +1,141 @@
+import hashlib
+import itertools
+import threading
+from collections import OrderedDict
+
+from db.encoding import decode_words_list, encode_words_list
+from libs.counting import Parser
+from libs.metrics import metrics
+from libs.tokenizing import TOKENIZER_VERSION
+
+
+class ParseCache:
+    """A cache of count information, keyed by a hash of the counted HTML.
+
+    Pages with byte-identical bodies (mirrors, query string variants, redirects
+    or unchanged pages) are only parsed once. Keys include TOKENIZER_VERSION,
+    so results are never reused after the word rules change, and the counting
+    engine, so one engine's results are never served for another's. Results
+    are kept in an in-memory LRU and, optionally, in a persistent MongoDB
+    collection shared by every server process.
+
+    Hits and misses are recorded in the parse_cache metrics: parse_cache.hit
+    (from memory), parse_cache.persistent_hit, parse_cache.miss and
+    parse_cache.error (the persistent tier failed and was skipped).
+
+    Args:
+        max_entries (int): Number of results kept in memory.
+        max_body_size (int): Largest body in bytes that is buffered to be hashed,
+            larger bodies are streamed and not cached.
+        collection: Optional MongoDB collection for the persistent tier.
+
+    Attributes:
+        max_entries (int): Number of results kept in memory.
+        max_body_size (int): Largest body in bytes that is buffered to be hashed.
+
+    """
+
+    def __init__(self, max_entries, max_body_size, collection=None):
+        self.max_entries = max_entries
+        self.max_body_size = max_body_size
+        self._collection = collection
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def read(self, chunks, engine=Parser, max_words=None):
+        """Method to read a body of chunks of bytes, to be looked up in the cache.
+
+        Args:
+            chunks: An iterable of chunks of bytes.
+            engine: Counting engine parser class the body is counted with.
+            max_words (int): Bound on distinct words the body is counted with.
+
+        Returns:
+            A tuple of the cache key, or None if the body is over max_body_size,
+            and an iterable of every chunk of the body, for counting it on a miss.
+
+        """
+        chunks = iter(chunks)
+        body = []
+        size = 0
+        digest = hashlib.sha256()
+        for chunk in chunks:
+            body.append(chunk)
+            size += len(chunk)
+            if size > self.max_body_size:
+                return None, itertools.chain(body, chunks)
+            digest.update(chunk)
+        engine_name = f"{engine.__module__}.{engine.__qualname__}"
+        return f"{TOKENIZER_VERSION}:{engine_name}:{max_words or 0}:{digest.hexdigest()}", body
+
+    def get(self, key):
+        """Method to get cached count information.
+
+        Args:
+            key (str): Cache key from read.
+
+        Returns:
+            Dictionary of count information, as returned by count_information,
+            or None if it is not cached.
+
+        """
+        with self._lock:
+            count_info = self._entries.get(key)
+            if count_info is not None:
+                self._entries.move_to_end(key)
+        if count_info is not None:
+            metrics.increment("parse_cache.hit")
+            return dict(count_info)
+
+        count_info = self._get_persistent(key)
+        if count_info is None:
+            metrics.increment("parse_cache.miss")
+            return None
+        metrics.increment("parse_cache.persistent_hit")
+        self._put_memory(key, count_info)
+        return dict(count_info)
+
+    def put(self, key, count_info):
+        """Method to cache count information.
+
+        Args:
+            key (str): Cache key from read.
+            count_info: Dictionary of count information, as returned by count_information.
+
+        """
+        self._put_memory(key, count_info)
+        if self._collection is None:
+            return
+        entry = {field: value for field, value in count_info.items() if field != "words_list"}
+        entry.update(encode_words_list(count_info["words_list"], compress=True))
+        try:
+            self._collection.replace_one({"_id": key}, entry, upsert=True)
+        except Exception:
+            metrics.increment("parse_cache.error")
+
+    def _get_persistent(self, key):
+        if self._collection is None:
+            return None
+        try:
+            entry = self._collection.find_one({"_id": key})
+        except Exception:
+            metrics.increment("parse_cache.error")
+            return None
+        if entry is None:
+            return None
+
+        count_info = {"word_count": entry["word_count"],
+                      "words_list": decode_words_list(entry)}
+        if entry.get("is_approximate", False):
+            count_info["is_approximate"] = True
+            count_info["max_count_error"] = entry["max_count_error"]
+        return count_info
+
+    def _put_memory(self, key, count_info):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = count_info
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
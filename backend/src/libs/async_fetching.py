@@ -0,0 +1,455 @@
+import asyncio
+import http.client
+import io
+import ssl
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from urllib.parse import urljoin, urlsplit
+
+from libs.fetch_client import (
+    DEFAULT_PORTS,
+    MAX_REDIRECT_BODY_SIZE,
+    MAX_REDIRECTS,
+    REDIRECT_STATUSES,
+    DnsCache,
+)
+from libs.fetching import ACCEPT_ENCODING, CHUNK_SIZE
+
+# Longest status or header line accepted from a fetched page's server.
+MAX_LINE_SIZE = 64 * 1024
+# Most header lines accepted from a fetched page's server.
+MAX_HEADERS = 100
+# Statuses that never have a body.
+NO_BODY_STATUSES = frozenset({204, 304})
+
+
+class AsyncResponse:
+    """A response from an AsyncFetchClient, returning its connection to the pool once closed.
+
+    The body is read with Content-Length or chunked framing, or until the
+    server closes the connection. Like a PooledResponse, the connection is only
+    kept alive if the whole body was read and the server did not ask for the
+    connection to be closed.
+
+    Attributes:
+        url (str): Final URL of the response, after any redirects.
+        status (int): HTTP status code.
+        reason (str): HTTP reason phrase.
+        headers: The response headers.
+
+    """
+
+    def __init__(self, client, key, reader, writer, url, status, reason, headers, will_close):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self._client = client
+        self._key = key
+        self._reader = reader
+        self._writer = writer
+        self._will_close = will_close
+        self._chunked = "chunked" in (headers.get("Transfer-Encoding") or "").lower()
+        self._chunk_left = 0
+        self._is_read = status in NO_BODY_STATUSES
+        self._length = None
+        if not self._is_read and not self._chunked and headers.get("Content-Length") is not None:
+            try:
+                self._length = int(headers["Content-Length"])
+            except ValueError:
+                raise http.client.HTTPException(
+                    f"invalid Content-Length: {headers['Content-Length']}")
+            self._is_read = self._length == 0
+        elif not self._is_read and not self._chunked:
+            # Without framing, the body is read until the server closes the connection.
+            self._will_close = True
+
+    async def read1(self, size=CHUNK_SIZE):
+        """Method to read up to size bytes of the body, b"" once it has been read.
+
+        Raises:
+            http.client.IncompleteRead: If the connection closes before the body ends.
+
+        """
+        if self._is_read:
+            return b""
+        size = size if size > 0 else CHUNK_SIZE
+        if self._chunked:
+            return await self._read_chunk(size)
+        if self._length is None:
+            data = await self._reader.read(size)
+            self._is_read = not data
+            return data
+
+        data = await self._reader.read(min(size, self._length))
+        if not data:
+            raise http.client.IncompleteRead(b"", self._length)
+        self._length -= len(data)
+        self._is_read = self._length == 0
+        return data
+
+    async def _read_chunk(self, size):
+        if self._chunk_left == 0:
+            line = await self._reader.readline()
+            try:
+                self._chunk_left = int(line.split(b";", 1)[0], 16)
+            except ValueError:
+                raise http.client.IncompleteRead(b"")
+            if self._chunk_left == 0:
+                # Skip any trailer headers up to the blank line ending the body.
+                while (await self._reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                self._is_read = True
+                return b""
+
+        data = await self._reader.read(min(size, self._chunk_left))
+        if not data:
+            raise http.client.IncompleteRead(b"", self._chunk_left)
+        self._chunk_left -= len(data)
+        if self._chunk_left == 0:
+            await self._reader.readline()
+        return data
+
+    async def read(self):
+        """Method to read the rest of the body."""
+        chunks = []
+        while chunk := await self.read1():
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    def close(self):
+        """Method to close the response, returning its connection to the pool if reusable."""
+        if self._writer is None:
+            return
+        self._client._release(self._key, self._reader, self._writer,
+                              self._is_read and not self._will_close)
+        self._writer = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+
+class BufferedResponse:
+    """A response whose body has been read into memory, for read_chunks.
+
+    Has the interface of a PooledResponse, so a body fetched without blocking
+    can be decompressed and counted by the same code as a streamed one.
+
+    Attributes:
+        url (str): Final URL of the response, after any redirects.
+        status (int): HTTP status code.
+        reason (str): HTTP reason phrase.
+        headers: The response headers.
+
+    """
+
+    def __init__(self, url, status, reason, headers, body):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self._body = io.BytesIO(body)
+
+    def read(self, size=None):
+        """Method to read up to size bytes of the body, or the rest of it by default."""
+        return self._body.read(size)
+
+    def read1(self, size=-1):
+        """Method to read up to size bytes of the body."""
+        return self._body.read1(size)
+
+    def close(self):
+        """Method to close the response."""
+        self._body.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class AsyncFetchClient:
+    """A non-blocking HTTP client for fetching pages over pooled keep-alive connections.
+
+    The asyncio counterpart of FetchClient, for the asyncio server: a fetch
+    waiting on a slow server holds a socket rather than a thread, so many
+    fetches can be in flight at once. Connections are kept open between
+    fetches, and host names are resolved through a DnsCache. Like
+    urllib.request.urlopen, redirects are followed and error statuses are
+    raised as urllib.error.HTTPError, with other failures raised as
+    urllib.error.URLError.
+
+    Args:
+        max_connections_per_host (int): Idle connections kept open per host.
+        max_hosts (int): Hosts that idle connections are kept open for, the
+            least recently used host's connections are closed first.
+        dns_cache_ttl (float): Seconds resolved host addresses are cached for.
+
+    Attributes:
+        max_connections_per_host (int): Idle connections kept open per host.
+        max_hosts (int): Hosts that idle connections are kept open for.
+
+    """
+
+    def __init__(self, max_connections_per_host, max_hosts, dns_cache_ttl):
+        self.max_connections_per_host = max_connections_per_host
+        self.max_hosts = max_hosts
+        self._dns_cache = DnsCache(dns_cache_ttl)
+        self._ssl_context = ssl.create_default_context()
+        self._idle = OrderedDict()
+        self._headers = {"User-Agent": f"Python-urllib/{urllib.request.__version__}"}
+
+    async def open(self, url, headers=None, budget=None):
+        """Method to fetch a URL, following redirects.
+
+        Args:
+            url (str): URL to fetch.
+            headers: Optional dictionary of extra request headers.
+            budget: Optional FetchBudget, for its connect and read timeouts.
+
+        Returns:
+            The AsyncResponse, to be closed once its body has been read.
+
+        Raises:
+            urllib.error.HTTPError: If the response has an error status.
+            urllib.error.URLError: If the URL can't be fetched.
+
+        """
+        headers = {**self._headers, **(headers or {})}
+        for _ in range(MAX_REDIRECTS + 1):
+            response = await self._request(url, headers, budget)
+            location = response.headers.get("Location")
+            if response.status not in REDIRECT_STATUSES or location is None:
+                break
+            await self._drain_redirect(response, budget)
+            url = urljoin(url, location)
+        else:
+            raise urllib.error.URLError(f"too many redirects for URL: {url}")
+
+        if response.status >= 400:
+            response._will_close = True
+            response.close()
+            raise urllib.error.HTTPError(
+                url, response.status, response.reason, response.headers, None)
+        return response
+
+    async def _drain_redirect(self, response, budget):
+        # Like FetchClient, only a redirect body with a Content-Length of at most
+        # MAX_REDIRECT_BODY_SIZE is read to keep the connection reusable. Any
+        # other body is left unread, and its connection closed.
+        if response._length is not None and response._length <= MAX_REDIRECT_BODY_SIZE:
+            try:
+                await asyncio.wait_for(response.read(), _read_timeout(budget))
+            except (OSError, http.client.HTTPException):
+                response._will_close = True
+        response.close()
+
+    async def _request(self, url, headers, budget):
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        if scheme not in DEFAULT_PORTS or not parts.hostname:
+            raise urllib.error.URLError(f"unknown url type: {url}")
+        try:
+            key = (scheme, parts.hostname, parts.port or DEFAULT_PORTS[scheme])
+        except ValueError as err:
+            raise urllib.error.URLError(err)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        host = parts.hostname if key[2] == DEFAULT_PORTS[scheme] else f"{parts.hostname}:{key[2]}"
+        request = "".join([
+            f"GET {path} HTTP/1.1\r\nHost: {host}\r\n",
+            *(f"{name}: {value}\r\n" for name, value in headers.items()),
+            "\r\n",
+        ]).encode("latin-1")
+
+        connection, is_reused = self._acquire(key), True
+        while True:
+            try:
+                if connection is None:
+                    connection, is_reused = await self._connect(key, budget), False
+                reader, writer = connection
+                writer.write(request)
+                await writer.drain()
+                status, reason, response_headers, will_close = await asyncio.wait_for(
+                    self._read_head(reader), _read_timeout(budget))
+                return AsyncResponse(self, key, reader, writer, url, status, reason,
+                                     response_headers, will_close)
+            except (ConnectionResetError, BrokenPipeError,
+                    http.client.RemoteDisconnected) as err:
+                self._close(connection)
+                if not is_reused:
+                    raise urllib.error.URLError(err)
+                # The server closed the idle connection, so retry on a new one.
+                connection = None
+            except (OSError, http.client.HTTPException) as err:
+                self._close(connection)
+                raise urllib.error.URLError(err)
+
+    async def _read_head(self, reader):
+        line = await _readline(reader, "status line")
+        if not line:
+            raise http.client.RemoteDisconnected("remote end closed connection without response")
+        try:
+            version, status, reason = (line.decode("latin-1").rstrip("\r\n").split(" ", 2)
+                                       + [""])[:3]
+            status = int(status)
+        except ValueError:
+            raise http.client.BadStatusLine(line)
+        if not version.startswith("HTTP/"):
+            raise http.client.BadStatusLine(line)
+
+        lines = []
+        while True:
+            line = await _readline(reader, "header line")
+            lines.append(line)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            if len(lines) > MAX_HEADERS:
+                raise http.client.HTTPException(f"got more than {MAX_HEADERS} headers")
+        headers = http.client.parse_headers(io.BytesIO(b"".join(lines)))
+
+        connection = (headers.get("Connection") or "").lower()
+        will_close = "close" in connection or (
+            version == "HTTP/1.0" and "keep-alive" not in connection)
+        return status, reason, headers, will_close
+
+    async def _connect(self, key, budget):
+        scheme, host, port = key
+        connect_timeout = budget.connect_timeout if budget is not None else None
+        loop = asyncio.get_running_loop()
+        # Lookups missing the cache still block, so they run in the default executor.
+        addresses = await loop.run_in_executor(None, self._dns_cache.resolve, host, port)
+        error = None
+        for ip in addresses:
+            try:
+                return await asyncio.wait_for(asyncio.open_connection(
+                    ip, port, limit=MAX_LINE_SIZE,
+                    ssl=self._ssl_context if scheme == "https" else None,
+                    server_hostname=host if scheme == "https" else None,
+                ), connect_timeout)
+            except OSError as err:
+                error = err
+        raise error if error is not None else OSError(f"no addresses for host: {host}")
+
+    def _acquire(self, key):
+        idle = self._idle.get(key)
+        while idle:
+            reader, writer = idle.pop()
+            # The server may have closed the connection while it was idle.
+            if not reader.at_eof() and not writer.is_closing():
+                return reader, writer
+            writer.close()
+        return None
+
+    def _release(self, key, reader, writer, reusable):
+        evicted = []
+        if reusable:
+            idle = self._idle.setdefault(key, [])
+            self._idle.move_to_end(key)
+            if len(idle) < self.max_connections_per_host:
+                idle.append((reader, writer))
+                writer = None
+            while len(self._idle) > self.max_hosts:
+                evicted.extend(self._idle.popitem(last=False)[1])
+        if writer is not None:
+            evicted.append((reader, writer))
+        for connection in evicted:
+            self._close(connection)
+
+    def _close(self, connection):
+        if connection is not None:
+            connection[1].close()
+
+    def close(self):
+        """Method to close every idle connection."""
+        idle, self._idle = self._idle, OrderedDict()
+        for connections in idle.values():
+            for connection in connections:
+                self._close(connection)
+
+
+async def _readline(reader, line_type):
+    try:
+        return await reader.readline()
+    except ValueError:
+        # Lines over the reader's limit of MAX_LINE_SIZE.
+        raise http.client.LineTooLong(line_type)
+
+
+def _read_timeout(budget):
+    return budget.read_timeout if budget is not None else None
+
+
+async def open_url(url, fetch_client, headers=None, budget=None):
+    """Function to open a URL without blocking, the asyncio counterpart of fetching.open_url.
+
+    Args:
+        url (str): URL to open.
+        fetch_client: AsyncFetchClient, or another client with its open coroutine.
+        headers: Optional dictionary of extra request headers, an Accept-Encoding
+            header replaces the default one.
+        budget: Optional FetchBudget, whose deadline is started here.
+
+    Returns:
+        The response, to be closed once its body has been read. A 304 Not
+        Modified response to a conditional request is returned rather than raised.
+
+    Raises:
+        urllib.error.URLError: If the URL can't be fetched.
+
+    """
+    headers = {"Accept-Encoding": ACCEPT_ENCODING, **(headers or {})}
+    if budget is not None:
+        budget.start()
+    return await fetch_client.open(url, headers, budget)
+
+
+async def read_body(response, budget=None, chunk_size=CHUNK_SIZE):
+    """Function to read a whole response body without blocking, within a budget.
+
+    The budget's read timeout applies to each read and its deadline is checked
+    between reads, like read_chunks. The body is returned as it was sent, so a
+    compressed body is limited by max_body_size before it is decompressed: a
+    body over it has been cut short and read_chunks then applies the limit to
+    the decompressed body.
+
+    Args:
+        response: A response with a read1(size) coroutine.
+        budget: Optional FetchBudget enforced while reading.
+        chunk_size (int): Maximum number of bytes per read.
+
+    Returns:
+        The body bytes, cut short if a limit was hit with partial bodies allowed.
+
+    Raises:
+        FetchBudgetError: If the budget is hit and partial bodies are not allowed.
+
+    """
+    chunks = []
+    size = 0
+    while True:
+        if budget is not None and budget.is_expired():
+            budget.exceeded(
+                f"fetch deadline of {budget.deadline} seconds exceeded", "deadline")
+            break
+        try:
+            chunk = await asyncio.wait_for(response.read1(chunk_size), _read_timeout(budget))
+        except TimeoutError:
+            if budget is None:
+                raise
+            budget.exceeded(
+                f"read timed out after {budget.read_timeout} seconds", "read_timeout")
+            break
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size += len(chunk)
+        if budget is not None and budget.max_body_size is not None and size > budget.max_body_size:
+            break
+    return b"".join(chunks)
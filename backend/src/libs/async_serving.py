@@ -0,0 +1,167 @@
+import asyncio
+import email.utils
+import http.client
+import io
+import logging
+import platform
+from http import HTTPStatus
+
+# Seconds a client may take to send the request line and headers.
+REQUEST_TIMEOUT = 30
+# Longest request or header line accepted.
+MAX_LINE_SIZE = 64 * 1024
+# Most header lines accepted.
+MAX_HEADERS = 100
+
+
+class AsyncBaseHTTPRequestHandler:
+    """The asyncio counterpart of http.server.BaseHTTPRequestHandler.
+
+    Parses one request from the connection and calls the do_<command>
+    coroutine for its method, with the same attributes (command, path,
+    request_version and headers) and the same send_response, send_header,
+    end_headers and wfile.write methods for building the response, so a
+    handler's routes read the same as a BaseHTTPRequestHandler's. Like
+    BaseHTTPRequestHandler with its default HTTP/1.0 protocol, the connection
+    is closed after the response.
+
+    Args:
+        reader: The connection's asyncio.StreamReader.
+        writer: The connection's asyncio.StreamWriter.
+
+    Attributes:
+        client_address: The (host, port) address of the client.
+        wfile: The connection's asyncio.StreamWriter, buffering the response.
+
+    """
+
+    server_version = "AsyncHTTP/0.1"
+    sys_version = "Python/" + platform.python_version()
+    protocol_version = "HTTP/1.0"
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.wfile = writer
+        self.client_address = writer.get_extra_info("peername")
+        self.command = None
+        self.path = None
+        self.request_version = self.protocol_version
+        self.requestline = ""
+        self.headers = {}
+        self._headers_buffer = []
+
+    async def handle(self):
+        """Method to handle the request on the connection, then close it."""
+        try:
+            if await asyncio.wait_for(self.parse_request(), REQUEST_TIMEOUT):
+                method = getattr(self, f"do_{self.command}", None)
+                if method is None:
+                    self.send_error(HTTPStatus.NOT_IMPLEMENTED,
+                                    f"Unsupported method ({self.command!r})")
+                else:
+                    await method()
+            await self.wfile.drain()
+        except (TimeoutError, ConnectionError):
+            pass
+        finally:
+            self.wfile.close()
+            try:
+                await self.wfile.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def parse_request(self):
+        """Method to read and parse the request line and headers.
+
+        Returns:
+            True if the request was parsed, otherwise False after sending an error.
+
+        """
+        try:
+            line = await self.reader.readline()
+        except ValueError:
+            self.send_error(HTTPStatus.REQUEST_URI_TOO_LONG)
+            return False
+        if not line:
+            return False
+        self.requestline = line.decode("latin-1").rstrip("\r\n")
+        words = self.requestline.split()
+        if len(words) != 3 or not words[2].startswith("HTTP/"):
+            self.send_error(HTTPStatus.BAD_REQUEST,
+                            f"Bad request syntax ({self.requestline!r})")
+            return False
+        self.command, self.path, self.request_version = words
+
+        lines = []
+        while True:
+            try:
+                line = await self.reader.readline()
+            except ValueError:
+                self.send_error(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Line too long")
+                return False
+            lines.append(line)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            if len(lines) > MAX_HEADERS:
+                self.send_error(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Too many headers")
+                return False
+        self.headers = http.client.parse_headers(io.BytesIO(b"".join(lines)))
+        return True
+
+    def send_response(self, code, message=None):
+        """Method to add the status line and the Server and Date headers to the headers buffer."""
+        self.log_request(code)
+        if message is None:
+            try:
+                message = HTTPStatus(code).phrase
+            except ValueError:
+                message = ""
+        self._headers_buffer.append(
+            f"{self.protocol_version} {code} {message}\r\n".encode("latin-1"))
+        self.send_header("Server", f"{self.server_version} {self.sys_version}")
+        self.send_header("Date", email.utils.formatdate(usegmt=True))
+
+    def send_header(self, keyword, value):
+        """Method to add a header to the headers buffer."""
+        self._headers_buffer.append(f"{keyword}: {value}\r\n".encode("latin-1"))
+
+    def end_headers(self):
+        """Method to end the headers and write the headers buffer to the connection."""
+        self._headers_buffer.append(b"\r\n")
+        self.wfile.write(b"".join(self._headers_buffer))
+        self._headers_buffer = []
+
+    def send_error(self, code, message=None):
+        """Method to respond with an error status and a plain text body."""
+        body = (message or HTTPStatus(code).phrase).encode("utf-8", "replace")
+        self.send_response(code)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_request(self, code):
+        """Method to log the request line and response status of a request."""
+        logging.info('%s - "%s" %s', self.client_address, self.requestline, int(code))
+
+
+async def start_server(handler_factory, host, port, backlog=100):
+    """Function to start an asyncio server handling each connection with a new handler.
+
+    Args:
+        handler_factory: Function creating an AsyncBaseHTTPRequestHandler from a
+            connection's reader and writer, such as the handler class.
+        host (str): Host to listen on.
+        port (int): Port to listen on, 0 for any free port.
+        backlog (int): Listen backlog of connections not yet accepted.
+
+    Returns:
+        The listening asyncio.Server.
+
+    """
+    async def handle_connection(reader, writer):
+        await handler_factory(reader, writer).handle()
+
+    return await asyncio.start_server(
+        handle_connection, host, port, backlog=backlog, limit=MAX_LINE_SIZE)
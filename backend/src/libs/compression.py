@@ -0,0 +1,138 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+from libs.metrics import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Content codings responses may be compressed with, most preferred first, brotli
+# only when installed.
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+# Compression levels suited to compressing fragments as they are served.
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def negotiate_encoding(accept_encoding):
+    """Function to choose the content coding of a response from a request's Accept-Encoding.
+
+    Args:
+        accept_encoding (str): Accept-Encoding header of the request, e.g. "gzip, br;q=0.9".
+
+    Returns:
+        The accepted coding from ENCODINGS with the highest quality value, the
+        most preferred on ties, or None if none of them is accepted.
+
+    """
+    qualities = {}
+    for coding in accept_encoding.split(","):
+        name, _, params = coding.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        param, _, value = params.partition("=")
+        if param.strip().lower() == "q":
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        qualities[name] = quality
+
+    wildcard = qualities.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for encoding in ENCODINGS:
+        quality = qualities.get(encoding, wildcard)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(content, encoding):
+    """Function to compress response content with a content coding.
+
+    Args:
+        content (bytes): Response content.
+        encoding (str): Content coding from ENCODINGS.
+
+    Returns:
+        The compressed content.
+
+    """
+    if encoding == "br":
+        return brotli.compress(content, quality=BROTLI_QUALITY)
+    # mtime=0 so identical content always compresses to identical bytes.
+    return gzip.compress(content, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class ResponseCompressor:
+    """Compresses response content with the coding negotiated from Accept-Encoding.
+
+    Content shorter than min_size is sent as it is, as compressing it would
+    save less than it costs. Fragments are often served again byte for byte
+    (the reset form, or the counts when nothing has changed since the last
+    request), so the compressed bytes are kept in an LRU keyed by a hash of
+    the content and reused, rather than compressed again.
+
+    Hits and misses are recorded in the compression metrics: compression.hit
+    and compression.miss.
+
+    Args:
+        min_size (int): Smallest content in bytes that is compressed.
+        max_entries (int): Number of compressed contents kept, 0 to compress
+            every response.
+
+    Attributes:
+        min_size (int): Smallest content in bytes that is compressed.
+        max_entries (int): Number of compressed contents kept.
+
+    """
+
+    def __init__(self, min_size, max_entries):
+        self.min_size = min_size
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def compress(self, content, accept_encoding):
+        """Method to compress response content for a request.
+
+        Args:
+            content (bytes): Response content.
+            accept_encoding (str): Accept-Encoding header of the request.
+
+        Returns:
+            A tuple of the content to send and its content coding, or None
+            when it is sent uncompressed.
+
+        """
+        if len(content) < self.min_size:
+            return content, None
+        encoding = negotiate_encoding(accept_encoding)
+        if encoding is None:
+            return content, None
+        if self.max_entries <= 0:
+            return compress(content, encoding), encoding
+
+        key = (encoding, hashlib.blake2b(content, digest_size=16).digest())
+        with self._lock:
+            compressed = self._entries.get(key)
+            if compressed is not None:
+                self._entries.move_to_end(key)
+        if compressed is not None:
+            metrics.increment("compression.hit")
+            return compressed, encoding
+
+        metrics.increment("compression.miss")
+        compressed = compress(content, encoding)
+        with self._lock:
+            self._entries[key] = compressed
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return compressed, encoding
@@ -1,100 +1,293 @@
-import re
+from collections import Counter
 from html.parser import HTMLParser
 
+from libs.summaries import HeavyHitters, WordCounts
+from libs.tokenizing import count_words
+
+# Characters of buffered text past which the words it completes are counted,
+# so a huge text node is not held in memory whole until the next tag.
+MAX_PENDING_DATA_SIZE = 64 * 1024
+
+# A non-exhaustive set of accepted HTML tags to count words within.
+ACCEPTED_HTML_TAGS = frozenset([
+    "body",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "section",
+    "address",
+    "li",
+    "ol",
+    "ul",
+    "p",
+    "a",
+    "abbr",
+    "b",
+    "em",
+    "thead",
+    "th",
+    "tr",
+    "tfoot",
+    "button",
+])
+
+# Elements that never have content or an end tag.
+VOID_HTML_TAGS = frozenset([
+    "area",
+    "base",
+    "br",
+    "col",
+    "embed",
+    "hr",
+    "img",
+    "input",
+    "link",
+    "meta",
+    "param",
+    "source",
+    "track",
+    "wbr",
+])
+
+_P_CLOSING_TAGS = frozenset([
+    "address",
+    "article",
+    "aside",
+    "blockquote",
+    "dd",
+    "details",
+    "div",
+    "dl",
+    "dt",
+    "fieldset",
+    "figcaption",
+    "figure",
+    "footer",
+    "form",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "h6",
+    "header",
+    "hr",
+    "li",
+    "main",
+    "nav",
+    "ol",
+    "p",
+    "pre",
+    "section",
+    "table",
+    "ul",
+])
+
+# Elements whose end tag may be omitted, mapped to the start tags that implicitly close them.
+IMPLICITLY_CLOSED_HTML_TAGS = {
+    "p": _P_CLOSING_TAGS,
+    "li": frozenset(["li"]),
+    "dt": frozenset(["dt", "dd"]),
+    "dd": frozenset(["dt", "dd"]),
+    "option": frozenset(["option", "optgroup"]),
+}
+
 
 class Parser(HTMLParser):
     """A parser for taking in an HTML feed and collectin word count information.
 
+    Args:
+        words_list: Optional Counter-like accumulator of words, e.g. a HeavyHitters
+            for approximate counting. A new Counter by default.
+        collect_links (bool): Also collect the href of every <a> tag.
+
     Attributes:
         word_count (int): The total word count in the HTML.
-        words_list: A dictionary of words and number of occurences for each word.
+        words_list: A Counter of words and number of occurences for each word.
+        links: A list of the href of every <a> tag, in the order they appear, or
+            None if links are not collected.
         currently_opened_tags: A list stack of encountered HTML tags.
-        accepted_html_tags: A non-exhaustive list of accepted HTML tags to count words within.
+        open_tag_counts: A Counter of how many times each tag is in currently_opened_tags.
+        body_depth (int): The number of currently opened body tags.
+        accepted_html_tags: A non-exhaustive set of accepted HTML tags to count words within.
+        pending_data: A list of countable text pieces not yet split into words.
+        pending_size (int): The number of characters in pending_data.
+
+    The HTML can be fed in as many chunks as needed. Text is only split into words
+    once the next tag (or the end of the feed) is reached, or once more than
+    MAX_PENDING_DATA_SIZE characters are buffered, when the text up to its last
+    whitespace is split, so words split across chunk boundaries are counted whole.
 
     """
 
-    def __init__(self):
+    def __init__(self, words_list=None, collect_links=False):
         super().__init__()
         self.word_count = 0
-        self.words_list = {}
+        self.words_list = Counter() if words_list is None else words_list
+        self.links = [] if collect_links else None
         self.currently_opened_tags = []
-        self.accepted_html_tags = [
-            "body",
-            "h1",
-            "h2",
-            "h3",
-            "h4",
-            "h5",
-            "section",
-            "address",
-            "li",
-            "ol",
-            "ul",
-            "p",
-            "a",
-            "abbr",
-            "b",
-            "em",
-            "thead",
-            "th",
-            "tr",
-            "tfoot",
-            "button",
-        ]
+        self.open_tag_counts = Counter()
+        self.body_depth = 0
+        self.accepted_html_tags = ACCEPTED_HTML_TAGS
+        self.pending_data = []
+        self.pending_size = 0
+        self._flush_size = MAX_PENDING_DATA_SIZE
 
-    def handle_starttag(self, tag, attrs):
-        """Method to add start tag to tag stack."""
+    def _push_tag(self, tag):
         self.currently_opened_tags.append(tag)
+        self.open_tag_counts[tag] += 1
+        if tag == "body":
+            self.body_depth += 1
+
+    def _pop_tag(self):
+        tag = self.currently_opened_tags.pop()
+        self.open_tag_counts[tag] -= 1
+        if tag == "body":
+            self.body_depth -= 1
+        return tag
+
+    def _buffer_data(self, data):
+        self.pending_data.append(data)
+        self.pending_size += len(data)
+        if self.pending_size > self._flush_size:
+            self._flush_words()
+
+    def _flush_words(self):
+        data = "".join(self.pending_data)
+        if data[-1].isspace():
+            tail = ""
+        else:
+            # Whitespace ends every word, so the text before the last word is
+            # counted the same on its own.
+            tail = data.rsplit(None, 1)[-1]
+        head = data[:len(data) - len(tail)]
+        self.pending_data = [tail] if tail else []
+        self.pending_size = len(tail)
+        # A run without whitespace is kept whole, so it is only searched again
+        # once the buffer has doubled, rather than on every piece of text.
+        self._flush_size = max(MAX_PENDING_DATA_SIZE, 2 * len(tail))
+        if head:
+            self._count_data(head)
+
+    def _flush_data(self):
+        if self.pending_data:
+            data = "".join(self.pending_data)
+            self.pending_data = []
+            self.pending_size = 0
+            self._flush_size = MAX_PENDING_DATA_SIZE
+            self._count_data(data)
+
+    def _count_data(self, data):
+        self.word_count += count_words(data, self.words_list)
+
+    def _add_link(self, href):
+        if href:
+            href = href.strip()
+            if href:
+                self.links.append(href)
+
+    def close(self):
+        """Method to process any remaining buffered HTML and text."""
+        super().close()
+        self._flush_data()
+
+    def handle_starttag(self, tag, attrs):
+        """Method to add start tag to tag stack, closing any implicitly ended tags."""
+        self._flush_data()
+        if tag == "a" and self.links is not None:
+            self._add_link(dict(attrs).get("href"))
+        opened_tags = self.currently_opened_tags
+        while opened_tags and tag in IMPLICITLY_CLOSED_HTML_TAGS.get(opened_tags[-1], ()):
+            self._pop_tag()
+
+        if tag not in VOID_HTML_TAGS:
+            self._push_tag(tag)
 
     def handle_endtag(self, tag):
-        """Method to pop end tag from tag stack."""
-        self.currently_opened_tags.pop(len(self.currently_opened_tags) - 1)
+        """Method to pop end tag, and any unclosed tags within it, from tag stack.
+
+        End tags for elements that are not open (including void elements) are ignored.
+        """
+        self._flush_data()
+        if self.open_tag_counts[tag] > 0:
+            while self._pop_tag() != tag:
+                pass
+
+    def handle_comment(self, data):
+        """Method to end any text run at a comment."""
+        self._flush_data()
+
+    def handle_decl(self, decl):
+        """Method to end any text run at a declaration."""
+        self._flush_data()
+
+    def handle_pi(self, data):
+        """Method to end any text run at a processing instruction."""
+        self._flush_data()
+
+    def unknown_decl(self, data):
+        """Method to end any text run at a CDATA section or unknown declaration."""
+        self._flush_data()
 
     def handle_data(self, data):
-        """Method to analyse HTML and update self.words_list and self.word_count."""
-        if self.currently_opened_tags.count("body") == 1 and self.accepted_html_tags.count(self.currently_opened_tags[len(self.currently_opened_tags) - 1]) == 1:
-            data_list = re.split("\s", data)
-            final_list = []
-            for word in data_list:
-                updated_word = re.sub("[.,!?]+$", "", word)
-                if not re.search("[^a-zA-Z0-9]", updated_word) and updated_word != "":
-                    final_list.append(updated_word.lower())
+        """Method to buffer countable text until it is analysed into self.words_list and self.word_count."""
+        if self.body_depth == 1 and self.currently_opened_tags[-1] in ACCEPTED_HTML_TAGS:
+            self._buffer_data(data)
 
-            for word in final_list:
-                if word in self.words_list:
-                    self.words_list[word] += 1
-                else:
-                    self.words_list[word] = 1
 
-            self.word_count += len(final_list)
+def _parse(html, engine, max_words, collect_links=False):
+    parser = engine(None if max_words is None else HeavyHitters(max_words), collect_links)
+    if isinstance(html, str):
+        parser.feed(html)
+    else:
+        for chunk in html:
+            parser.feed(chunk)
+    parser.close()
+    return parser
 
 
-def count_information(html):
-    """Function to return count information for a given HTML input.
+def count_summary(html, engine=Parser, max_words=None):
+    """Function to return a mergeable summary of the words in a given HTML input.
 
     Args:
-        html: HTML to be analysed for word count.
+        html: HTML to be analysed for word count, either as a string or as an
+            iterable of string chunks (e.g. streamed from a response).
+        engine: Counting engine parser class, Parser by default (see libs.engines).
+        max_words (int): Optional bound on the number of distinct words held in
+            memory. When set, the total word count is still exact but the counts
+            of words are approximate (see libs.summaries.HeavyHitters).
 
     Returns:
-        Dictionary of word count information with: word_count, words_list.
+        The WordCounts summary of the HTML.
 
     """
-    parser = Parser()
-    parser.feed(html)
+    return WordCounts.from_parser(_parse(html, engine, max_words))
 
-    word_count = getattr(parser, 'word_count')
-    words_list_dict = getattr(parser, 'words_list')
 
-    words_list = []
-    for key, value in words_list_dict.items():
-        words_list.append([key, value])
+def count_information(html, engine=Parser, max_words=None, collect_links=False):
+    """Function to return count information for a given HTML input.
 
-    def sort_by_word_count(item):
-        return item[1]
+    Args:
+        html: HTML to be analysed for word count, either as a string or as an
+            iterable of string chunks (e.g. streamed from a response).
+        engine: Counting engine parser class, Parser by default (see libs.engines).
+        max_words (int): Optional bound on the number of distinct words held in
+            memory, for approximate counting (see count_summary).
+        collect_links (bool): Also return the links of the HTML, collected in
+            the same pass as the words are counted.
 
-    words_list.sort(key=sort_by_word_count, reverse=True)
+    Returns:
+        Dictionary of word count information with: word_count, words_list.
+        The words_list is a lazily ranked sequence of [word, count] pairs, so
+        reading only the first page of it does not sort the whole vocabulary.
+        Approximate counts also have is_approximate and max_count_error, and
+        with collect_links there is also links, the href of every <a> tag.
 
-    return {
-        "word_count": word_count,
-        "words_list": words_list,
-    }
+    """
+    parser = _parse(html, engine, max_words, collect_links)
+    count_info = WordCounts.from_parser(parser).to_count_information()
+    if collect_links:
+        count_info["links"] = parser.links
+    return count_info
@@ -0,0 +1,29 @@
+from libs.counting import Parser
+from libs.scanning import Scanner
+
+# Counting engines by name. Each is a parser class with the feed/close interface
+# and word_count/words_list attributes of libs.counting.Parser.
+ENGINES = {
+    "html_parser": Parser,
+    "scanner": Scanner,
+}
+
+
+def get_engine(name):
+    """Function to get a counting engine by name.
+
+    Args:
+        name (str): Name of the counting engine.
+
+    Returns:
+        The counting engine parser class.
+
+    Raises:
+        ValueError: If there is no counting engine with the name.
+
+    """
+    try:
+        return ENGINES[name]
+    except KeyError:
+        raise ValueError(
+            f"unknown counting engine: {name}, expected one of: {', '.join(ENGINES)}")
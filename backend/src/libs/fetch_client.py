@@ -0,0 +1,301 @@
+import http.client
+import socket
+import ssl
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from urllib.parse import urljoin, urlsplit
+
+# Statuses that are followed to their Location, like urllib.request.urlopen does.
+REDIRECT_STATUSES = frozenset({301, 302, 303, 307, 308})
+MAX_REDIRECTS = 10
+# Largest redirect body read to keep its connection reusable, larger ones are
+# left unread and the connection closed.
+MAX_REDIRECT_BODY_SIZE = 4 * 1024
+DEFAULT_PORTS = {"http": 80, "https": 443}
+# Errors from reusing a kept-alive connection that the server has since closed.
+STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    ConnectionResetError,
+    BrokenPipeError,
+)
+
+
+class DnsCache:
+    """A cache of resolved host addresses, so repeated fetches skip the DNS lookup.
+
+    Args:
+        ttl (float): Seconds a resolved address is cached for, 0 disables caching.
+        resolver: Function with the signature of socket.getaddrinfo.
+
+    Attributes:
+        ttl (float): Seconds a resolved address is cached for.
+
+    """
+
+    def __init__(self, ttl, resolver=socket.getaddrinfo):
+        self.ttl = ttl
+        self._resolver = resolver
+        self._addresses = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, host, port):
+        """Method to get the IP addresses of a host, from the cache if possible.
+
+        Args:
+            host (str): Host name or IP address.
+            port (int): Port number.
+
+        Returns:
+            A list of IP addresses, in the order the resolver returned them.
+
+        Raises:
+            OSError: If the host can't be resolved.
+
+        """
+        now = time.monotonic()
+        with self._lock:
+            cached = self._addresses.get((host, port))
+        if cached is not None and cached[1] > now:
+            return cached[0]
+
+        addresses = []
+        for *_, sockaddr in self._resolver(host, port, type=socket.SOCK_STREAM):
+            if sockaddr[0] not in addresses:
+                addresses.append(sockaddr[0])
+        if self.ttl > 0:
+            with self._lock:
+                self._addresses[(host, port)] = (addresses, now + self.ttl)
+        return addresses
+
+    def create_connection(self, address, timeout, source_address=None):
+        """Method to open a socket to a (host, port) address through the cache.
+
+        Has the signature of socket.create_connection, and like it tries every
+        address of the host until one connects.
+        """
+        host, port = address
+        error = None
+        for ip in self.resolve(host, port):
+            try:
+                return socket.create_connection((ip, port), timeout, source_address)
+            except OSError as err:
+                error = err
+        raise error if error is not None else OSError(f"no addresses for host: {host}")
+
+
+class PooledResponse:
+    """A response from a FetchClient, returning its connection to the pool once closed.
+
+    The connection is only kept alive if the whole body was read and the server
+    did not ask for the connection to be closed.
+
+    Attributes:
+        url (str): Final URL of the response, after any redirects.
+        status (int): HTTP status code.
+        reason (str): HTTP reason phrase.
+        headers: The response headers.
+
+    """
+
+    def __init__(self, client, key, connection, response, url):
+        self.url = url
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+        self._client = client
+        self._key = key
+        self._connection = connection
+        self._response = response
+
+    def read(self, size=None):
+        """Method to read up to size bytes of the body, or the rest of it by default."""
+        return self._response.read(size)
+
+    def read1(self, size=-1):
+        """Method to read up to size bytes of the body with at most one read from the socket."""
+        return self._response.read1(size)
+
+    def close(self):
+        """Method to close the response, returning its connection to the pool if reusable."""
+        if self._connection is None:
+            return
+        # read1 leaves a response open after its last byte, with nothing left to read.
+        is_read = self._response.isclosed() or self._response.length == 0
+        reusable = is_read and not self._response.will_close
+        self._response.close()
+        self._client._release(self._key, self._connection, reusable)
+        self._connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class FetchClient:
+    """A HTTP client for fetching pages over pooled keep-alive connections.
+
+    Connections are kept open between fetches and reused for later fetches
+    from the same host, so only the first fetch pays for the TCP (and TLS)
+    handshake, and host names are resolved through a DnsCache. Like
+    urllib.request.urlopen, redirects are followed and error statuses are
+    raised as urllib.error.HTTPError, with other failures raised as
+    urllib.error.URLError.
+
+    Args:
+        max_connections_per_host (int): Idle connections kept open per host.
+        max_hosts (int): Hosts that idle connections are kept open for, the
+            least recently used host's connections are closed first.
+        dns_cache_ttl (float): Seconds resolved host addresses are cached for.
+
+    Attributes:
+        max_connections_per_host (int): Idle connections kept open per host.
+        max_hosts (int): Hosts that idle connections are kept open for.
+
+    """
+
+    def __init__(self, max_connections_per_host, max_hosts, dns_cache_ttl):
+        self.max_connections_per_host = max_connections_per_host
+        self.max_hosts = max_hosts
+        self._dns_cache = DnsCache(dns_cache_ttl)
+        self._ssl_context = ssl.create_default_context()
+        self._idle = OrderedDict()
+        self._lock = threading.Lock()
+        self._headers = {"User-Agent": f"Python-urllib/{urllib.request.__version__}"}
+
+    def open(self, url, headers=None, budget=None):
+        """Method to fetch a URL, following redirects.
+
+        Args:
+            url (str): URL to fetch.
+            headers: Optional dictionary of extra request headers.
+            budget: Optional FetchBudget, for its connect and read timeouts.
+
+        Returns:
+            The PooledResponse, to be closed once its body has been read.
+
+        Raises:
+            urllib.error.HTTPError: If the response has an error status.
+            urllib.error.URLError: If the URL can't be fetched.
+
+        """
+        headers = {**self._headers, **(headers or {})}
+        for _ in range(MAX_REDIRECTS + 1):
+            response = self._request(url, headers, budget)
+            location = response.headers.get("Location")
+            if response.status not in REDIRECT_STATUSES or location is None:
+                break
+            _drain_redirect(response)
+            response.close()
+            url = urljoin(url, location)
+        else:
+            raise urllib.error.URLError(f"too many redirects for URL: {url}")
+
+        if response.status >= 400:
+            response.close()
+            raise urllib.error.HTTPError(
+                url, response.status, response.reason, response.headers, None)
+        return response
+
+    def _request(self, url, headers, budget):
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        if scheme not in DEFAULT_PORTS or not parts.hostname:
+            raise urllib.error.URLError(f"unknown url type: {url}")
+        try:
+            key = (scheme, parts.hostname, parts.port or DEFAULT_PORTS[scheme])
+        except ValueError as err:
+            raise urllib.error.URLError(err)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+
+        connection, is_reused = self._acquire(key)
+        while True:
+            try:
+                if budget is not None:
+                    self._set_timeouts(connection, budget)
+                connection.request("GET", path, headers=headers)
+                return PooledResponse(self, key, connection, connection.getresponse(), url)
+            except STALE_CONNECTION_ERRORS as err:
+                connection.close()
+                if not is_reused:
+                    raise urllib.error.URLError(err)
+                # The server closed the idle connection, so retry on a new one.
+                connection, is_reused = self._connect(key), False
+            except (OSError, http.client.HTTPException) as err:
+                connection.close()
+                raise urllib.error.URLError(err)
+
+    def _set_timeouts(self, connection, budget):
+        if connection.sock is None:
+            connection.timeout = budget.connect_timeout
+            connection.connect()
+        connection.sock.settimeout(budget.read_timeout)
+
+    def _acquire(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        return self._connect(key), False
+
+    def _connect(self, key):
+        scheme, host, port = key
+        if scheme == "https":
+            connection = http.client.HTTPSConnection(host, port, context=self._ssl_context)
+        else:
+            connection = http.client.HTTPConnection(host, port)
+        connection._create_connection = self._dns_cache.create_connection
+        return connection
+
+    def _release(self, key, connection, reusable):
+        evicted = []
+        with self._lock:
+            if reusable:
+                idle = self._idle.setdefault(key, [])
+                self._idle.move_to_end(key)
+                if len(idle) < self.max_connections_per_host:
+                    idle.append(connection)
+                    connection = None
+                while len(self._idle) > self.max_hosts:
+                    evicted.extend(self._idle.popitem(last=False)[1])
+        if connection is not None:
+            evicted.append(connection)
+        for connection in evicted:
+            connection.close()
+
+    def close(self):
+        """Method to close every idle connection."""
+        with self._lock:
+            idle, self._idle = self._idle, OrderedDict()
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+
+def _drain_redirect(response):
+    """Function to read a redirect body if it is small enough to keep the connection reusable.
+
+    Redirect bodies aren't read through the FetchBudget, so only a body with a
+    Content-Length of at most MAX_REDIRECT_BODY_SIZE is read. Any other body, or
+    one that fails to be read, is left unread, and its connection closed rather
+    than returned to the pool.
+
+    Args:
+        response (PooledResponse): Redirect response.
+
+    """
+    try:
+        length = int(response.headers.get("Content-Length", ""))
+    except ValueError:
+        return
+    if 0 <= length <= MAX_REDIRECT_BODY_SIZE:
+        try:
+            response.read(length)
+        except (OSError, http.client.HTTPException):
+            pass
@@ -0,0 +1,311 @@
+import codecs
+import http
+import time
+import urllib.error
+import urllib.request
+import zlib
+
+from libs.metrics import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Brotli bodies are only accepted from versions that can bound the output of each
+# decompression step (brotli 1.2+), so a small body can't inflate in one go.
+if brotli is not None and not hasattr(brotli.Decompressor, "can_accept_more_data"):
+    brotli = None
+
+# Number of bytes read from a response at a time when streaming a page.
+CHUNK_SIZE = 64 * 1024
+# Content codings that fetched pages may be compressed with, brotli only when installed.
+ACCEPT_ENCODING = "gzip, deflate, br" if brotli is not None else "gzip, deflate"
+
+
+class FetchBudgetError(Exception):
+    """Raised when fetching a page goes over one of its FetchBudget limits.
+
+    Args:
+        message (str): Human readable string with brief description of the error.
+        reason (str): The limit that was hit: "max_body_size", "read_timeout" or "deadline".
+
+    Attributes:
+        message (str): Human readable string with brief description of the error.
+        reason (str): The limit that was hit.
+
+    """
+
+    def __init__(self, message, reason):
+        self.message = message
+        self.reason = reason
+        super().__init__(self.message)
+
+
+class ContentEncodingError(Exception):
+    """Raised when a response body can't be decompressed with its Content-Encoding.
+
+    Args:
+        message (str): Human readable string with brief description of the error.
+
+    Attributes:
+        message (str): Human readable string with brief description of the error.
+
+    """
+
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
+
+
+class FetchBudget:
+    """Limits on the time and size of fetching a single page.
+
+    The limits are enforced while the body is streamed by read_chunks. When one
+    is hit, either a FetchBudgetError is raised, or with allow_partial the body
+    is cut short and the reason recorded in truncated, so the part of the page
+    read so far can still be counted.
+
+    Args:
+        connect_timeout (float): Seconds to wait for a connection, None to wait forever.
+        read_timeout (float): Seconds to wait for each read, None to wait forever.
+        deadline (float): Seconds for the whole fetch from when start is called,
+            checked between reads, None for no deadline.
+        max_body_size (int): Maximum bytes of body read, None for no limit.
+        allow_partial (bool): Cut the body short rather than raise when a limit is hit.
+
+    Attributes:
+        connect_timeout (float): Seconds to wait for a connection.
+        read_timeout (float): Seconds to wait for each read.
+        deadline (float): Seconds for the whole fetch.
+        max_body_size (int): Maximum bytes of body read.
+        allow_partial (bool): Cut the body short rather than raise when a limit is hit.
+        truncated (str): Reason the body was cut short, None if it was read in full.
+
+    """
+
+    def __init__(self, connect_timeout=None, read_timeout=None, deadline=None,
+                 max_body_size=None, allow_partial=False):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.deadline = deadline
+        self.max_body_size = max_body_size
+        self.allow_partial = allow_partial
+        self.truncated = None
+        self._expires_at = None
+
+    def start(self):
+        """Method to start the deadline clock, called before connecting."""
+        if self.deadline is not None:
+            self._expires_at = time.monotonic() + self.deadline
+
+    def is_expired(self):
+        """Method to check if the deadline has passed."""
+        return self._expires_at is not None and time.monotonic() >= self._expires_at
+
+    def exceeded(self, message, reason):
+        """Method to handle hitting a limit, raising unless partial bodies are allowed.
+
+        Raises:
+            FetchBudgetError: If partial bodies are not allowed.
+
+        """
+        if not self.allow_partial:
+            raise FetchBudgetError(message, reason)
+        self.truncated = reason
+
+
+def open_url(url, fetch_client=None, headers=None, budget=None):
+    """Function to open a URL, through a pooled fetch client if one is given.
+
+    Without a fetch client, urllib.request.urlopen only has a single timeout, so
+    the budget's read timeout is used for connecting too. Compressed responses
+    are accepted (see ACCEPT_ENCODING), to be decompressed by read_chunks.
+
+    Args:
+        url (str): URL to open.
+        fetch_client: Optional FetchClient, otherwise urllib.request.urlopen is used.
+        headers: Optional dictionary of extra request headers, an Accept-Encoding
+            header replaces the default one.
+        budget: Optional FetchBudget, whose deadline is started here.
+
+    Returns:
+        A file-like HTTP response with status and headers, to be closed once its
+        body has been read. A 304 Not Modified response to a conditional request
+        is returned rather than raised.
+
+    Raises:
+        urllib.error.URLError: If the URL can't be fetched.
+
+    """
+    headers = {"Accept-Encoding": ACCEPT_ENCODING, **(headers or {})}
+    if budget is not None:
+        budget.start()
+    if fetch_client is not None:
+        return fetch_client.open(url, headers, budget)
+
+    kwargs = {}
+    if budget is not None and budget.read_timeout is not None:
+        kwargs["timeout"] = budget.read_timeout
+    try:
+        return urllib.request.urlopen(urllib.request.Request(url, headers=headers), **kwargs)
+    except urllib.error.HTTPError as err:
+        if err.code == http.HTTPStatus.NOT_MODIFIED:
+            return err
+        raise
+
+
+def read_chunks(response, chunk_size=CHUNK_SIZE, budget=None):
+    """Generator to read a response body in chunks as they arrive.
+
+    Each chunk is a single read of whatever has arrived (up to chunk_size), so
+    even a slowly trickling response is checked against the budget's deadline
+    at least once per read timeout. A body compressed with its Content-Encoding
+    is decompressed a chunk at a time, and the budget's max_body_size limits the
+    decompressed body. Bytes read from the network and after decompression are
+    recorded in the fetch.bytes_on_wire and fetch.bytes_decoded metrics.
+
+    Args:
+        response: A file-like HTTP response with a read1(size) method.
+        chunk_size (int): Maximum number of bytes per chunk.
+        budget: Optional FetchBudget enforced while reading.
+
+    Yields:
+        Chunks of bytes, until the response is exhausted or the budget is hit.
+
+    Raises:
+        FetchBudgetError: If the budget is hit and partial bodies are not allowed.
+        ContentEncodingError: If the body has an unsupported or corrupt Content-Encoding.
+
+    """
+    headers = getattr(response, "headers", None) or {}
+    chunks = _read_raw(response, chunk_size, budget)
+    content_encoding = (headers.get("Content-Encoding") or "identity").strip().lower()
+    if content_encoding != "identity":
+        chunks = _decompress(chunks, content_encoding, chunk_size)
+
+    size = 0
+    for chunk in chunks:
+        size += len(chunk)
+        if budget is not None and budget.max_body_size is not None and size > budget.max_body_size:
+            metrics.increment("fetch.bytes_decoded", len(chunk) - (size - budget.max_body_size))
+            budget.exceeded(
+                f"response body is over {budget.max_body_size} bytes", "max_body_size")
+            yield chunk[:len(chunk) - (size - budget.max_body_size)]
+            return
+        metrics.increment("fetch.bytes_decoded", len(chunk))
+        yield chunk
+
+
+def _read_raw(response, chunk_size, budget):
+    while True:
+        if budget is not None and budget.is_expired():
+            budget.exceeded(
+                f"fetch deadline of {budget.deadline} seconds exceeded", "deadline")
+            return
+        try:
+            chunk = response.read1(chunk_size)
+        except TimeoutError:
+            if budget is None:
+                raise
+            budget.exceeded(
+                f"read timed out after {budget.read_timeout} seconds", "read_timeout")
+            return
+        if not chunk:
+            return
+        metrics.increment("fetch.bytes_on_wire", len(chunk))
+        yield chunk
+
+
+def _decompress(chunks, content_encoding, chunk_size):
+    if content_encoding in ("gzip", "x-gzip"):
+        wbits = 16 + zlib.MAX_WBITS
+    elif content_encoding == "deflate":
+        # "deflate" should be zlib wrapped, but some servers send raw deflate.
+        chunks = iter(chunks)
+        first = next(chunks, b"")
+        is_zlib = len(first) >= 2 and (first[0] & 0x0F) == 8 and int.from_bytes(first[:2]) % 31 == 0
+        wbits = zlib.MAX_WBITS if is_zlib else -zlib.MAX_WBITS
+        chunks = _prepend(first, chunks)
+    elif content_encoding == "br" and brotli is not None:
+        yield from _unbrotli(chunks, chunk_size)
+        return
+    else:
+        raise ContentEncodingError(f"unsupported Content-Encoding: {content_encoding}")
+
+    try:
+        yield from _inflate(chunks, zlib.decompressobj(wbits), chunk_size)
+    except zlib.error as err:
+        raise ContentEncodingError(f"invalid {content_encoding} body: {err}")
+
+
+def _unbrotli(chunks, chunk_size):
+    # Output is bounded to about chunk_size at a time, like _inflate. Once the
+    # limit is reached, the rest is taken with empty input before more is given.
+    decompressor = brotli.Decompressor()
+    try:
+        for chunk in chunks:
+            data = decompressor.process(chunk, output_buffer_limit=chunk_size)
+            if data:
+                yield data
+            while not decompressor.can_accept_more_data():
+                data = decompressor.process(b"", output_buffer_limit=chunk_size)
+                if data:
+                    yield data
+        while not decompressor.is_finished():
+            data = decompressor.process(b"", output_buffer_limit=chunk_size)
+            if not data:
+                break
+            yield data
+    except brotli.error as err:
+        raise ContentEncodingError(f"invalid br body: {err}")
+
+
+def _inflate(chunks, decompressor, chunk_size):
+    # Output is bounded to chunk_size at a time, so a small, highly compressed
+    # body can't be inflated in one go past the budget's max_body_size.
+    for chunk in chunks:
+        while chunk:
+            data = decompressor.decompress(chunk, chunk_size)
+            if data:
+                yield data
+            chunk = decompressor.unconsumed_tail
+    data = decompressor.flush()
+    if data:
+        yield data
+
+
+def _prepend(first, chunks):
+    if first:
+        yield first
+    yield from chunks
+
+
+def decode_chunks(chunks, encoding="utf-8", errors="strict"):
+    """Generator to incrementally decode chunks of bytes into text.
+
+    Multi-byte characters split across chunk boundaries are held back until the
+    rest of the character arrives, so only one chunk is ever decoded at a time.
+
+    Args:
+        chunks: An iterable of chunks of bytes.
+        encoding (str): Encoding of the bytes.
+        errors (str): Error handler for invalid bytes, e.g. "replace" for bodies
+            that may have been cut short in the middle of a character.
+
+    Yields:
+        Decoded chunks of text.
+
+    Raises:
+        UnicodeDecodeError: If the bytes are not valid for the encoding.
+
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors)
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
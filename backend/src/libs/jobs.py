@@ -0,0 +1,269 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobError(Exception):
+    """The error a failed job finished with.
+
+    Args:
+        message (str): Human readable string with brief description of the error.
+        code (int): Error code.
+
+    Attributes:
+        message (str): Human readable string with brief description of the error.
+        code (int): Error code.
+
+    """
+
+    def __init__(self, message, code):
+        self.message = message
+        self.code = code
+        super().__init__(self.message)
+
+
+class JobQueueFullError(Exception):
+    """Raised when every job worker is busy and the wait queue is full.
+
+    Args:
+        message (str): Human readable string with brief description of the error.
+
+    Attributes:
+        message (str): Human readable string with brief description of the error.
+
+    """
+
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
+
+
+class Job:
+    """The state of a job in a JobStore.
+
+    Args:
+        label (str): What the job is working on, such as the URL being counted.
+        created (float): When the job was submitted, time.monotonic() if not given.
+
+    Attributes:
+        id (str): Job ID, used to poll for the job.
+        label (str): What the job is working on, such as the URL being counted.
+        status (str): PENDING, DONE or FAILED.
+        error: The JobError a failed job finished with.
+        created (float): When the job was submitted, time.monotonic() for jobs kept
+            in memory and time.time() for jobs kept in a collection.
+        finished (float): When the job finished, on the same clock as created.
+
+    """
+
+    def __init__(self, label, created=None):
+        self.id = uuid.uuid4().hex
+        self.label = label
+        self.status = PENDING
+        self.error = None
+        self.created = time.monotonic() if created is None else created
+        self.finished = None
+
+
+class JobStore:
+    """A thread safe store of job states, shared by every request handler thread.
+
+    Jobs that are still pending after the timeout are failed, so a stuck page
+    fetch can't leave its poller waiting forever. Finished jobs are kept for
+    the timeout, so a repeated poll still finds them, and then removed.
+
+    Jobs are kept in memory, or in a MongoDB collection when one is given, so
+    a job submitted to one server process can be polled from any other.
+
+    Args:
+        timeout (float): Seconds a job may be pending before it is failed.
+        collection: Optional MongoDB collection the jobs are kept in.
+
+    Attributes:
+        timeout (float): Seconds a job may be pending before it is failed.
+
+    """
+
+    def __init__(self, timeout, collection=None):
+        self.timeout = timeout
+        self._collection = collection
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def add(self, label):
+        """Method to add a new pending job.
+
+        Args:
+            label (str): What the job is working on.
+
+        Returns:
+            The new Job.
+
+        """
+        if self._collection is not None:
+            return self._add_document(label)
+        job = Job(label)
+        with self._lock:
+            self._prune(time.monotonic())
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        """Method to get a job, failing it if it has been pending for too long.
+
+        Args:
+            job_id (str): Job ID.
+
+        Returns:
+            The Job, or None if there is no such job.
+
+        """
+        if self._collection is not None:
+            return self._get_document(job_id)
+        now = time.monotonic()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.status == PENDING and now - job.created > self.timeout:
+                self._finish(job, FAILED, JobError(
+                    f"job timed out after {self.timeout} seconds", 504), now)
+        return job
+
+    def finish(self, job_id, error=None):
+        """Method to finish a pending job, a job that has timed out is left failed.
+
+        Args:
+            job_id (str): Job ID.
+            error: JobError if the job failed.
+
+        """
+        if self._collection is not None:
+            self._finish_document(job_id, DONE if error is None else FAILED, error, time.time())
+            return
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.status == PENDING:
+                self._finish(job, DONE if error is None else FAILED, error, time.monotonic())
+
+    def _finish(self, job, status, error, now):
+        job.status = status
+        job.error = error
+        job.finished = now
+
+    def _prune(self, now):
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if now - (job.finished or job.created) > 2 * self.timeout]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def _add_document(self, label):
+        now = time.time()
+        self._collection.delete_many({"expires": {"$lt": now}})
+        job = Job(label, created=now)
+        self._collection.insert_one({
+            "_id": job.id,
+            "label": label,
+            "status": PENDING,
+            "created": now,
+            "expires": now + 2 * self.timeout,
+        })
+        return job
+
+    def _get_document(self, job_id):
+        document = self._collection.find_one({"_id": job_id})
+        if document is None:
+            return None
+        now = time.time()
+        if document["status"] == PENDING and now - document["created"] > self.timeout:
+            self._finish_document(job_id, FAILED, JobError(
+                f"job timed out after {self.timeout} seconds", 504), now)
+            document = self._collection.find_one({"_id": job_id})
+            if document is None:
+                return None
+
+        job = Job(document["label"], created=document["created"])
+        job.id = document["_id"]
+        job.status = document["status"]
+        job.finished = document.get("finished")
+        if document.get("error_message") is not None:
+            job.error = JobError(document["error_message"], document["error_code"])
+        return job
+
+    def _finish_document(self, job_id, status, error, now):
+        # Only a pending job is finished, so a job that has timed out is left failed.
+        update = {"status": status, "finished": now, "expires": now + 2 * self.timeout}
+        if error is not None:
+            update.update({"error_message": error.message, "error_code": error.code})
+        self._collection.update_one({"_id": job_id, "status": PENDING}, {"$set": update})
+
+
+class JobQueue:
+    """A pool of worker threads running jobs in the background of request handling.
+
+    A job that times out is failed in the store, but its thread can't be
+    stopped, so it keeps its slot until it finishes. New jobs are rejected
+    once every worker is busy and max_queue jobs are waiting, rather than
+    piling up behind stuck ones.
+
+    Args:
+        max_workers (int): Number of worker threads.
+        max_queue (int): Number of jobs that may wait for a free worker.
+        store (JobStore): Store the states of the queued jobs are kept in.
+
+    Attributes:
+        store (JobStore): Store the states of the queued jobs are kept in.
+
+    """
+
+    def __init__(self, max_workers, max_queue, store):
+        self.store = store
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="count-job")
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+
+    def submit(self, label, func, *args, **kwargs):
+        """Method to queue a job.
+
+        The job fails with the message and code of any exception func raises
+        that has them, such as UrlError, otherwise with a 500.
+
+        Args:
+            label (str): What the job is working on.
+            func: Function run by the job.
+            *args: Positional arguments for func.
+            **kwargs: Keyword arguments for func.
+
+        Returns:
+            The pending Job.
+
+        Raises:
+            JobQueueFullError: If every worker is busy and the wait queue is full.
+
+        """
+        if not self._slots.acquire(blocking=False):
+            raise JobQueueFullError("count job queue is full")
+        try:
+            job = self.store.add(label)
+            future = self._executor.submit(self._run, job.id, func, args, kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return job
+
+    def _run(self, job_id, func, args, kwargs):
+        try:
+            func(*args, **kwargs)
+        except Exception as err:
+            self.store.finish(job_id, JobError(
+                getattr(err, "message", str(err)), getattr(err, "code", 500)))
+        else:
+            self.store.finish(job_id)
+
+    def close(self):
+        """Method to shut down the worker threads, cancelling any waiting jobs."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,43 @@
+import threading
+from collections import Counter
+
+
+class Metrics:
+    """Thread safe counters of events, such as cache hits and misses, for monitoring.
+
+    Counters are named with dotted names, e.g. "revalidation.revalidated".
+    """
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def increment(self, name, amount=1):
+        """Method to add to a counter.
+
+        Args:
+            name (str): Name of the counter.
+            amount (int): Amount added to the counter.
+
+        """
+        with self._lock:
+            self._counts[name] += amount
+
+    def snapshot(self):
+        """Method to get the current value of every counter.
+
+        Returns:
+            A dictionary of counter names and values, sorted by name.
+
+        """
+        with self._lock:
+            return dict(sorted(self._counts.items()))
+
+    def reset(self):
+        """Method to set every counter back to zero."""
+        with self._lock:
+            self._counts.clear()
+
+
+# Metrics of the running server process.
+metrics = Metrics()
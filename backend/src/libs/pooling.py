@@ -0,0 +1,212 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from libs.counting import Parser, count_information
+from libs.metrics import metrics
+
+
+class CountingPoolError(Exception):
+    """A general error for counting pool related issues.
+
+    Args:
+        message (str): Human readable string with brief description of the error.
+
+    Attributes:
+        message (str): Human readable string with brief description of the error.
+
+    """
+
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
+
+
+class CountingPoolFullError(CountingPoolError):
+    """Raised when every worker is busy and the wait queue is full."""
+
+
+class CountingPoolTimeoutError(CountingPoolError):
+    """Raised when a page is not counted within the pool timeout."""
+
+
+class CountingPool:
+    """A process pool for counting large pages outside of the request handling process.
+
+    HTML parsing is CPU bound pure Python, so counting large pages in worker
+    processes stops one big page from holding the GIL for the whole server.
+    Pages smaller than the size threshold are still counted inline, where the
+    cost of sending them to a worker would outweigh the parsing itself.
+
+    A page that is still being counted when the timeout is hit can't be
+    cancelled, so its worker is recycled: new pages go to a fresh set of
+    workers, and the old workers are terminated as soon as they are only
+    counting timed out pages. Until then the timed out page holds its slot, so
+    stuck pages still count against the bound. Recycles are recorded in the
+    counting_pool.recycled metric.
+
+    Args:
+        max_workers (int): Number of worker processes.
+        max_queue (int): Number of pages that may wait for a free worker.
+        max_tasks_per_worker (int): Pages a worker counts before it is recycled.
+        size_threshold (int): Minimum characters of HTML for a page to use the pool.
+        timeout (float): Seconds to wait for a page to be counted.
+
+    Attributes:
+        size_threshold (int): Minimum characters of HTML for a page to use the pool.
+        timeout (float): Seconds to wait for a page to be counted.
+
+    """
+
+    def __init__(self, max_workers, max_queue, max_tasks_per_worker, size_threshold, timeout):
+        self.size_threshold = size_threshold
+        self.timeout = timeout
+        self._max_workers = max_workers
+        self._max_tasks_per_worker = max_tasks_per_worker
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._executor = self._new_executor()
+        # Pages being counted, and the timed out ones, by executor.
+        self._in_flight = {self._executor: set()}
+        self._timed_out = {}
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(
+            max_workers=self._max_workers,
+            max_tasks_per_child=self._max_tasks_per_worker,
+        )
+
+    def submit(self, html, engine=Parser, max_words=None, collect_links=False):
+        """Method to count a page in a worker process.
+
+        Args:
+            html (str): HTML to be analysed for word count.
+            engine: Counting engine parser class.
+            max_words (int): Optional bound on distinct words for approximate counting.
+            collect_links (bool): Also return the links of the page.
+
+        Returns:
+            Dictionary of word count information, as returned by count_information.
+
+        Raises:
+            CountingPoolFullError: If every worker is busy and the wait queue is full.
+            CountingPoolTimeoutError: If the page is not counted within the timeout.
+
+        """
+        if not self._slots.acquire(blocking=False):
+            raise CountingPoolFullError("counting pool is full")
+
+        try:
+            with self._lock:
+                executor = self._executor
+                future = executor.submit(
+                    count_information, html, engine, max_words, collect_links)
+                self._in_flight.setdefault(executor, set()).add(future)
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot is held until the worker is done, even after a timeout, so a
+        # page that is already being counted still counts against the bound.
+        future.add_done_callback(lambda done: self._finish(executor, done))
+
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            if not future.cancel():
+                self._recycle(executor, future)
+            raise CountingPoolTimeoutError(
+                f"counting timed out after {self.timeout} seconds")
+
+    def _finish(self, executor, future):
+        self._slots.release()
+        with self._lock:
+            # Gone once a replaced executor's workers have been terminated.
+            if executor not in self._in_flight:
+                return
+            self._in_flight[executor].discard(future)
+            is_stuck = self._is_stuck(executor)
+        if is_stuck:
+            self._terminate(executor)
+
+    def _recycle(self, executor, future):
+        """Method to replace the workers of a page still being counted after the timeout."""
+        with self._lock:
+            if future.done():
+                return
+            if executor is self._executor:
+                self._executor = self._new_executor()
+                self._in_flight[self._executor] = set()
+                metrics.increment("counting_pool.recycled")
+            self._timed_out.setdefault(executor, set()).add(future)
+            is_stuck = self._is_stuck(executor)
+        if is_stuck:
+            self._terminate(executor)
+
+    def _is_stuck(self, executor):
+        """Method to check if a replaced executor is only counting timed out pages."""
+        in_flight = self._in_flight.get(executor)
+        timed_out = self._timed_out.get(executor)
+        if in_flight is None or timed_out is None or not in_flight <= timed_out:
+            return False
+        del self._in_flight[executor]
+        del self._timed_out[executor]
+        return True
+
+    def _terminate(self, executor):
+        # Not from the thread completing a future, which may hold the executor's locks.
+        threading.Thread(target=_terminate_executor, args=(executor,), daemon=True).start()
+
+    def count(self, chunks, engine=Parser, max_words=None, collect_links=False):
+        """Method to count a page, in a worker process if it is large enough.
+
+        Chunks are buffered until the size threshold is reached, at which point
+        the rest of the page is read and the whole page is sent to the pool. A
+        pooled page is therefore held in full by this process until it has been
+        sent, so its size is only bounded by the chunks, e.g. by the max_body_size
+        of the FetchBudget they are read with.
+
+        Args:
+            chunks: An iterable of chunks of HTML text.
+            engine: Counting engine parser class.
+            max_words (int): Optional bound on distinct words for approximate counting.
+            collect_links (bool): Also return the links of the page.
+
+        Returns:
+            Dictionary of word count information, as returned by count_information.
+
+        Raises:
+            CountingPoolFullError: If every worker is busy and the wait queue is full.
+            CountingPoolTimeoutError: If the page is not counted within the timeout.
+
+        """
+        chunks = iter(chunks)
+        buffered = []
+        size = 0
+        for chunk in chunks:
+            buffered.append(chunk)
+            size += len(chunk)
+            if size >= self.size_threshold:
+                buffered.extend(chunks)
+                html = "".join(buffered)
+                # Only the joined page is kept while it is sent to a worker.
+                buffered.clear()
+                return self.submit(html, engine, max_words, collect_links)
+
+        return count_information(buffered, engine, max_words, collect_links)
+
+    def close(self):
+        """Method to shut down the worker processes, cancelling any waiting pages."""
+        with self._lock:
+            stuck = list(self._timed_out)
+            self._timed_out.clear()
+        for executor in stuck:
+            _terminate_executor(executor)
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _terminate_executor(executor):
+    """Function to kill the worker processes of an executor, failing the pages they are counting."""
+    # ProcessPoolExecutor has no public way to stop a running task before Python 3.14.
+    for process in list((executor._processes or {}).values()):
+        process.terminate()
+    executor.shutdown(wait=True, cancel_futures=True)
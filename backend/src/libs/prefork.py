@@ -0,0 +1,200 @@
+import logging
+import os
+import signal
+import socket
+import time
+import traceback
+
+# Seconds between checks of the workers.
+POLL_INTERVAL = 0.1
+
+
+def listen(server_address, backlog):
+    """Function to open the listening socket shared by every worker process.
+
+    Args:
+        server_address: The (host, port) address to listen on.
+        backlog (int): Listen backlog of connections not yet accepted.
+
+    Returns:
+        The listening socket, inherited by the workers when they are forked.
+
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(server_address)
+    sock.listen(backlog)
+    return sock
+
+
+def adopt_socket(server, sock):
+    """Function to make a socketserver server accept connections on an inherited socket.
+
+    Args:
+        server: A server created with bind_and_activate=False.
+        sock: The listening socket.
+
+    """
+    server.socket.close()
+    server.socket = sock
+    server.server_address = sock.getsockname()
+    host, port = server.server_address[:2]
+    server.server_name = socket.getfqdn(host)
+    server.server_port = port
+
+
+class Supervisor:
+    """A pre-fork supervisor running a server in several worker processes.
+
+    The workers are forked from the supervisor and accept connections from a
+    listening socket opened before forking, so the kernel shares the incoming
+    connections between them and each can count pages on its own core. The
+    worker function runs in each child after the fork, so clients that are not
+    fork safe (such as MongoClient) must be created there. A worker that exits
+    while the supervisor is running is replaced, after restart_delay if it had
+    only just started, so a worker failing on start up can't fork in a loop.
+
+    The supervisor stops on SIGTERM or SIGINT, sending SIGTERM to every worker
+    for it to finish the requests it is handling. On SIGHUP the workers are
+    replaced one at a time (a rolling restart): a new worker is started before
+    an old one is stopped, so there is always a worker accepting connections.
+
+    Args:
+        num_workers (int): Number of worker processes.
+        worker: Function run in each worker process, returning its exit code.
+        shutdown_timeout (float): Seconds a stopped worker has to exit before
+            it is killed.
+        restart_delay (float): Seconds before replacing a worker that exited
+            within this long of starting.
+
+    Attributes:
+        num_workers (int): Number of worker processes.
+        shutdown_timeout (float): Seconds a stopped worker has to exit before it is killed.
+        restart_delay (float): Seconds before replacing a worker that exited
+            within this long of starting.
+        workers: Dictionary of the start times of the running workers by process ID.
+
+    """
+
+    def __init__(self, num_workers, worker, shutdown_timeout, restart_delay=1):
+        self.num_workers = num_workers
+        self.shutdown_timeout = shutdown_timeout
+        self.restart_delay = restart_delay
+        self.workers = {}
+        self._worker = worker
+        self._is_stopping = False
+        self._is_reloading = False
+        self._restart_at = None
+
+    def run(self):
+        """Method to start the workers and supervise them until SIGTERM or SIGINT."""
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_reload)
+
+        logging.info("Starting %d worker processes", self.num_workers)
+        while len(self.workers) < self.num_workers:
+            self._spawn()
+        try:
+            while not self._is_stopping:
+                self._reap()
+                if self._is_reloading:
+                    self._is_reloading = False
+                    self.rolling_restart()
+                time.sleep(POLL_INTERVAL)
+        finally:
+            self.stop()
+
+    def _handle_stop(self, signum, frame):
+        self._is_stopping = True
+
+    def _handle_reload(self, signum, frame):
+        self._is_reloading = True
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid != 0:
+            self.workers[pid] = time.monotonic()
+            return pid
+
+        # In the worker: signals are handled by the server, not the supervisor.
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        code = 1
+        try:
+            code = self._worker() or 0
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            os._exit(code)
+
+    def _reap(self):
+        """Method to replace any worker that has exited."""
+        while self.workers:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                break
+            started = self.workers.pop(pid, None)
+            if started is None:
+                continue
+            logging.error("Worker process %d exited with code %d", pid,
+                          os.waitstatus_to_exitcode(status))
+            if time.monotonic() - started < self.restart_delay:
+                self._restart_at = time.monotonic() + self.restart_delay
+
+        if self._restart_at is not None and time.monotonic() < self._restart_at:
+            return
+        self._restart_at = None
+        while len(self.workers) < self.num_workers and not self._is_stopping:
+            logging.info("Replacing exited worker process")
+            self._spawn()
+
+    def rolling_restart(self):
+        """Method to replace every worker, one at a time."""
+        logging.info("Rolling restart of %d worker processes", len(self.workers))
+        for pid in list(self.workers):
+            if self._is_stopping:
+                return
+            self._spawn()
+            self._stop_workers([pid])
+
+    def stop(self):
+        """Method to stop every worker, waiting for them to finish their requests."""
+        logging.info("Stopping %d worker processes", len(self.workers))
+        self._stop_workers(list(self.workers))
+
+    def _stop_workers(self, pids):
+        for pid in pids:
+            self._signal(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.shutdown_timeout
+        remaining = set(pids)
+        while remaining and time.monotonic() < deadline:
+            remaining = {pid for pid in remaining if not self._has_exited(pid)}
+            if remaining:
+                time.sleep(POLL_INTERVAL)
+        for pid in remaining:
+            logging.error("Killing worker process %d after %s seconds", pid,
+                          self.shutdown_timeout)
+            self._signal(pid, signal.SIGKILL)
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+            self.workers.pop(pid, None)
+
+    def _has_exited(self, pid):
+        try:
+            exited, _ = os.waitpid(pid, os.WNOHANG)
+        except ChildProcessError:
+            exited = pid
+        if exited == 0:
+            return False
+        self.workers.pop(pid, None)
+        return True
+
+    def _signal(self, pid, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
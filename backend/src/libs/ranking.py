@@ -0,0 +1,74 @@
+import heapq
+from collections.abc import Sequence
+from operator import itemgetter
+
+_by_count = itemgetter(1)
+
+
+class RankedWords(Sequence):
+    """A lazily ranked sequence of [word, count] pairs, most frequent word first.
+
+    Words with equal counts keep the order they were first counted in. Only as
+    much of the ranking as has been asked for is computed: the first pages are
+    selected with a heap, and the ranked prefix is grown on demand until it is
+    cheaper to sort the whole vocabulary.
+
+    Args:
+        counts: A dictionary of words and number of occurences for each word.
+
+    Attributes:
+        counts: A dictionary of words and number of occurences for each word.
+
+    """
+
+    def __init__(self, counts):
+        self.counts = counts
+        self._ranked = []
+        self._is_fully_ranked = not counts
+
+    @property
+    def is_fully_ranked(self):
+        """bool: Whether the whole vocabulary has been ranked."""
+        return self._is_fully_ranked
+
+    def _rank(self, size):
+        if self._is_fully_ranked or size <= len(self._ranked):
+            return
+
+        size = max(size, 2 * len(self._ranked))
+        if size * 4 >= len(self.counts):
+            self._ranked = sorted(
+                self.counts.items(), key=_by_count, reverse=True)
+            self._is_fully_ranked = True
+        else:
+            self._ranked = heapq.nlargest(
+                size, self.counts.items(), key=_by_count)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            self._rank(stop if step > 0 else len(self))
+            return [list(item) for item in self._ranked[start:stop:step]]
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("RankedWords index out of range")
+        self._rank(index + 1)
+        return list(self._ranked[index])
+
+    def __iter__(self):
+        self._rank(len(self))
+        for item in self._ranked:
+            yield list(item)
+
+    def __eq__(self, other):
+        if isinstance(other, (list, RankedWords)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"RankedWords({list(self)!r})"
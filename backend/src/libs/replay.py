@@ -0,0 +1,244 @@
+import asyncio
+import email.message
+import io
+import json
+import time
+import urllib.error
+from pathlib import Path
+
+from libs.fetching import open_url
+
+# Name of the file listing the recorded pages of a replay directory.
+MANIFEST_FILE = "manifest.json"
+# Response headers kept when a page is recorded.
+RECORDED_HEADERS = ("Content-Type", "Content-Encoding", "ETag", "Last-Modified")
+
+
+class ReplayResponse:
+    """A response replayed from a recorded page, with the interface of a PooledResponse.
+
+    Reads are slowed down to the transport's bandwidth.
+
+    Attributes:
+        url (str): URL of the recorded page.
+        status (int): HTTP status code.
+        reason (str): HTTP reason phrase.
+        headers: The recorded response headers.
+
+    """
+
+    def __init__(self, url, status, headers, body, bandwidth):
+        self.url = url
+        self.status = status
+        self.reason = "OK" if status == 200 else ""
+        self.headers = headers
+        self._body = io.BytesIO(body)
+        self._bandwidth = bandwidth
+
+    def read(self, size=None):
+        """Method to read up to size bytes of the body, or the rest of it by default."""
+        return self._throttle(self._body.read(size))
+
+    def read1(self, size=-1):
+        """Method to read up to size bytes of the body."""
+        return self._throttle(self._body.read1(size))
+
+    def _throttle(self, data):
+        if self._bandwidth and data:
+            time.sleep(len(data) / self._bandwidth)
+        return data
+
+    def close(self):
+        """Method to close the response."""
+        self._body.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ReplayTransport:
+    """A fetch transport serving recorded pages from memory, for offline load testing.
+
+    Has the open interface of a FetchClient, so it can be used wherever a
+    fetch client is, and replays each page with a simulated latency (before
+    the response) and bandwidth (while the body is read). Like urlopen, URLs
+    that were not recorded raise a 404 urllib.error.HTTPError, and conditional
+    requests matching a page's ETag get a 304 Not Modified.
+
+    Args:
+        pages: Optional dictionary of recorded pages by URL, each a dictionary
+            with body (bytes), and optionally status (int) and headers (dict).
+        latency (float): Seconds before each response.
+        bandwidth (float): Bytes per second the body is read at, None for unlimited.
+
+    Attributes:
+        pages: Dictionary of recorded pages by URL.
+        latency (float): Seconds before each response.
+        bandwidth (float): Bytes per second the body is read at.
+
+    """
+
+    def __init__(self, pages=None, latency=0, bandwidth=None):
+        self.pages = dict(pages or {})
+        self.latency = latency
+        self.bandwidth = bandwidth
+
+    @classmethod
+    def from_directory(cls, directory, latency=0, bandwidth=None):
+        """Method to load the pages recorded in a directory by record_pages.
+
+        Args:
+            directory: Path of the directory, with a manifest.json listing each
+                page's URL, body file, status and headers.
+            latency (float): Seconds before each response.
+            bandwidth (float): Bytes per second the body is read at, None for unlimited.
+
+        Returns:
+            The ReplayTransport.
+
+        """
+        directory = Path(directory)
+        manifest = json.loads((directory / MANIFEST_FILE).read_text())
+        pages = {
+            url: {
+                "body": (directory / page["file"]).read_bytes(),
+                "status": page.get("status", 200),
+                "headers": page.get("headers", {}),
+            }
+            for url, page in manifest.items()
+        }
+        return cls(pages, latency, bandwidth)
+
+    def open(self, url, headers=None, budget=None):
+        """Method to replay a recorded page.
+
+        Args:
+            url (str): URL to fetch.
+            headers: Optional dictionary of extra request headers.
+            budget: Optional FetchBudget, whose read timeout cuts the latency short.
+
+        Returns:
+            The ReplayResponse, to be closed once its body has been read.
+
+        Raises:
+            urllib.error.HTTPError: If the URL was not recorded or has an error status.
+            urllib.error.URLError: If the latency is over the budget's read timeout.
+
+        """
+        read_timeout = budget.read_timeout if budget is not None else None
+        if read_timeout is not None and self.latency > read_timeout:
+            time.sleep(read_timeout)
+            raise urllib.error.URLError(TimeoutError("timed out"))
+        if self.latency:
+            time.sleep(self.latency)
+        return self._replay(url, headers, ReplayResponse)
+
+    def _replay(self, url, headers, response_class):
+        page = self.pages.get(url)
+        if page is None:
+            raise urllib.error.HTTPError(url, 404, "Not Found", email.message.Message(), None)
+
+        response_headers = email.message.Message()
+        for name, value in page.get("headers", {}).items():
+            response_headers[name] = value
+        status = page.get("status", 200)
+        etag = response_headers.get("ETag")
+        if etag is not None and (headers or {}).get("If-None-Match") == etag:
+            return response_class(url, 304, response_headers, b"", self.bandwidth)
+        if status >= 400:
+            raise urllib.error.HTTPError(url, status, "", response_headers, None)
+        return response_class(url, status, response_headers, page["body"], self.bandwidth)
+
+
+class AsyncReplayResponse(ReplayResponse):
+    """A replayed response for the asyncio server, with the interface of an AsyncResponse."""
+
+    async def read1(self, size=-1):
+        """Method to read up to size bytes of the body, slowed down without blocking."""
+        data = self._body.read1(size)
+        if self._bandwidth and data:
+            await asyncio.sleep(len(data) / self._bandwidth)
+        return data
+
+    async def read(self):
+        """Method to read the rest of the body."""
+        return await self.read1()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+
+class AsyncReplayTransport(ReplayTransport):
+    """A ReplayTransport with the open interface of an AsyncFetchClient, for the asyncio server.
+
+    The latency and bandwidth are simulated with asyncio.sleep, so any number
+    of replayed fetches can wait at once without a thread each.
+    """
+
+    async def open(self, url, headers=None, budget=None):
+        """Method to replay a recorded page without blocking.
+
+        Args:
+            url (str): URL to fetch.
+            headers: Optional dictionary of extra request headers.
+            budget: Optional FetchBudget, whose read timeout cuts the latency short.
+
+        Returns:
+            The AsyncReplayResponse, to be closed once its body has been read.
+
+        Raises:
+            urllib.error.HTTPError: If the URL was not recorded or has an error status.
+            urllib.error.URLError: If the latency is over the budget's read timeout.
+
+        """
+        read_timeout = budget.read_timeout if budget is not None else None
+        if read_timeout is not None and self.latency > read_timeout:
+            await asyncio.sleep(read_timeout)
+            raise urllib.error.URLError(TimeoutError("timed out"))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._replay(url, headers, AsyncReplayResponse)
+
+
+def record_pages(urls, directory, fetch_client=None):
+    """Function to fetch pages and record them to a directory for a ReplayTransport.
+
+    Bodies are recorded as they were sent, compressed or not, with their
+    Content-Type, Content-Encoding, ETag and Last-Modified headers.
+
+    Args:
+        urls: A list of URLs to record.
+        directory: Path of the directory, created if needed. Pages already
+            recorded in it are kept unless recorded again.
+        fetch_client: Optional FetchClient for fetching over pooled connections.
+
+    Returns:
+        The number of pages recorded.
+
+    Raises:
+        urllib.error.URLError: If a page can't be fetched.
+
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    manifest_path = directory / MANIFEST_FILE
+    manifest = json.loads(manifest_path.read_text()) if manifest_path.exists() else {}
+
+    for url in urls:
+        with open_url(url, fetch_client) as response:
+            body = response.read()
+            headers = {name: response.headers[name]
+                       for name in RECORDED_HEADERS if response.headers.get(name) is not None}
+            status = response.status
+        file_name = manifest.get(url, {}).get("file", f"page-{len(manifest)}.html")
+        (directory / file_name).write_bytes(body)
+        manifest[url] = {"file": file_name, "status": status, "headers": headers}
+
+    manifest_path.write_text(json.dumps(manifest, indent=2))
+    return len(urls)
@@ -0,0 +1,246 @@
+import re
+from html import unescape
+
+from libs.counting import ACCEPTED_HTML_TAGS, Parser
+from libs.tokenizing import count_words
+
+# The start tag name and attributes, as located by html.parser's
+# locatestarttagend_tolerant, so malformed tags (stray or unclosed quotes)
+# end where html.parser ends them.
+_START_TAG = re.compile(r"""
+  <([a-zA-Z][^\t\n\r\f />\x00]*)
+  (?:[\s/]*
+    (?:(?<=['"\s/])[^\s/>][^\s/=>]*
+      (?:\s*=+\s*
+        (?:'[^']*'
+          |"[^"]*"
+          |(?!['"])[^>\s]*
+         )
+        \s*
+       )?(?:\s|/(?!>))*
+     )*
+   )?
+  \s*
+""", re.VERBOSE)
+# The whitespace after a tag name, and each attribute, as html.parser's
+# tagfind_tolerant and attrfind_tolerant, for finding what ends a tag.
+_TAG_NAME_END = re.compile(r"(?:\s|/(?!>))*")
+_ATTRIBUTE = re.compile(
+    r"""(?<=['"\s/])[^\s/>][^\s/=>]*(?:\s*=+\s*(?:'[^']*'|"[^"]*"|(?!['"])[^>\s]*))?"""
+    r"""(?:\s|/(?!>))*""")
+_HREF = re.compile(
+    r"""[\s"'/]href\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'=<>`]+))""", re.I)
+# End tags, as html.parser's endtagfind (allowing whitespace around the name),
+# then its tolerant tag name followed by anything up to the ">".
+_END_TAG = re.compile(r"</\s*([a-zA-Z][-.a-zA-Z0-9:_]*)\s*>")
+_END_TAG_NAME = re.compile(r"[a-zA-Z][^\t\n\r\f />\x00]*")
+# Characters after a located start tag that mean it continues in the next chunk.
+_START_TAG_CONTINUES = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ=/")
+_COMMENT_END = re.compile(r"--\s*>")
+_CDATA_CONTENT_END = {
+    "script": re.compile(r"</\s*(script)\s*>", re.I),
+    "style": re.compile(r"</\s*(style)\s*>", re.I),
+}
+
+
+class Scanner(Parser):
+    """A dedicated HTML scanner for collecting word count information.
+
+    A faster alternative to Parser with the same attributes and results. Rather
+    than tokenizing every tag and attribute like html.parser, it only extracts
+    tag names to track the tag context. Attributes are never parsed, comments
+    and <script>/<style> bodies are skipped with a single search, and text
+    outside of accepted tags is never sliced out of the HTML. When links are
+    collected, only the href attribute of <a> tags is searched for. Malformed
+    tags (whitespace after "</", stray or unclosed quotes) are ended where
+    html.parser ends them, so the two engines count the same words.
+
+    The HTML can be fed in as many chunks as needed. Any incomplete markup at
+    the end of a chunk is kept until the next chunk arrives.
+
+    """
+
+    def __init__(self, words_list=None, collect_links=False):
+        super().__init__(words_list, collect_links)
+        self.rawdata = ""
+        self._cdata_content_end = None
+
+    def feed(self, data):
+        """Method to scan a chunk of HTML."""
+        self.rawdata += data
+        self._scan(False)
+
+    def close(self):
+        """Method to scan any remaining incomplete HTML and buffered text."""
+        self._scan(True)
+        self._flush_data()
+
+    def _count_data(self, data):
+        # Text is only split at whitespace, which never splits a character reference.
+        if "&" in data:
+            data = unescape(data)
+        self.word_count += count_words(data, self.words_list)
+
+    def _is_counting(self):
+        return self.body_depth == 1 and self.currently_opened_tags[-1] in ACCEPTED_HTML_TAGS
+
+    def _scan(self, final):
+        rawdata = self.rawdata
+        i = 0
+        n = len(rawdata)
+        while i < n:
+            if self._cdata_content_end is not None:
+                match = self._cdata_content_end.search(rawdata, i)
+                if match is None:
+                    # Skip the ignored content, keeping a possibly split end tag.
+                    j = rawdata.rfind("<", i)
+                    i = n if j < 0 or final else j
+                    break
+                self._cdata_content_end = None
+                self.handle_endtag(match.group(1).lower())
+                i = match.end()
+                continue
+
+            j = rawdata.find("<", i)
+            if j < 0:
+                j = n
+            if i < j and self._is_counting():
+                self._buffer_data(rawdata[i:j])
+            i = j
+            if i == n:
+                break
+
+            k = self._scan_markup(rawdata, i)
+            if k < 0:
+                if not final:
+                    break
+                k = self._scan_incomplete_markup(rawdata, i)
+            i = k
+
+        self.rawdata = rawdata[i:]
+
+    def _scan_markup(self, rawdata, i):
+        """Method to handle the markup starting at rawdata[i], returning its end or -1 if incomplete."""
+        next_char = rawdata[i + 1:i + 2]
+        if next_char.isascii() and next_char.isalpha():
+            return self._scan_start_tag(rawdata, i)
+        if next_char == "/":
+            return self._scan_end_tag(rawdata, i)
+        if rawdata.startswith("<!--", i):
+            return self._scan_comment(rawdata, i)
+        if rawdata.startswith("<![", i):
+            return self._scan_marked_section(rawdata, i)
+        if next_char in ("!", "?"):
+            return self._scan_declaration(rawdata, i)
+        if next_char == "":
+            return -1
+
+        # A "<" that does not start any markup is just text.
+        if self._is_counting():
+            self._buffer_data("<")
+        return i + 1
+
+    def _scan_start_tag(self, rawdata, i):
+        """Method to handle the start tag at rawdata[i], returning its end or -1 if incomplete."""
+        match = _START_TAG.match(rawdata, i)
+        j = match.end()
+        end_char = rawdata[j:j + 1]
+        if end_char == ">":
+            j += 1
+        elif end_char == "" or end_char in _START_TAG_CONTINUES:
+            if not rawdata.startswith("/>", j):
+                return -1
+            j += 2
+        else:
+            # A tag cut short by other markup is text, like in html.parser.
+            if self._is_counting():
+                self._buffer_data(rawdata[i:j])
+            return j
+
+        tag_text = rawdata[i:j]
+        is_self_closing = False
+        if tag_text.endswith("/>"):
+            # Only a "/>" after the attributes self closes a tag, not one
+            # ending an unquoted value such as <a href=/path/>.
+            end = _tag_end(tag_text, match.end(1) - i)
+            if end not in (">", "/>"):
+                if self._is_counting():
+                    self._buffer_data(tag_text)
+                return j
+            is_self_closing = end == "/>"
+        tag = match.group(1).lower()
+        if tag == "a" and self.links is not None:
+            href = _HREF.search(tag_text, match.end(1) - i)
+            if href is not None:
+                self._add_link(unescape(href.group(href.lastindex)))
+        if is_self_closing:
+            self.handle_startendtag(tag, [])
+        else:
+            self.handle_starttag(tag, [])
+            self._cdata_content_end = _CDATA_CONTENT_END.get(tag)
+        return j
+
+    def _scan_end_tag(self, rawdata, i):
+        """Method to handle the end tag at rawdata[i], returning its end or -1 if incomplete."""
+        k = rawdata.find(">", i + 2)
+        if k < 0:
+            return -1
+        match = _END_TAG.match(rawdata, i)
+        if match is not None:
+            self.handle_endtag(match.group(1).lower())
+            return match.end()
+        match = _END_TAG_NAME.match(rawdata, i + 2)
+        if match is not None:
+            self.handle_endtag(match.group().lower())
+        elif k != i + 2:
+            self.handle_comment(rawdata[i + 2:k])
+        return k + 1
+
+    def _scan_comment(self, rawdata, i):
+        """Method to handle the comment at rawdata[i], returning its end or -1 if incomplete."""
+        match = _COMMENT_END.search(rawdata, i + 4)
+        if match is None:
+            return -1
+        self.handle_comment(rawdata[i + 4:match.start()])
+        return match.end()
+
+    def _scan_marked_section(self, rawdata, i):
+        """Method to handle the CDATA or other marked section at rawdata[i], returning its end or -1 if incomplete."""
+        section_end = "]]>" if rawdata.startswith("<![CDATA[", i) else "]>"
+        k = rawdata.find(section_end, i + 3)
+        if k < 0:
+            return -1
+        self.unknown_decl(rawdata[i + 3:k])
+        return k + len(section_end)
+
+    def _scan_declaration(self, rawdata, i):
+        """Method to handle the declaration or processing instruction at rawdata[i], returning its end or -1 if incomplete."""
+        k = rawdata.find(">", i + 2)
+        if k < 0:
+            return -1
+        self.handle_decl(rawdata[i + 2:k])
+        return k + 1
+
+    def _scan_incomplete_markup(self, rawdata, i):
+        """Method to treat incomplete markup at the end of the HTML as text, like html.parser."""
+        k = rawdata.find(">", i + 1)
+        if k < 0:
+            k = rawdata.find("<", i + 1)
+            if k < 0:
+                k = i + 1
+        else:
+            k += 1
+        if self._is_counting():
+            self._buffer_data(rawdata[i:k])
+        return k
+
+
+def _tag_end(tag_text, name_end):
+    """Function to get what follows the attributes of a start tag, ">" or "/>" if well formed."""
+    k = _TAG_NAME_END.match(tag_text, name_end).end()
+    while k < len(tag_text):
+        match = _ATTRIBUTE.match(tag_text, k)
+        if match is None:
+            break
+        k = match.end()
+    return tag_text[k:].strip()
@@ -0,0 +1,105 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer
+
+# Seconds spent reading a rejected request before responding, so the client
+# receives the 503 rather than a reset connection.
+REJECT_READ_TIMEOUT = 0.05
+
+
+class PooledHTTPServer(HTTPServer):
+    """A HTTP server handling requests concurrently on a bounded pool of worker threads.
+
+    Accepted connections wait in a bounded queue for a free worker. When every
+    worker is busy and the queue is full, new connections are answered straight
+    away with a 503 Service Unavailable and a Retry-After header, rather than
+    waiting behind requests that will not finish in time.
+
+    Args:
+        server_address: The (host, port) address to listen on.
+        RequestHandlerClass: The request handler class, or factory.
+        max_workers (int): Number of worker threads handling requests.
+        max_queue (int): Number of accepted connections that may wait for a free worker.
+        backlog (int): Listen backlog of connections not yet accepted.
+        retry_after (int): Seconds sent in the Retry-After header of rejected requests.
+        bind_and_activate (bool): Bind and listen on the address, False to
+            listen on an inherited socket instead.
+
+    Attributes:
+        retry_after (int): Seconds sent in the Retry-After header of rejected requests.
+
+    """
+
+    def __init__(self, server_address, RequestHandlerClass, max_workers, max_queue, backlog,
+                 retry_after, bind_and_activate=True):
+        self.request_queue_size = backlog
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="http-worker")
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._waiting = 0
+        self._waiting_lock = threading.Lock()
+        super().__init__(server_address, RequestHandlerClass, bind_and_activate)
+
+    def process_request(self, request, client_address):
+        """Method to queue a connection for a worker, or reject it if the queue is full."""
+        if not self._slots.acquire(blocking=False):
+            self.reject_request(request)
+            self.shutdown_request(request)
+            return
+        with self._waiting_lock:
+            self._waiting += 1
+        try:
+            self._executor.submit(self._process_request, request, client_address)
+        except BaseException:
+            with self._waiting_lock:
+                self._waiting -= 1
+            self._slots.release()
+            raise
+
+    def has_waiting_connections(self):
+        """Method to check if any accepted connection is waiting for a free worker.
+
+        Returns:
+            True if a connection is queued, so workers should not be kept by idle connections.
+
+        """
+        return self._waiting > 0
+
+    def _process_request(self, request, client_address):
+        with self._waiting_lock:
+            self._waiting -= 1
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def reject_request(self, request):
+        """Method to respond to a connection with a 503 and Retry-After."""
+        body = b"Server is busy, retry later"
+        response = (
+            "HTTP/1.0 503 Service Unavailable\r\n"
+            f"Retry-After: {self.retry_after}\r\n"
+            "Access-Control-Allow-Origin: *\r\n"
+            "Content-Type: text/plain\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n"
+            "\r\n"
+        ).encode("latin-1") + body
+        try:
+            request.settimeout(REJECT_READ_TIMEOUT)
+            try:
+                request.recv(64 * 1024)
+            except OSError:
+                pass
+            request.sendall(response)
+        except OSError:
+            pass
+
+    def server_close(self):
+        """Method to stop listening, waiting for the requests being handled to finish."""
+        super().server_close()
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,107 @@
+import asyncio
+import threading
+
+from libs.metrics import metrics
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """A registry of in-flight calls, so concurrent calls with the same key run once.
+
+    The first caller for a key runs the call, and callers that arrive while it
+    is running wait for it and share its result, or have its error raised.
+    Once the call is finished the next caller for the key runs it again.
+    Callers that share another's call are recorded in the
+    single_flight.coalesced metric.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, *args, **kwargs):
+        """Method to run a call, or wait for the in-flight call with the same key.
+
+        Args:
+            key: Hashable key of the call.
+            func: Function to call.
+            *args: Positional arguments for func.
+            **kwargs: Keyword arguments for func.
+
+        Returns:
+            The result of the call.
+
+        Raises:
+            Exception: Any error raised by the call.
+
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = _Call()
+
+        if not is_leader:
+            metrics.increment("single_flight.coalesced")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as err:
+            call.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class AsyncSingleFlight:
+    """A registry of in-flight coroutines, so concurrent awaits with the same key run once.
+
+    The asyncio counterpart of SingleFlight: the first caller for a key starts
+    the call as a task, and callers that arrive while it is running await the
+    same task. The task is shielded, so a caller that is cancelled (such as
+    when its client disconnects) does not cancel the call for the others.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, func, *args, **kwargs):
+        """Method to run a coroutine function, or await the in-flight call with the same key.
+
+        Args:
+            key: Hashable key of the call.
+            func: Coroutine function to call.
+            *args: Positional arguments for func.
+            **kwargs: Keyword arguments for func.
+
+        Returns:
+            The result of the call.
+
+        Raises:
+            Exception: Any error raised by the call.
+
+        """
+        task = self._calls.get(key)
+        if task is None or task.done():
+            task = self._calls[key] = asyncio.ensure_future(func(*args, **kwargs))
+            task.add_done_callback(lambda done: self._remove(key, done))
+        else:
+            metrics.increment("single_flight.coalesced")
+        return await asyncio.shield(task)
+
+    def _remove(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
@@ -0,0 +1,217 @@
+import heapq
+from collections import Counter
+from collections.abc import Mapping, Sized
+from itertools import islice
+
+from libs.ranking import RankedWords
+
+# Fewest words counted between compactions, so small capacities are not
+# compacted after every few words.
+MIN_BATCH_SIZE = 1024
+
+
+class HeavyHitters(Counter):
+    """A Counter of a bounded number of words, for approximately counting huge pages.
+
+    Implements the Misra-Gries frequent items summary, the deterministic
+    counterpart of Space-Saving. At most 2 * capacity words are held: when there
+    are more, the (capacity + 1)th largest count is subtracted from every word
+    and words left without a count are dropped. Every count is therefore an
+    underestimate by at most error, which is itself at most the total number of
+    words counted divided by (capacity + 1), and any word that occurs more often
+    than that is never dropped. Words are counted in batches of capacity (or at
+    least MIN_BATCH_SIZE) words, compacting after each, so the words held stay
+    bounded however many are counted at once.
+
+    Args:
+        capacity (int): Number of words guaranteed to be kept.
+        iterable: Optional words (or mapping of words to counts) to count.
+        error (int): Initial maximum undercount of any word.
+
+    Attributes:
+        capacity (int): Number of words guaranteed to be kept.
+        error (int): Maximum undercount of any word.
+
+    """
+
+    def __init__(self, capacity, iterable=None, error=0):
+        self.capacity = capacity
+        self.error = error
+        super().__init__(iterable)
+
+    def update(self, iterable=None, /, **kwds):
+        """Method to count words (or merge another Counter), dropping infrequent words when full."""
+        if isinstance(iterable, HeavyHitters):
+            self.error += iterable.error
+        if iterable is not None:
+            batch_size = max(self.capacity, MIN_BATCH_SIZE)
+            if isinstance(iterable, Sized) and len(iterable) <= batch_size:
+                super().update(iterable)
+                self._compact_if_full()
+            elif isinstance(iterable, Mapping):
+                items = iter(iterable.items())
+                while batch := dict(islice(items, batch_size)):
+                    super().update(batch)
+                    self._compact_if_full()
+            else:
+                words = iter(iterable)
+                while batch := list(islice(words, batch_size)):
+                    super().update(batch)
+                    self._compact_if_full()
+        if kwds:
+            super().update(**kwds)
+            self._compact_if_full()
+
+    def _compact_if_full(self):
+        if len(self) > 2 * self.capacity:
+            self._compact()
+
+    def _compact(self):
+        decrement = heapq.nlargest(self.capacity + 1, self.values())[-1]
+        kept = [(word, count - decrement)
+                for word, count in self.items() if count > decrement]
+        self.clear()
+        dict.update(self, kept)
+        self.error += decrement
+
+    def copy(self):
+        heavy_hitters = HeavyHitters(self.capacity, error=self.error)
+        dict.update(heavy_hitters, self)
+        return heavy_hitters
+
+    def __reduce__(self):
+        return self.__class__, (self.capacity, dict(self), self.error)
+
+
+class WordCounts:
+    """A mergeable summary of the words counted in one or more HTML documents.
+
+    Summaries of separate documents (or separately parsed parts of a document)
+    can be merged without re-parsing or re-sorting: update runs in time linear
+    in the vocabulary merged in, and merge also copies this summary's
+    vocabulary. Merging is associative, and words with equal counts keep the
+    order they were first counted in, as if the documents had been counted one
+    after the other.
+
+    Args:
+        word_count (int): The total word count.
+        counts: A dictionary of words and number of occurences for each word.
+
+    Attributes:
+        word_count (int): The total word count.
+        counts: A Counter of words and number of occurences for each word.
+
+    """
+
+    def __init__(self, word_count=0, counts=None):
+        self.word_count = word_count
+        if isinstance(counts, Counter):
+            self.counts = counts.copy()
+        else:
+            self.counts = Counter(counts) if counts is not None else Counter()
+
+    @property
+    def is_approximate(self):
+        """bool: Whether the counts are approximate (see HeavyHitters)."""
+        return isinstance(self.counts, HeavyHitters)
+
+    @property
+    def max_count_error(self):
+        """int: The maximum undercount of any word, 0 for exact counts."""
+        return self.counts.error if self.is_approximate else 0
+
+    @classmethod
+    def from_parser(cls, parser):
+        """Method to create a summary from a parser that has been fed HTML.
+
+        The parser's words_list is used directly rather than copied.
+        """
+        summary = cls(parser.word_count)
+        summary.counts = parser.words_list
+        return summary
+
+    @classmethod
+    def from_dict(cls, data):
+        """Method to create a summary from its to_dict serialisation.
+
+        Args:
+            data: A dictionary with word_count, vocabulary and counts, plus
+                max_words and max_count_error for approximate counts.
+
+        Returns:
+            The deserialised WordCounts.
+
+        """
+        counts = dict(zip(data["vocabulary"], data["counts"]))
+        if "max_words" in data:
+            counts = HeavyHitters(
+                data["max_words"], counts, data["max_count_error"])
+        return cls(data["word_count"], counts)
+
+    def to_dict(self):
+        """Method to serialise the summary, e.g. for storing in MongoDB.
+
+        Returns:
+            A dictionary with word_count, vocabulary (list of words) and counts
+            (list of occurences, in the same order as the vocabulary), plus
+            max_words and max_count_error for approximate counts.
+
+        """
+        data = {
+            "word_count": self.word_count,
+            "vocabulary": list(self.counts.keys()),
+            "counts": list(self.counts.values()),
+        }
+        if self.is_approximate:
+            data["max_words"] = self.counts.capacity
+            data["max_count_error"] = self.counts.error
+        return data
+
+    def update(self, other):
+        """Method to merge another summary into this one in place.
+
+        Merging approximate counts into exact counts makes them approximate.
+        """
+        if other.is_approximate and not self.is_approximate:
+            self.counts = HeavyHitters(other.counts.capacity, self.counts)
+        self.word_count += other.word_count
+        self.counts.update(other.counts)
+        return self
+
+    def merge(self, other):
+        """Method to merge two summaries into a new summary, leaving both unchanged."""
+        return WordCounts(self.word_count, self.counts).update(other)
+
+    @classmethod
+    def merge_all(cls, summaries):
+        """Method to merge any number of summaries into a new summary."""
+        merged = cls()
+        for summary in summaries:
+            merged.update(summary)
+        return merged
+
+    def ranked(self):
+        """Method to get the lazily ranked [word, count] pairs of the summary."""
+        return RankedWords(self.counts)
+
+    def to_count_information(self):
+        """Method to get the summary as count_information's word_count and words_list dictionary.
+
+        Approximate counts also have is_approximate and max_count_error.
+        """
+        count_info = {
+            "word_count": self.word_count,
+            "words_list": self.ranked(),
+        }
+        if self.is_approximate:
+            count_info["is_approximate"] = True
+            count_info["max_count_error"] = self.max_count_error
+        return count_info
+
+    def __eq__(self, other):
+        if isinstance(other, WordCounts):
+            return self.word_count == other.word_count and list(self.counts.items()) == list(other.counts.items())
+        return NotImplemented
+
+    def __repr__(self):
+        return f"WordCounts(word_count={self.word_count!r}, counts={dict(self.counts)!r})"
@@ -22,21 +22,53 @@ def reset_html():
     return reset_form_template.render()
 
 
-def counts_html(word_counts):
+def counts_html(word_counts, errors=None):
     """Function that returns the counts HTML.
 
     Args:
         word_counts: A list of word counts from MongoDB.
+        errors: Optional dictionary of error messages by URL, shown before the counts.
 
     Returns:
         The word counts HTML.
     """
+    return counts_template.render(
+        content_list=_tables(word_counts), errors=(errors or {}).items())
+
+
+def pending_html(word_counts, job_id, url, poll_interval):
+    """Function that returns the counts HTML while a URL is being counted.
+
+    The counts are polled for with htmx, every poll_interval seconds, until
+    the job is finished and they are swapped for the finished counts.
+
+    Args:
+        word_counts: A list of word counts from MongoDB.
+        job_id (str): ID of the job counting the URL.
+        url (str): URL being counted.
+        poll_interval (float): Seconds between polls for the job.
+
+    Returns:
+        The word counts HTML, with the URL shown as being counted.
+    """
+    return counts_template.render(
+        content_list=_tables(word_counts), errors=(), job_id=job_id,
+        pending_url=url, poll_interval=poll_interval)
+
+
+def _tables(word_counts):
     content_list = []
     for info in word_counts:
         table_content = table_template.render(
             display=info["display"],
             word_count=info["word_count"],
-            columns=("Word", "Count"),
+            is_truncated=info.get("is_truncated", False),
+            crawled_pages=info.get("crawled_pages"),
+            columns=(
+                ("Word", "Approximate count")
+                if info.get("is_approximate", False)
+                else ("Word", "Count")
+            ),
             rows=info["paginated_words_list"],
             url=info["url"],
             prev_page=(
@@ -52,4 +84,4 @@ def counts_html(word_counts):
         )
         content_list.append(table_content)
 
-    return counts_template.render(content_list=content_list)
+    return content_list
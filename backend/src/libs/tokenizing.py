@@ -0,0 +1,45 @@
+import re
+
+# Bumped whenever the word rules below change, so cached results can be invalidated.
+TOKENIZER_VERSION = 1
+
+# A word is a whitespace delimited token made up of ASCII letters and digits only,
+# optionally followed by trailing punctuation (".", ",", "!", "?") which is dropped.
+WORD_PATTERN = re.compile(r"(?<!\S)([a-zA-Z0-9]+)[.,!?]*(?!\S)")
+TRAILING_PUNCTUATION = ".,!?"
+
+
+def tokenize(text):
+    """Function to extract the normalised words from a piece of text.
+
+    Args:
+        text (str): Text to be split into words.
+
+    Returns:
+        A list of lowercased words, in the order they appear in the text.
+
+    """
+    if text.isascii():
+        # ASCII fast path: for ASCII text, str.split() splits on exactly the
+        # whitespace of WORD_PATTERN and str.isalnum() matches [a-zA-Z0-9], so
+        # splitting is equivalent to the pattern but avoids the regex engine.
+        return [word for word in (token.rstrip(TRAILING_PUNCTUATION)
+                                  for token in text.lower().split())
+                if word.isalnum()]
+    return [word.lower() for word in WORD_PATTERN.findall(text)]
+
+
+def count_words(text, counter):
+    """Function to add the words of a piece of text to a word counter.
+
+    Args:
+        text (str): Text to be split into words.
+        counter: A collections.Counter (or Counter-like) accumulator of words.
+
+    Returns:
+        The number of words found in the text.
+
+    """
+    words = tokenize(text)
+    counter.update(words)
+    return len(words)
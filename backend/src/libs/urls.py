@@ -0,0 +1,37 @@
+from urllib.parse import urlsplit, urlunsplit
+
+from libs.fetch_client import DEFAULT_PORTS
+
+
+def normalise_url(url):
+    """Function to normalise a URL, so different spellings of the same page compare equal.
+
+    The scheme and host are lowercased, the scheme's default port, the
+    fragment and surrounding whitespace are removed, and an empty path becomes "/".
+
+    Args:
+        url (str): URL to normalise.
+
+    Returns:
+        The normalised URL, or the stripped URL if it has an invalid port.
+
+    """
+    url = url.strip()
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    try:
+        port = parts.port
+    except ValueError:
+        return url
+
+    host = parts.hostname or ""
+    if ":" in host:
+        host = f"[{host}]"
+    if port is not None and port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{port}"
+    if parts.username is not None:
+        userinfo = parts.username
+        if parts.password is not None:
+            userinfo += f":{parts.password}"
+        host = f"{userinfo}@{host}"
+    return urlunsplit((scheme, host, parts.path or "/", parts.query, ""))
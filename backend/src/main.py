@@ -1,31 +1,101 @@
+import json
 import logging
 from http.server import BaseHTTPRequestHandler, HTTPServer
-from urllib.parse import unquote, urlparse
+from urllib.parse import parse_qs, unquote, urlparse
 from pymongo import MongoClient
 import os
+import signal
+import threading
+import urllib.request
 
+import config
 from db.mongo import (
     UrlError,
     add_new_count,
+    add_new_counts,
+    crawl_site,
+    create_indexes,
     get_counts,
+    recount,
     update_page,
     update_display,
 )
-from libs.templating import counts_html, reset_html
+from db.parse_cache import ParseCache
+from libs.compression import ResponseCompressor
+from libs.engines import get_engine
+from libs.fetch_client import FetchClient
+from libs.jobs import FAILED, PENDING, JobQueue, JobQueueFullError, JobStore
+from libs.metrics import metrics
+from libs.pooling import CountingPool
+from libs.prefork import Supervisor, adopt_socket, listen
+from libs.replay import ReplayTransport
+from libs.serving import PooledHTTPServer
+from libs.templating import counts_html, pending_html, reset_html
 
 logging.basicConfig(level=logging.DEBUG)
 
 
+def parse_count_query(query):
+    """Function to get the URL and any pagination, display or recount request of a /count query.
+
+    Args:
+        query (str): Query string of the /count request.
+
+    Returns:
+        A tuple of the URL, the requested action ("page", "display", "recount",
+        or None to add a new count) and the action's value.
+
+    """
+    url = unquote(query).replace("url=", "")
+    for action in ("page", "display", "recount"):
+        index = url.find(f"&{action}=")
+        if index != -1:
+            return url[:index], action, url[index + len(f"&{action}="):]
+    return url, None, None
+
+
 class HTTPRequestHandler(BaseHTTPRequestHandler):
     """A HTTP handler responding with HTMX HTML for word counts web page.
 
+    Responds with HTTP/1.1, framing every response with a Content-Length, so
+    the connection can be kept alive for the next htmx request, up to
+    SERVER_KEEP_ALIVE_MAX_REQUESTS requests and while it is not idle for
+    longer than SERVER_KEEP_ALIVE_TIMEOUT.
+
     Attributes:
         mongo_client: MongoDB client for storing word counts information.
+        counting_pool: Optional CountingPool for counting large pages.
+        fetch_client: Optional FetchClient for fetching pages over pooled connections.
+        parse_cache: Optional ParseCache, so identical pages are only parsed once.
+        job_queue: Optional JobQueue, for counting URLs in the background.
+        response_compressor: Optional ResponseCompressor, compressing responses
+            for clients that accept it.
+        requests_handled (int): Number of requests handled on the connection.
 
     """
 
-    def __init__(self, *args, mongo_client, **kwargs):
+    protocol_version = "HTTP/1.1"
+    # The headers and content are written separately, so on a kept alive
+    # connection Nagle's algorithm would hold the content back until the
+    # client's delayed ACK of the headers.
+    disable_nagle_algorithm = True
+    counting_pool = None
+    fetch_client = None
+    parse_cache = None
+    job_queue = None
+    response_compressor = None
+    requests_handled = 0
+
+    def __init__(self, *args, mongo_client, counting_pool=None, fetch_client=None,
+                 parse_cache=None, job_queue=None, response_compressor=None, **kwargs):
+        # Socket timeout set by StreamRequestHandler.setup, closing idle connections.
+        self.timeout = config.SERVER_KEEP_ALIVE_TIMEOUT or None
         self.mongo_client = mongo_client
+        self.counting_pool = counting_pool
+        self.fetch_client = fetch_client
+        self.parse_cache = parse_cache
+        self.job_queue = job_queue
+        self.response_compressor = response_compressor
         super().__init__(*args, **kwargs)
 
     def complete_response(self, http_code, content=None):
@@ -45,8 +115,24 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
         self.send_header("Access-Control-Allow-Methods", "GET, OPTIONS")
         self.send_header("Access-Control-Allow-Headers",
                          "HX-Request, HX-Current-URL, HX-Target")
+        if self.command == "OPTIONS":
+            self.send_header("Access-Control-Max-Age", str(config.CORS_MAX_AGE))
         self.send_header(
             "Cache-Control", "no-cache, no-store, must-revalidate")
+        if http_code == 503:
+            self.send_header("Retry-After", str(config.SERVER_RETRY_AFTER))
+        body = content
+        if content is not None and self.response_compressor is not None:
+            body, encoding = self.response_compressor.compress(
+                content, self.headers.get("Accept-Encoding", ""))
+            self.send_header("Vary", "Accept-Encoding")
+            if encoding is not None:
+                self.send_header("Content-Encoding", encoding)
+        if http_code != 204:
+            self.send_header("Content-Length",
+                             str(len(body) if body is not None else 0))
+        if self.protocol_version == "HTTP/1.1":
+            self.send_connection_headers()
         self.end_headers()
 
         if (content is not None):
@@ -54,7 +140,58 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
             logging.error(content_message) if http_code > 400 else logging.info(
                 content_message)
             logging.info("Writing content to response")
-            self.wfile.write(content)
+            self.wfile.write(body)
+
+    def send_connection_headers(self):
+        """Method to send whether the connection is kept alive after the response.
+
+        The connection is closed when the client asks for it, once it has
+        handled SERVER_KEEP_ALIVE_MAX_REQUESTS requests, when the request has a
+        body (which is not read), and when connections are waiting for a free
+        worker, so idle connections don't keep workers from them (always, on
+        the single threaded HTTPServer).
+
+        """
+        self.requests_handled += 1
+        has_body = ("Transfer-Encoding" in self.headers
+                    or self.headers.get("Content-Length", "0") != "0")
+        if (self.close_connection or has_body
+                or self.requests_handled >= config.SERVER_KEEP_ALIVE_MAX_REQUESTS
+                or not isinstance(self.server, PooledHTTPServer)
+                or self.server.has_waiting_connections()):
+            self.send_header("Connection", "close")
+        else:
+            self.send_header("Connection", "keep-alive")
+            self.send_header("Keep-Alive", f"timeout={config.SERVER_KEEP_ALIVE_TIMEOUT:g}, "
+                             f"max={config.SERVER_KEEP_ALIVE_MAX_REQUESTS - self.requests_handled}")
+
+    def respond_with_counts(self, errors=None, job=None):
+        """Method to respond with the counts HTML of every searched URL.
+
+        Args:
+            errors: Optional dictionary of error messages by URL, shown before the counts.
+            job: Optional pending Job, shown as being counted and polled for.
+
+        """
+        try:
+            word_counts = get_counts(self.mongo_client)
+            if job is not None:
+                html = pending_html(word_counts, job.id, job.label,
+                                    config.COUNT_JOBS_POLL_INTERVAL)
+            else:
+                html = counts_html(word_counts, errors)
+            content = html.encode("utf-8")
+            self.complete_response(200, content)
+        except UrlError as e:
+            error = f"UrlError during getting of all counts: {
+                e.message}"
+            logging.error(error)
+            self.complete_response(e.code, error.encode("utf-8"))
+        except Exception as e:
+            error = f"Exception during getting of all counts: {
+                e}"
+            logging.error(error)
+            self.complete_response(500, error.encode("utf-8"))
 
     def do_OPTIONS(self):
         """Method to handle OPTIONS requests."""
@@ -83,23 +220,12 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
                     return
 
             case "/count":
-                query = unquote(parsed_query.query)
-                url = query.replace("url=", "")
-
-                pagination_index = url.find("&page=")
-                isPaginationRequest = pagination_index != -1
+                url, action, value = parse_count_query(parsed_query.query)
 
-                display_index = url.find("&display=")
-                isDisplayRequest = display_index != -1
-
-                # Add words information for new URL, or update pagination or display.
-                if isPaginationRequest:
-                    pagination_value = url[pagination_index +
-                                           len("&page="): None]
-                    url = url[None: pagination_index]
+                # Add words information for new URL, recount it, or update pagination or display.
+                if action == "page":
                     try:
-                        update_page(url, int(pagination_value),
-                                    self.mongo_client)
+                        update_page(url, int(value), self.mongo_client)
                     except UrlError as e:
                         error = f"UrlError during updating of page: {
                             e.message}"
@@ -112,11 +238,9 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
                         logging.error(error)
                         self.complete_response(500, error.encode("utf-8"))
                         return
-                elif isDisplayRequest:
-                    display_value = url[display_index + len("&display="): None]
-                    url = url[None: display_index]
+                elif action == "display":
                     try:
-                        update_display(url, False if display_value ==
+                        update_display(url, False if value ==
                                        "false" else True, self.mongo_client)
                     except UrlError as e:
                         error = f"UrlError during updating of display: {
@@ -130,9 +254,56 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
                         logging.error(error)
                         self.complete_response(500, error.encode("utf-8"))
                         return
+                elif action == "recount":
+                    if self.job_queue is not None:
+                        try:
+                            job = self.job_queue.submit(
+                                url, recount, url, self.mongo_client,
+                                counting_pool=self.counting_pool,
+                                fetch_client=self.fetch_client,
+                                parse_cache=self.parse_cache)
+                        except JobQueueFullError as e:
+                            logging.error(e.message)
+                            self.complete_response(503, e.message.encode("utf-8"))
+                            return
+                        self.respond_with_counts(job=job)
+                        return
+                    try:
+                        recount(url, self.mongo_client,
+                                counting_pool=self.counting_pool,
+                                fetch_client=self.fetch_client,
+                                parse_cache=self.parse_cache)
+                    except UrlError as e:
+                        error = f"UrlError during recount of URL: {
+                            e.message}"
+                        logging.error(error)
+                        self.complete_response(e.code, error.encode("utf-8"))
+                        return
+                    except Exception as e:
+                        error = f"Exception during recount of URL: {
+                            e}"
+                        logging.error(error)
+                        self.complete_response(500, error.encode("utf-8"))
+                        return
                 else:
+                    if self.job_queue is not None:
+                        try:
+                            job = self.job_queue.submit(
+                                url, add_new_count, url, self.mongo_client,
+                                counting_pool=self.counting_pool,
+                                fetch_client=self.fetch_client,
+                                parse_cache=self.parse_cache)
+                        except JobQueueFullError as e:
+                            logging.error(e.message)
+                            self.complete_response(503, e.message.encode("utf-8"))
+                            return
+                        self.respond_with_counts(job=job)
+                        return
                     try:
-                        add_new_count(url, self.mongo_client)
+                        add_new_count(url, self.mongo_client,
+                                      counting_pool=self.counting_pool,
+                                      fetch_client=self.fetch_client,
+                                      parse_cache=self.parse_cache)
                     except UrlError as e:
                         error = f"UrlError during addition of new URL count: {
                             e.message}"
@@ -147,41 +318,152 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
                         return
 
                 # Return updated words information
+                self.respond_with_counts()
+                return
+
+            case "/count/job":
+                job_id = parse_qs(parsed_query.query).get("id", [""])[0]
+                job = (self.job_queue.store.get(job_id)
+                       if self.job_queue is not None else None)
+                if job is None:
+                    error = f"Count job not found: {job_id}"
+                    logging.error(error)
+                    self.complete_response(404, error.encode("utf-8"))
+                    return
+
+                # Poll again while pending, otherwise return the finished counts. A failed
+                # job is shown with the counts, as htmx doesn't swap in error responses.
+                if job.status == PENDING:
+                    self.respond_with_counts(job=job)
+                elif job.status == FAILED:
+                    error = f"Error during count job for URL: {job.label}, {
+                        job.error.message}"
+                    logging.error(error)
+                    self.respond_with_counts(errors={job.label: job.error.message})
+                else:
+                    self.respond_with_counts()
+                return
+
+            case "/count/crawl":
+                query = parse_qs(parsed_query.query)
+                url = query.get("url", [""])[0].strip()
+                if not url:
+                    error = "No URL given to crawl"
+                    logging.error(error)
+                    self.complete_response(400, error.encode("utf-8"))
+                    return
+
+                # Add words information for the site, with failed pages shown inline.
                 try:
-                    word_counts = get_counts(self.mongo_client)
-                    content = counts_html(word_counts).encode("utf-8")
-                    self.complete_response(200, content)
+                    errors = crawl_site(url, self.mongo_client,
+                                        counting_pool=self.counting_pool,
+                                        fetch_client=self.fetch_client)
+                except UrlError as e:
+                    error = f"UrlError during crawl of URL: {
+                        e.message}"
+                    logging.error(error)
+                    self.complete_response(e.code, error.encode("utf-8"))
                     return
+                except Exception as e:
+                    error = f"Exception during crawl of URL: {
+                        e}"
+                    logging.error(error)
+                    self.complete_response(500, error.encode("utf-8"))
+                    return
+
+                self.respond_with_counts(errors)
+                return
+
+            case "/count/batch":
+                urls = [url for value in parse_qs(parsed_query.query).get("urls", [])
+                        for url in value.split()]
+                if not urls or len(urls) > config.BATCH_MAX_URLS:
+                    error = f"Batch of URLs must have between 1 and {
+                        config.BATCH_MAX_URLS} URLs"
+                    logging.error(error)
+                    self.complete_response(400, error.encode("utf-8"))
+                    return
+
+                # Add words information for every new URL, with failed URLs shown inline.
+                try:
+                    errors = add_new_counts(urls, self.mongo_client,
+                                            counting_pool=self.counting_pool,
+                                            fetch_client=self.fetch_client,
+                                            parse_cache=self.parse_cache)
                 except UrlError as e:
-                    error = f"UrlError during getting of all counts: {
+                    error = f"UrlError during addition of new URL counts: {
                         e.message}"
                     logging.error(error)
                     self.complete_response(e.code, error.encode("utf-8"))
                     return
                 except Exception as e:
-                    error = f"Exception during getting of all counts: {
+                    error = f"Exception during addition of new URL counts: {
                         e}"
                     logging.error(error)
                     self.complete_response(500, error.encode("utf-8"))
                     return
 
+                for url, error in errors.items():
+                    logging.error(f"Error during batch count of URL: {url}, {error}")
+                self.respond_with_counts(errors)
+                return
+
+            case "/metrics":
+                content = json.dumps(metrics.snapshot()).encode("utf-8")
+                self.complete_response(200, content)
+                return
+
             case _:
                 content = b"Not Found"
                 self.complete_response(404, content)
 
 
-def run(mongo_client):
+def run(mongo_client, counting_pool=None, fetch_client=None, parse_cache=None,
+        job_queue=None, response_compressor=None, listen_socket=None):
     """Function to run HTTP client.
 
+    On SIGTERM the server stops accepting connections and finishes the
+    requests it is handling before returning.
+
     Args:
         mongo_client: MongoDB client.
+        counting_pool: Optional CountingPool for counting large pages.
+        fetch_client: Optional FetchClient for fetching pages over pooled connections.
+        parse_cache: Optional ParseCache, so identical pages are only parsed once.
+        job_queue: Optional JobQueue, for counting URLs in the background.
+        response_compressor: Optional ResponseCompressor, compressing responses.
+        listen_socket: Optional listening socket shared with other worker
+            processes, otherwise the server listens on SERVER_PORT.
 
     """
     def handler_with_mongo_client(*args, **kwargs):
-        return HTTPRequestHandler(*args, mongo_client=mongo_client, **kwargs)
+        return HTTPRequestHandler(*args, mongo_client=mongo_client,
+                                  counting_pool=counting_pool,
+                                  fetch_client=fetch_client,
+                                  parse_cache=parse_cache,
+                                  job_queue=job_queue,
+                                  response_compressor=response_compressor, **kwargs)
     server_port = os.getenv("SERVER_PORT", "8080")
-    httpd = HTTPServer(("0.0.0.0", int(server_port)),
-                       handler_with_mongo_client)
+    bind_and_activate = listen_socket is None
+    if config.SERVER_WORKERS > 0:
+        # MongoClient, and every shared object passed to the handlers, is thread safe.
+        httpd = PooledHTTPServer(("0.0.0.0", int(server_port)),
+                                 handler_with_mongo_client,
+                                 max_workers=config.SERVER_WORKERS,
+                                 max_queue=config.SERVER_MAX_QUEUE,
+                                 backlog=config.SERVER_BACKLOG,
+                                 retry_after=config.SERVER_RETRY_AFTER,
+                                 bind_and_activate=bind_and_activate)
+    else:
+        httpd = HTTPServer(("0.0.0.0", int(server_port)),
+                           handler_with_mongo_client, bind_and_activate)
+    if listen_socket is not None:
+        adopt_socket(httpd, listen_socket)
+
+    # shutdown waits for serve_forever to return, so it can't be called from
+    # the signal handler, which runs on the thread serving forever.
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(
+        target=httpd.shutdown, daemon=True).start())
 
     logging.info("Starting httpd...\n")
     try:
@@ -199,9 +481,110 @@ def run(mongo_client):
         logging.info("Stopping httpd...\n")
 
 
-if __name__ == "__main__":
+def serve(listen_socket=None):
+    """Function to create the clients from the configuration and run the HTTP server.
+
+    In a pre-fork worker process this runs after the fork, so every worker has
+    its own MongoClient, connection pools and counting pool.
+
+    Args:
+        listen_socket: Optional listening socket shared with other worker processes.
+
+    """
     logging.info("Initiating MongoDb client")
     mongo_client_url = os.getenv(
         "MONGO_CLIENT_ENDPOINT", "mongodb://localhost:27017/")
     mongo_client = MongoClient(mongo_client_url)
-    run(mongo_client)
+    try:
+        create_indexes(mongo_client)
+    except Exception as e:
+        logging.error(f"Error creating MongoDB indexes: {e}")
+
+    counting_pool = None
+    if config.COUNTING_POOL_WORKERS > 0:
+        logging.info("Starting counting pool with %d workers",
+                     config.COUNTING_POOL_WORKERS)
+        counting_pool = CountingPool(
+            max_workers=config.COUNTING_POOL_WORKERS,
+            max_queue=config.COUNTING_POOL_MAX_QUEUE,
+            max_tasks_per_worker=config.COUNTING_POOL_MAX_TASKS_PER_WORKER,
+            size_threshold=config.COUNTING_POOL_SIZE_THRESHOLD,
+            timeout=config.COUNTING_POOL_TIMEOUT,
+        )
+
+    fetch_client = None
+    if config.FETCH_REPLAY_DIR:
+        logging.info("Replaying pages recorded in %s", config.FETCH_REPLAY_DIR)
+        fetch_client = ReplayTransport.from_directory(
+            config.FETCH_REPLAY_DIR,
+            latency=config.FETCH_REPLAY_LATENCY,
+            bandwidth=config.FETCH_REPLAY_BANDWIDTH or None,
+        )
+    elif config.FETCH_POOL_CONNECTIONS_PER_HOST > 0:
+        # FetchClient always connects directly, so behind a proxy pages are
+        # fetched with urlopen, which uses the HTTP(S)_PROXY and NO_PROXY settings.
+        if any(scheme != "no" for scheme in urllib.request.getproxies()):
+            logging.info("Fetching pages through the configured proxies, without pooling")
+        else:
+            fetch_client = FetchClient(
+                max_connections_per_host=config.FETCH_POOL_CONNECTIONS_PER_HOST,
+                max_hosts=config.FETCH_POOL_MAX_HOSTS,
+                dns_cache_ttl=config.FETCH_DNS_CACHE_TTL,
+            )
+
+    parse_cache = None
+    if config.PARSE_CACHE_MAX_ENTRIES > 0 or config.PARSE_CACHE_PERSISTENT:
+        parse_cache = ParseCache(
+            max_entries=config.PARSE_CACHE_MAX_ENTRIES,
+            max_body_size=config.PARSE_CACHE_MAX_BODY_SIZE,
+            collection=(mongo_client["local_database"]["parse_cache_collection"]
+                        if config.PARSE_CACHE_PERSISTENT else None),
+        )
+
+    response_compressor = None
+    if config.RESPONSE_COMPRESSION:
+        response_compressor = ResponseCompressor(
+            min_size=config.RESPONSE_COMPRESSION_MIN_SIZE,
+            max_entries=config.RESPONSE_COMPRESSION_CACHE_ENTRIES,
+        )
+
+    job_queue = None
+    if config.COUNT_JOBS_WORKERS > 0:
+        # Pre-fork workers keep jobs in MongoDB, as a poll may reach another worker.
+        job_queue = JobQueue(
+            max_workers=config.COUNT_JOBS_WORKERS,
+            max_queue=config.COUNT_JOBS_MAX_QUEUE,
+            store=JobStore(
+                timeout=config.COUNT_JOBS_TIMEOUT,
+                collection=(mongo_client["local_database"]["count_jobs_collection"]
+                            if config.SERVER_PROCESSES > 0 else None),
+            ),
+        )
+
+    try:
+        run(mongo_client, counting_pool, fetch_client, parse_cache, job_queue,
+            response_compressor, listen_socket)
+    finally:
+        if job_queue is not None:
+            job_queue.close()
+        if counting_pool is not None:
+            counting_pool.close()
+        if isinstance(fetch_client, FetchClient):
+            fetch_client.close()
+        mongo_client.close()
+
+
+if __name__ == "__main__":
+    # An unknown COUNTING_ENGINE stops the server here, rather than failing every count.
+    get_engine(config.COUNTING_ENGINE)
+    if config.SERVER_PROCESSES > 0:
+        # Only the listening socket is opened before forking, MongoClient is not fork safe.
+        listen_socket = listen(("0.0.0.0", int(os.getenv("SERVER_PORT", "8080"))),
+                               config.SERVER_BACKLOG)
+        Supervisor(
+            num_workers=config.SERVER_PROCESSES,
+            worker=lambda: serve(listen_socket),
+            shutdown_timeout=config.SERVER_SHUTDOWN_TIMEOUT,
+        ).run()
+    else:
+        serve()
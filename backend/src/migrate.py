@@ -0,0 +1,25 @@
+import logging
+import os
+
+from pymongo import MongoClient
+
+import config
+from db.mongo import create_indexes, migrate_url_keys, migrate_words_lists
+
+logging.basicConfig(level=logging.INFO)
+
+
+if __name__ == "__main__":
+    logging.info("Initiating MongoDb client")
+    mongo_client_url = os.getenv(
+        "MONGO_CLIENT_ENDPOINT", "mongodb://localhost:27017/")
+    mongo_client = MongoClient(mongo_client_url)
+
+    logging.info("Migrating words lists to compact encoded words")
+    migrated = migrate_words_lists(mongo_client, config.WORDS_COMPRESSION)
+    logging.info(f"Migrated {migrated} count documents")
+
+    logging.info("Adding URL keys to count documents")
+    migrated = migrate_url_keys(mongo_client)
+    logging.info(f"Migrated {migrated} count documents")
+    create_indexes(mongo_client)
@@ -0,0 +1,16 @@
+import logging
+import sys
+
+from libs.replay import record_pages
+
+logging.basicConfig(level=logging.INFO)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        sys.exit("usage: pipenv run record <directory> <url> [<url> ...]")
+
+    directory, urls = sys.argv[1], sys.argv[2:]
+    logging.info(f"Recording {len(urls)} pages to {directory}")
+    recorded = record_pages(urls, directory)
+    logging.info(f"Recorded {recorded} pages, replay them with FETCH_REPLAY_DIR={directory}")
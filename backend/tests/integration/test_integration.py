@@ -39,6 +39,10 @@ def test_it_responds_with_reset_html():
         hx-swap="outerHTML" hx-include="[name='url']">
         Count
     </button>
+    <button hx-get="http://localhost:8080/count/crawl" hx-trigger="click" hx-target="#counts"
+        hx-swap="outerHTML" hx-include="[name='url']">
+        Crawl
+    </button>
 </form>""")
 
 
@@ -51,6 +55,10 @@ def test_it_responds_with_a_searched_count():
     <div>
         <div class="url-header">
             <h4>http://sample-1-html-server:8080 - 27</h4>
+            <button class="counts-button" hx-get="http://localhost:8080/count?url=http://sample-1-html-server:8080&recount=true" hx-trigger="click"
+                hx-target="#counts" hx-swap="outerHTML">
+                Recount
+            </button>
             <button class="counts-button" hx-get="http://localhost:8080/count?url=http://sample-1-html-server:8080&display=false" hx-trigger="click"
                 hx-target="#counts" hx-swap="outerHTML">
                 Close
@@ -110,6 +118,10 @@ def test_it_responds_with_multiple_searched_counts():
     <div>
         <div class="url-header">
             <h4>http://sample-1-html-server:8080 - 27</h4>
+            <button class="counts-button" hx-get="http://localhost:8080/count?url=http://sample-1-html-server:8080&recount=true" hx-trigger="click"
+                hx-target="#counts" hx-swap="outerHTML">
+                Recount
+            </button>
             <button class="counts-button" hx-get="http://localhost:8080/count?url=http://sample-1-html-server:8080&display=false" hx-trigger="click"
                 hx-target="#counts" hx-swap="outerHTML">
                 Close
@@ -160,6 +172,10 @@ def test_it_responds_with_multiple_searched_counts():
     <div>
         <div class="url-header">
             <h4>http://sample-2-html-server:8080 - 28</h4>
+            <button class="counts-button" hx-get="http://localhost:8080/count?url=http://sample-2-html-server:8080&recount=true" hx-trigger="click"
+                hx-target="#counts" hx-swap="outerHTML">
+                Recount
+            </button>
             <button class="counts-button" hx-get="http://localhost:8080/count?url=http://sample-2-html-server:8080&display=false" hx-trigger="click"
                 hx-target="#counts" hx-swap="outerHTML">
                 Close
@@ -222,6 +238,10 @@ def test_it_responds_with_updated_pagination():
     <div>
         <div class="url-header">
             <h4>http://sample-1-html-server:8080 - 27</h4>
+            <button class="counts-button" hx-get="http://localhost:8080/count?url=http://sample-1-html-server:8080&recount=true" hx-trigger="click"
+                hx-target="#counts" hx-swap="outerHTML">
+                Recount
+            </button>
             <button class="counts-button" hx-get="http://localhost:8080/count?url=http://sample-1-html-server:8080&display=false" hx-trigger="click"
                 hx-target="#counts" hx-swap="outerHTML">
                 Close
@@ -283,6 +303,10 @@ def test_it_responds_with_updated_display():
     <div>
         <div class="url-header">
             <h4>http://sample-1-html-server:8080 - 27</h4>
+            <button class="counts-button" hx-get="http://localhost:8080/count?url=http://sample-1-html-server:8080&recount=true" hx-trigger="click"
+                hx-target="#counts" hx-swap="outerHTML">
+                Recount
+            </button>
             <button class="counts-button" hx-get="http://localhost:8080/count?url=http://sample-1-html-server:8080&display=true" hx-trigger="click"
                 hx-target="#counts" hx-swap="outerHTML">
                 Open
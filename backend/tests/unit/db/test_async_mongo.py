@@ -0,0 +1,239 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from db.async_mongo import (
+    add_new_count,
+    get_counts,
+    has_url_been_searched,
+    recount,
+    update_display,
+    update_page,
+)
+from db.encoding import decode_words
+from db.mongo import UrlError
+from libs.fetching import FetchBudget, FetchBudgetError
+from libs.metrics import metrics
+from libs.replay import AsyncReplayTransport
+
+PAGE = b"<html><body><p>sample sample text</p></body></html>"
+
+
+def make_client(count_doc=None):
+    mock_client = MagicMock()
+    mock_counts_collection = MagicMock()
+    mock_client.__getitem__.return_value = {
+        "counts_collection": mock_counts_collection
+    }
+    mock_counts_collection.find_one = AsyncMock(return_value=count_doc)
+    mock_counts_collection.insert_one = AsyncMock()
+    mock_counts_collection.update_one = AsyncMock()
+    mock_counts_collection.replace_one = AsyncMock()
+    return mock_client, mock_counts_collection
+
+
+def make_transport(**kwargs):
+    return AsyncReplayTransport({
+        "https://example.com": {"body": PAGE, "headers": {"ETag": '"v1"'}},
+    }, **kwargs)
+
+
+def test_it_raises_has_url_been_searched_when_raise_if_found():
+    mock_client, _ = make_client({"_id": 1})
+
+    with pytest.raises(UrlError) as exc:
+        asyncio.run(has_url_been_searched("https://example.com", mock_client, True, False))
+
+    assert exc.value.message == "already searched for analysis of URL: https://example.com"
+    assert exc.value.code == 400
+
+
+def test_it_finds_a_searched_url_after_normalising_it():
+    mock_client, mock_counts_collection = make_client({"_id": 1})
+
+    with pytest.raises(UrlError):
+        asyncio.run(has_url_been_searched("HTTPS://Example.com:443/#top", mock_client, True, False))
+
+    mock_counts_collection.find_one.assert_awaited_once_with(
+        {"url_key": "https://example.com/"}, {"_id": 1})
+
+
+def test_it_raises_has_url_been_searched_when_raise_if_not_found():
+    mock_client, _ = make_client()
+
+    with pytest.raises(UrlError) as exc:
+        asyncio.run(has_url_been_searched("https://example.com", mock_client, False, True))
+
+    assert exc.value.message == "URL has not been analysed yet: https://example.com"
+    assert exc.value.code == 400
+
+
+def test_it_adds_new_count():
+    mock_client, mock_counts_collection = make_client()
+
+    asyncio.run(add_new_count("https://example.com", mock_client, make_transport()))
+
+    info = mock_counts_collection.insert_one.await_args.args[0]
+    assert info["url"] == "https://example.com"
+    assert info["word_count"] == 3
+    assert info["paginated_words_list"] == [["sample", 2], ["text", 1]]
+    assert info["etag"] == '"v1"'
+    assert decode_words(info) == [["sample", 2], ["text", 1]]
+
+
+def test_it_coalesces_concurrent_new_counts_of_the_same_url():
+    mock_client, mock_counts_collection = make_client()
+    transport = make_transport(latency=0.01)
+
+    async def main():
+        await asyncio.gather(
+            add_new_count("https://example.com", mock_client, transport),
+            add_new_count("https://EXAMPLE.com/#top", mock_client, transport),
+        )
+
+    asyncio.run(main())
+
+    mock_counts_collection.insert_one.assert_awaited_once()
+
+
+def test_it_raises_when_a_new_count_page_is_not_found():
+    mock_client, mock_counts_collection = make_client()
+
+    with pytest.raises(UrlError) as exc:
+        asyncio.run(add_new_count("https://example.com/missing", mock_client, make_transport()))
+
+    assert exc.value.code == 500
+    assert exc.value.message.startswith(
+        "error fetching HTML for URL: https://example.com/missing")
+    mock_counts_collection.insert_one.assert_not_awaited()
+
+
+def test_it_raises_a_gateway_timeout_when_the_fetch_times_out():
+    mock_client, _ = make_client()
+
+    with pytest.raises(UrlError) as exc:
+        asyncio.run(add_new_count("https://example.com", mock_client,
+                                  make_transport(latency=1),
+                                  budget=FetchBudget(read_timeout=0.01)))
+
+    assert exc.value.code == 504
+
+
+def test_it_raises_a_bad_gateway_when_the_page_is_too_large():
+    mock_client, mock_counts_collection = make_client()
+
+    with pytest.raises(UrlError) as exc:
+        asyncio.run(add_new_count("https://example.com", mock_client, make_transport(),
+                                  budget=FetchBudget(max_body_size=10)))
+
+    assert exc.value.code == 502
+    assert exc.value.message.startswith("error reading HTML for URL: https://example.com")
+    mock_counts_collection.insert_one.assert_not_awaited()
+
+
+@pytest.mark.parametrize("reason, code", [("max_body_size", 502), ("deadline", 504)])
+def test_it_maps_fetch_budget_errors_like_the_threaded_server(reason, code):
+    mock_client, _ = make_client()
+
+    with patch("db.async_mongo.read_body", side_effect=FetchBudgetError("limit hit", reason)):
+        with pytest.raises(UrlError) as exc:
+            asyncio.run(add_new_count("https://example.com", mock_client, make_transport()))
+
+    assert exc.value.code == code
+
+
+def test_it_keeps_the_stored_count_when_a_recount_is_not_modified():
+    metrics.reset()
+    mock_client, mock_counts_collection = make_client({"display": False, "etag": '"v1"'})
+
+    outcome = asyncio.run(recount("https://example.com", mock_client, make_transport()))
+
+    assert outcome == "revalidated"
+    mock_counts_collection.update_one.assert_awaited_once_with(
+        {"url_key": "https://example.com/"},
+        {"$set": {"etag": '"v1"', "fetch_outcome": "revalidated"}})
+    assert metrics.snapshot()["revalidation.revalidated"] == 1
+
+
+def test_it_recounts_a_changed_page():
+    mock_client, mock_counts_collection = make_client({"display": False, "etag": '"v0"'})
+
+    outcome = asyncio.run(recount("https://example.com", mock_client, make_transport()))
+
+    assert outcome == "refetched"
+    info = mock_counts_collection.replace_one.await_args.args[1]
+    assert info["word_count"] == 3
+    assert info["display"] is False
+    assert info["fetch_outcome"] == "refetched"
+
+
+def test_it_raises_when_recounting_a_crawled_site():
+    mock_client, mock_counts_collection = make_client({"display": True, "crawled_pages": 2})
+
+    with pytest.raises(UrlError) as exc:
+        asyncio.run(recount("https://example.com", mock_client, make_transport()))
+
+    assert exc.value.code == 400
+    mock_counts_collection.replace_one.assert_not_awaited()
+
+
+def test_it_updates_page():
+    words_list = [(f"word{i}", 10 - i) for i in range(10)]
+    mock_client, mock_counts_collection = make_client({"words_list": words_list})
+
+    asyncio.run(update_page("https://example.com", 2, mock_client))
+
+    mock_counts_collection.update_one.assert_awaited_once_with(
+        {"url_key": "https://example.com/"},
+        {"$set": {"current_page": 2, "paginated_words_list": words_list[5:10]}})
+
+
+def test_it_updates_display():
+    mock_client, mock_counts_collection = make_client({"_id": 1})
+
+    asyncio.run(update_display("https://example.com", False, mock_client))
+
+    mock_counts_collection.update_one.assert_awaited_once_with(
+        {"url_key": "https://example.com/"}, {"$set": {"display": False}})
+
+
+def test_it_raises_when_the_url_is_removed_before_its_display_is_updated():
+    mock_client, mock_counts_collection = make_client({"_id": 1})
+    mock_counts_collection.update_one.return_value.matched_count = 0
+
+    with pytest.raises(UrlError) as exc:
+        asyncio.run(update_display("https://example.com", False, mock_client))
+
+    assert exc.value.message == "URL has not been analysed yet: https://example.com"
+    assert exc.value.code == 400
+
+
+def test_it_raises_when_the_url_is_removed_before_it_is_recounted():
+    mock_client, mock_counts_collection = make_client()
+    mock_counts_collection.find_one.side_effect = [{"_id": 1}, None]
+
+    with pytest.raises(UrlError) as exc:
+        asyncio.run(recount("https://example.com", mock_client, make_transport()))
+
+    assert exc.value.message == "URL has not been analysed yet: https://example.com"
+    assert exc.value.code == 400
+
+
+def test_it_gets_counts():
+    mock_client, mock_counts_collection = make_client()
+    mock_counts_collection.find.return_value.to_list = AsyncMock(
+        return_value=[{"url": "https://example.com"}])
+
+    assert asyncio.run(get_counts(mock_client)) == [{"url": "https://example.com"}]
+
+
+def test_it_raises_when_an_error_arises_getting_counts():
+    mock_client, mock_counts_collection = make_client()
+    mock_counts_collection.find.side_effect = Exception("find error")
+
+    with pytest.raises(UrlError) as exc:
+        asyncio.run(get_counts(mock_client))
+
+    assert exc.value.message == "error getting all counts, err: find error"
+    assert exc.value.code == 500
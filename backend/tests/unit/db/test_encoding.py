@@ -0,0 +1,64 @@
+import random
+
+import pytest
+
+from db.encoding import (
+    decode_words,
+    decode_words_list,
+    decode_words_page,
+    encode_words,
+    encode_words_list,
+)
+from libs.ranking import RankedWords
+
+
+@pytest.fixture
+def counts():
+    rng = random.Random(0)
+    return {f"word{i}": rng.randint(1, 20) for i in range(100)}
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_it_encodes_and_decodes_words(counts, compress):
+    count_doc = encode_words(counts.keys(), counts.values(), compress)
+
+    assert count_doc["words_compression"] == ("zlib" if compress else None)
+    assert decode_words(count_doc) == [list(item) for item in counts.items()]
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_it_decodes_a_page_of_ranked_words(counts, compress):
+    ranked_words = list(RankedWords(counts))
+    count_doc = encode_words((word for word, _ in ranked_words),
+                             (count for _, count in ranked_words), compress)
+
+    assert decode_words_page(count_doc, 10, 15) == ranked_words[10:15]
+    assert decode_words_page(count_doc, 95, 100) == ranked_words[95:100]
+    assert decode_words_page(count_doc, 100, 105) == []
+
+
+def test_it_decodes_a_page_of_unranked_words(counts):
+    count_doc = encode_words(counts.keys(), counts.values())
+
+    assert decode_words_page(
+        count_doc, 10, 15, is_ranked=False) == RankedWords(counts)[10:15]
+
+
+def test_it_encodes_no_words():
+    count_doc = encode_words([], [])
+
+    assert decode_words(count_doc) == []
+    assert decode_words_page(count_doc, 0, 5) == []
+    assert decode_words_page(count_doc, 0, 5, is_ranked=False) == []
+
+
+def test_it_encodes_partly_ranked_words_lists_unranked(counts):
+    ranked_words = RankedWords(counts)
+    first_page = ranked_words[0:5]
+
+    count_doc = encode_words_list(ranked_words)
+
+    assert count_doc["words_list_is_ranked"] is False
+    assert decode_words_list(count_doc)[0:5] == first_page
+    assert list(decode_words_list(count_doc)) == list(RankedWords(counts))
+    assert "words_list_is_ranked" not in encode_words_list(list(ranked_words))
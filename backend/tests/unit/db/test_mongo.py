@@ -1,16 +1,41 @@
+import io
+import time
+import urllib.error
 import urllib.request
-from unittest.mock import Mock, patch
+from unittest.mock import patch
 
 import pytest
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 
+from db.encoding import decode_words, encode_words
 from db.mongo import (
     UrlError,
     add_new_count,
+    add_new_counts,
+    crawl_site,
     get_counts,
     update_page,
     update_display,
+    create_indexes,
     has_url_been_searched,
+    migrate_url_keys,
+    migrate_words_lists,
+    recount,
 )
+from db.parse_cache import ParseCache
+from libs.counting import Parser, count_information
+from libs.fetching import ACCEPT_ENCODING, FetchBudget
+from libs.metrics import metrics
+from libs.pooling import CountingPoolFullError
+from libs.scanning import Scanner
+
+
+def make_response(body, status=200, headers=None):
+    response = io.BytesIO(body)
+    response.status = status
+    response.headers = headers or {}
+    return response
 
 
 def test_it_raises_has_url_been_searched_when_raise_if_found():
@@ -20,8 +45,7 @@ def test_it_raises_has_url_been_searched_when_raise_if_found():
     mock_client.__getitem__.return_value = {
         "counts_collection": mock_counts_collection
     }
-    mock_counts_collection.find.return_value = [
-        {"url": "https://example.com"}]
+    mock_counts_collection.find_one.return_value = {"_id": 1}
 
     url = "https://example.com"
 
@@ -35,6 +59,22 @@ def test_it_raises_has_url_been_searched_when_raise_if_found():
     assert isinstance(exc.value, UrlError)
 
 
+def test_it_finds_a_searched_url_after_normalising_it():
+    from unittest.mock import MagicMock
+    mock_client = MagicMock()
+    mock_counts_collection = MagicMock()
+    mock_client.__getitem__.return_value = {
+        "counts_collection": mock_counts_collection
+    }
+    mock_counts_collection.find_one.return_value = {"_id": 1}
+
+    with pytest.raises(UrlError):
+        has_url_been_searched("HTTPS://Example.com:443/#top", mock_client, True, False)
+
+    mock_counts_collection.find_one.assert_called_once_with(
+        {"url_key": "https://example.com/"}, {"_id": 1})
+
+
 def test_it_raises_has_url_been_searched_when_raise_if_not_found():
     from unittest.mock import MagicMock
     mock_client = MagicMock()
@@ -42,7 +82,7 @@ def test_it_raises_has_url_been_searched_when_raise_if_not_found():
     mock_client.__getitem__.return_value = {
         "counts_collection": mock_counts_collection
     }
-    mock_counts_collection.find.return_value = []
+    mock_counts_collection.find_one.return_value = None
 
     url = "https://example.com"
 
@@ -63,7 +103,7 @@ def test_it_raises_when_an_error_arises_getting_searched_urls():
     mock_client.__getitem__.return_value = {
         "counts_collection": mock_counts_collection
     }
-    mock_counts_collection.find.side_effect = Exception("mongo error")
+    mock_counts_collection.find_one.side_effect = Exception("mongo error")
 
     url = "https://example.com"
 
@@ -84,9 +124,7 @@ def test_it_raises_when_a_url_has_already_been_counted():
     mock_client.__getitem__.return_value = {
         "counts_collection": mock_counts_collection
     }
-    mock_counts_collection.find.return_value = [
-        {"url": "https://example.com", "id": 0},
-    ]
+    mock_counts_collection.find_one.return_value = {"_id": 1}
 
     url = "https://example.com"
 
@@ -107,7 +145,7 @@ def test_it_raises_when_error_searching_url():
     mock_client.__getitem__.return_value = {
         "counts_collection": mock_counts_collection
     }
-    mock_counts_collection.find.return_value = []
+    mock_counts_collection.find_one.return_value = None
 
     url = "https://example.com"
 
@@ -129,13 +167,12 @@ def test_it_raises_when_error_inserting_new_count():
     mock_client.__getitem__.return_value = {
         "counts_collection": mock_counts_collection
     }
-    mock_counts_collection.find.return_value = []
+    mock_counts_collection.find_one.return_value = None
     mock_counts_collection.insert_one.side_effect = Exception("mongo error")
 
     url = "https://example.com"
 
-    mock_response = Mock()
-    mock_response.read = lambda: b"mock HTML"
+    mock_response = make_response(b"mock HTML")
 
     with patch("urllib.request.urlopen", return_value=mock_response):
         with patch("db.mongo.count_information", return_value={
@@ -161,13 +198,12 @@ def test_it_adds_new_count():
     mock_client.__getitem__.return_value = {
         "counts_collection": mock_counts_collection
     }
-    mock_counts_collection.find.return_value = []
+    mock_counts_collection.find_one.return_value = None
     mock_counts_collection.insert_one.return_value = None
 
     url = "https://example.com"
 
-    mock_response = Mock()
-    mock_response.read = lambda: b"mock HTML"
+    mock_response = make_response(b"mock HTML")
 
     with patch("urllib.request.urlopen", return_value=mock_response):
         with patch("db.mongo.count_information", return_value={
@@ -179,6 +215,7 @@ def test_it_adds_new_count():
             add_new_count(url, mock_client)
             mock_counts_collection.insert_one.assert_called_once_with({
                 "url": url,
+                "url_key": "https://example.com/",
                 "current_page": 1,
                 "display": True,
                 "word_count": 6,
@@ -186,12 +223,409 @@ def test_it_adds_new_count():
                 "paginated_words_list": [
                     ['sample', 6],
                 ],
-                "words_list": [
-                    ['sample', 6],
-                ],
+                "words_blob": b"sample",
+                "counts_blob": b"\x06\x00\x00\x00",
+                "words_compression": None,
             })
 
 
+def test_it_adds_new_count_through_a_fetch_client():
+    from unittest.mock import MagicMock
+    mock_client = MagicMock()
+    mock_counts_collection = MagicMock()
+    mock_client.__getitem__.return_value = {
+        "counts_collection": mock_counts_collection
+    }
+    mock_counts_collection.find_one.return_value = None
+    mock_fetch_client = MagicMock()
+    mock_fetch_client.open.return_value = make_response(
+        b"<body><p>sample text</p></body>")
+
+    url = "https://example.com"
+
+    with patch("urllib.request.urlopen") as mock_urlopen:
+        add_new_count(url, mock_client, fetch_client=mock_fetch_client)
+
+    mock_fetch_client.open.assert_called_once()
+    assert mock_fetch_client.open.call_args.args[:2] == (
+        url, {"Accept-Encoding": ACCEPT_ENCODING})
+    mock_urlopen.assert_not_called()
+    assert mock_counts_collection.insert_one.call_args.args[0]["word_count"] == 2
+
+
+def test_it_coalesces_concurrent_new_counts_of_the_same_url():
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from unittest.mock import MagicMock
+    mock_client = MagicMock()
+    mock_counts_collection = MagicMock()
+    mock_client.__getitem__.return_value = {
+        "counts_collection": mock_counts_collection
+    }
+    mock_counts_collection.find_one.return_value = None
+    release = threading.Event()
+
+    def urlopen(url, **kwargs):
+        release.wait()
+        return make_response(b"<body><p>sample</p></body>")
+
+    metrics.reset()
+    urls = ["https://example.com", "https://EXAMPLE.com/", "https://example.com#top"]
+    with patch("urllib.request.urlopen", side_effect=urlopen) as mock_urlopen:
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = [executor.submit(add_new_count, url, mock_client) for url in urls]
+            while metrics.snapshot().get("single_flight.coalesced", 0) < 2:
+                threading.Event().wait(0.001)
+            release.set()
+        for future in futures:
+            future.result()
+
+    mock_urlopen.assert_called_once()
+    mock_counts_collection.insert_one.assert_called_once()
+
+
+def test_it_adds_new_counts():
+    from unittest.mock import MagicMock
+    mock_client = MagicMock()
+    mock_counts_collection = MagicMock()
+    mock_client.__getitem__.return_value = {
+        "counts_collection": mock_counts_collection
+    }
+    mock_counts_collection.find_one.side_effect = lambda filter, projection: (
+        {"_id": 1} if filter == {"url_key": "https://example.com/old"} else None)
+    pages = {
+        "https://example.com/a": b"<body><p>sample</p></body>",
+        "https://example.com/b": b"<body><p>sample text</p></body>",
+    }
+
+    def urlopen(request, **kwargs):
+        return make_response(pages[request.full_url])
+
+    urls = ["https://example.com/a", "https://example.com/old",
+            "https://example.com/b", "https://EXAMPLE.com/a#top"]
+    with patch("urllib.request.urlopen", side_effect=urlopen) as mock_urlopen:
+        errors = add_new_counts(urls, mock_client, max_concurrency=2)
+
+    assert errors == {
+        "https://example.com/old": "already searched for analysis of URL: https://example.com/old",
+    }
+    assert mock_urlopen.call_count == 2
+    mock_counts_collection.insert_one.assert_not_called()
+    mock_counts_collection.insert_many.assert_called_once()
+    assert mock_counts_collection.insert_many.call_args.kwargs == {"ordered": False}
+    docs = sorted(mock_counts_collection.insert_many.call_args.args[0],
+                  key=lambda doc: doc["url"])
+    assert [(doc["url"], doc["word_count"]) for doc in docs] == [
+        ("https://example.com/a", 1),
+        ("https://example.com/b", 2),
+    ]
+
+
+def test_it_reports_errors_inline_when_adding_new_counts():
+    from unittest.mock import MagicMock
+    mock_client = MagicMock()
+    mock_counts_collection = MagicMock()
+    mock_client.__getitem__.return_value = {
+        "counts_collection": mock_counts_collection
+    }
+    mock_counts_collection.find_one.return_value = None
+
+    def insert_many(infos, ordered):
+        index_of = {info["url"]: index for index, info in enumerate(infos)}
+        raise BulkWriteError({"writeErrors": [
+            {"index": index_of["https://example.com/b"], "code": 11000,
+             "errmsg": "E11000 duplicate key error"},
+            {"index": index_of["https://example.com/c"], "code": 2,
+             "errmsg": "bad value"},
+        ]})
+
+    mock_counts_collection.insert_many.side_effect = insert_many
+
+    def urlopen(request, **kwargs):
+        if request.full_url.endswith("missing"):
+            raise urllib.error.HTTPError(request.full_url, 404, "Not Found", {}, None)
+        return make_response(b"<body><p>sample</p></body>")
+
+    urls = ["https://example.com/a", "https://example.com/missing", "https://example.com/b",
+            "https://example.com/c"]
+    with patch("urllib.request.urlopen", side_effect=urlopen):
+        errors = add_new_counts(urls, mock_client)
+
+    assert list(errors) == ["https://example.com/missing", "https://example.com/b",
+                            "https://example.com/c"]
+    assert errors["https://example.com/missing"].startswith(
+        "error fetching HTML for URL: https://example.com/missing")
+    assert errors["https://example.com/b"] == (
+        "already searched for analysis of URL: https://example.com/b")
+    assert errors["https://example.com/c"] == (
+        "error inserting data for URL: https://example.com/c, err: bad value")
+
+
+def test_it_coalesces_a_batch_with_a_concurrent_count_of_the_same_url():
+    import threading
+    from unittest.mock import MagicMock
+    mock_client = MagicMock()
+    mock_counts_collection = MagicMock()
+    mock_client.__getitem__.return_value = {
+        "counts_collection": mock_counts_collection
+    }
+    mock_counts_collection.find_one.return_value = None
+    fetching = threading.Event()
+    release = threading.Event()
+    metrics.reset()
+
+    def urlopen(request, **kwargs):
+        fetching.set()
+        release.wait(5)
+        return make_response(b"<body><p>sample</p></body>")
+
+    with patch("urllib.request.urlopen", side_effect=urlopen) as mock_urlopen:
+        thread = threading.Thread(target=add_new_count, args=("https://example.com/a", mock_client))
+        thread.start()
+        assert fetching.wait(5)
+        batch = threading.Thread(target=add_new_counts,
+                                 args=(["https://example.com/a#top"], mock_client))
+        batch.start()
+        # The batch joins the count in flight rather than fetching the page again.
+        for _ in range(500):
+            if metrics.snapshot().get("single_flight.coalesced"):
+                break
+            time.sleep(0.01)
+        release.set()
+        thread.join(5)
+        batch.join(5)
+
+    mock_urlopen.assert_called_once()
+    mock_counts_collection.insert_one.assert_called_once()
+    mock_counts_collection.insert_many.assert_not_called()
+
+
+def test_it_crawls_same_origin_links_into_site_and_page_counts():
+    from unittest.mock import MagicMock
+    mock_client = MagicMock()
+    mock_counts_collection = MagicMock()
+    mock_pages_collection = MagicMock()
+    mock_client.__getitem__.return_value = {
+        "counts_collection": mock_counts_collection,
+        "pages_collection": mock_pages_collection,
+    }
+    mock_counts_collection.find_one.return_value = None
+    pages = {
+        "https://example.com/": b"<body><p>home <a href='/a'>a</a> <a href='/b'>b</a>"
+                                b" <a href='https://other.com/x'>x</a> <a href='/a#top'>top</a>"
+                                b" <a href='mailto:me@example.com'>me</a></p></body>",
+        "https://example.com/a": b"<body><p><a href='/'>home</a> <a href='c'>c</a></p></body>",
+        "https://example.com/c": b"<body><p>too deep</p></body>",
+    }
+    fetched = []
+
+    def urlopen(request, **kwargs):
+        fetched.append(request.full_url)
+        if request.full_url not in pages:
+            raise urllib.error.HTTPError(request.full_url, 404, "Not Found", {}, None)
+        return make_response(pages[request.full_url])
+
+    with patch("urllib.request.urlopen", side_effect=urlopen):
+        errors = crawl_site("https://example.com/", mock_client, max_depth=1, max_pages=10)
+
+    assert sorted(fetched) == ["https://example.com/", "https://example.com/a", "https://example.com/b"]
+    assert list(errors) == ["https://example.com/b"]
+
+    page_docs = mock_pages_collection.insert_many.call_args.args[0]
+    assert [(doc["site"], doc["url"], doc["depth"], doc["word_count"]) for doc in page_docs] == [
+        ("https://example.com/", "https://example.com/", 0, 6),
+        ("https://example.com/", "https://example.com/a", 1, 2),
+    ]
+    assert all("links" not in doc for doc in page_docs)
+
+    site_doc = mock_counts_collection.insert_one.call_args.args[0]
+    assert site_doc["url"] == "https://example.com/"
+    assert site_doc["word_count"] == 8
+    assert site_doc["crawled_pages"] == 2
+    assert site_doc["paginated_words_list"][0] == ["home", 2]
+
+
+def test_it_stops_crawling_at_the_page_limit():
+    from unittest.mock import MagicMock
+    mock_client = MagicMock()
+    mock_counts_collection = MagicMock()
+    mock_pages_collection = MagicMock()
+    mock_client.__getitem__.return_value = {
+        "counts_collection": mock_counts_collection,
+        "pages_collection": mock_pages_collection,
+    }
+    mock_counts_collection.find_one.return_value = None
+    links = "".join(f"<a href='/{i}'>{i}</a>" for i in range(10))
+
+    with patch("urllib.request.urlopen",
+               side_effect=lambda request, **kwargs: make_response(
+                   f"<body><p>{links}</p></body>".encode())) as mock_urlopen:
+        crawl_site("https://example.com/", mock_client, max_depth=3, max_pages=4)
+
+    assert mock_urlopen.call_count == 4
+    assert mock_counts_collection.insert_one.call_args.args[0]["crawled_pages"] == 4
+
+
+def test_it_raises_when_the_first_page_of_a_crawl_fails():
+    from unittest.mock import MagicMock
+    mock_client = MagicMock()
+    mock_counts_collection = MagicMock()
+    mock_client.__getitem__.return_value = {
+        "counts_collection": mock_counts_collection
+    }
+    mock_counts_collection.find_one.return_value = None
+    not_found = urllib.error.HTTPError("https://example.com/", 404, "Not Found", {}, None)
+
+    with patch("urllib.request.urlopen", side_effect=not_found):
+        with pytest.raises(UrlError) as exc:
+            crawl_site("https://example.com/", mock_client)
+
+    assert exc.value.message.startswith("error fetching HTML for URL: https://example.com/")
+    mock_counts_collection.insert_one.assert_not_called()
+
+
+def test_it_adds_new_approximate_count():
+    from unittest.mock import MagicMock
+    mock_client = MagicMock()
+    mock_counts_collection = MagicMock()
+    mock_client.__getitem__.return_value = {
+        "counts_collection": mock_counts_collection
+    }
+    mock_counts_collection.find_one.return_value = None
+
+    url = "https://example.com"
+
+    mock_response = make_response(
+        b"<body><p>sample sample sample text html</p></body>")
+
+    with patch("urllib.request.urlopen", return_value=mock_response):
+        add_new_count(url, mock_client, max_words=1)
+
+    info = mock_counts_collection.insert_one.call_args.args[0]
+    assert info["word_count"] == 5
+    assert info["is_approximate"] is True
+    assert info["max_count_error"] == 1
+    assert info["paginated_words_list"] == [["sample", 2]]
+
+
+def test_it_raises_when_error_reading_html():
+    from unittest.mock import MagicMock
+    mock_client = MagicMock()
+    mock_counts_collection = MagicMock()
+    mock_client.__getitem__.return_value = {
+        "counts_collection": mock_counts_collection
+    }
+    mock_counts_collection.find_one.return_value = None
+
+    url = "https://example.com"
+
+    mock_response = MagicMock(headers={})
+    mock_response.read1.side_effect = ConnectionResetError("connection reset")
+
+    with patch("urllib.request.urlopen", return_value=mock_response):
+        with pytest.raises(UrlError) as exc:
+            add_new_count(url, mock_client)
+
+    assert str(
+        exc.value.message) == "error reading HTML for URL: https://example.com, err: connection reset"
+    assert exc.value.code == 500
+
+    mock_counts_collection.insert_one.assert_not_called()
+
+
+def test_it_raises_when_the_page_has_a_corrupt_encoding():
+    from unittest.mock import MagicMock
+    mock_client = MagicMock()
+    mock_counts_collection = MagicMock()
+    mock_client.__getitem__.return_value = {
+        "counts_collection": mock_counts_collection
+    }
+    mock_counts_collection.find_one.return_value = None
+
+    mock_response = make_response(b"not gzip", headers={"Content-Encoding": "gzip"})
+    with patch("urllib.request.urlopen", return_value=mock_response):
+        with pytest.raises(UrlError) as exc:
+            add_new_count("https://example.com", mock_client)
+
+    assert exc.value.message.startswith(
+        "error reading HTML for URL: https://example.com, err: invalid gzip body")
+    assert exc.value.code == 502
+    mock_counts_collection.insert_one.assert_not_called()
+
+
+def test_it_adds_new_count_from_a_streamed_page():
+    from unittest.mock import MagicMock
+    mock_client = MagicMock()
+    mock_counts_collection = MagicMock()
+    mock_client.__getitem__.return_value = {
+        "counts_collection": mock_counts_collection
+    }
+    mock_counts_collection.find_one.return_value = None
+
+    url = "https://example.com"
+
+    mock_response = make_response(
+        "<html><body><p>Café words, streamed words.</p></body></html>".encode("utf-8"))
+
+    with patch("urllib.request.urlopen", return_value=mock_response):
+        with patch("db.mongo.CHUNK_SIZE", 3):
+            add_new_count(url, mock_client)
+
+    inserted = mock_counts_collection.insert_one.call_args.args[0]
+    assert inserted["word_count"] == 3
+    assert decode_words(inserted) == [['words', 2], ['streamed', 1]]
+
+
+def test_it_adds_new_count_with_only_the_first_page_ranked():
+    from unittest.mock import MagicMock
+    mock_client = MagicMock()
+    mock_counts_collection = MagicMock()
+    mock_client.__getitem__.return_value = {
+        "counts_collection": mock_counts_collection
+    }
+    mock_counts_collection.find_one.return_value = None
+
+    url = "https://example.com"
+
+    words = " ".join(f"w{i} " * (i % 3 + 1) for i in range(100))
+    mock_response = make_response(f"<body><p>{words}</p></body>".encode("utf-8"))
+
+    with patch("urllib.request.urlopen", return_value=mock_response):
+        add_new_count(url, mock_client)
+
+    inserted = mock_counts_collection.insert_one.call_args.args[0]
+    assert inserted["num_pages"] == 20
+    assert inserted["paginated_words_list"] == [
+        ['w2', 3], ['w5', 3], ['w8', 3], ['w11', 3], ['w14', 3]]
+    assert inserted["words_list_is_ranked"] is False
+    assert decode_words(inserted)[0:3] == [['w0', 1], ['w1', 2], ['w2', 3]]
+
+
+def test_it_raises_when_the_counting_pool_is_full():
+    from unittest.mock import MagicMock
+    mock_client = MagicMock()
+    mock_counts_collection = MagicMock()
+    mock_client.__getitem__.return_value = {
+        "counts_collection": mock_counts_collection
+    }
+    mock_counts_collection.find_one.return_value = None
+    mock_counting_pool = MagicMock()
+    mock_counting_pool.count.side_effect = CountingPoolFullError(
+        "counting pool is full")
+
+    url = "https://example.com"
+
+    with patch("urllib.request.urlopen", return_value=make_response(b"mock HTML")):
+        with pytest.raises(UrlError) as exc:
+            add_new_count(url, mock_client, counting_pool=mock_counting_pool)
+
+    assert str(
+        exc.value.message) == "error counting HTML for URL: https://example.com, err: counting pool is full"
+    assert exc.value.code == 503
+
+    mock_counts_collection.insert_one.assert_not_called()
+
+
 def test_it_raises_when_url_has_not_been_searched_for_pagination():
     from unittest.mock import MagicMock
     mock_client = MagicMock()
@@ -199,7 +633,7 @@ def test_it_raises_when_url_has_not_been_searched_for_pagination():
     mock_client.__getitem__.return_value = {
         "counts_collection": mock_counts_collection
     }
-    mock_counts_collection.find.return_value = []
+    mock_counts_collection.find_one.return_value = None
 
     url = "https://example.com"
 
@@ -220,8 +654,7 @@ def test_it_raises_when_error_getting_words_list_for_doc_to_update():
     mock_client.__getitem__.return_value = {
         "counts_collection": mock_counts_collection
     }
-    mock_counts_collection.find.return_value = [{"url": "https://example.com"}]
-    mock_counts_collection.find_one.side_effect = Exception("mongo error")
+    mock_counts_collection.find_one.side_effect = [{"_id": 1}, Exception("mongo error")]
 
     url = "https://example.com"
     new_page = 2
@@ -243,7 +676,6 @@ def test_it_raises_when_error_updating_a_page():
     mock_client.__getitem__.return_value = {
         "counts_collection": mock_counts_collection
     }
-    mock_counts_collection.find.return_value = [{"url": "https://example.com"}]
     mock_counts_collection.find_one.return_value = {"words_list": [
         ["one", 5],
         ["two", 10],
@@ -274,7 +706,6 @@ def test_it_updates_a_page():
     mock_client.__getitem__.return_value = {
         "counts_collection": mock_counts_collection
     }
-    mock_counts_collection.find.return_value = [{"url": "https://example.com"}]
     mock_counts_collection.find_one.return_value = {
         "words_list": [
             ["one", 5],
@@ -293,12 +724,67 @@ def test_it_updates_a_page():
     update_page(url, new_page, mock_client)
 
     mock_counts_collection.update_one.assert_called_once_with(
-        {"url": url},
+        {"url_key": "https://example.com/"},
         {"$set": {"current_page": new_page,
                   "paginated_words_list": [["six", 10]]}}
     )
 
 
+def test_it_updates_a_page_of_unranked_words():
+    from unittest.mock import MagicMock
+    mock_client = MagicMock()
+    mock_counts_collection = MagicMock()
+    mock_client.__getitem__.return_value = {
+        "counts_collection": mock_counts_collection
+    }
+    mock_counts_collection.find_one.return_value = {
+        "words_list": [
+            ["one", 5],
+            ["two", 10],
+            ["three", 5],
+            ["four", 10],
+            ["five", 5],
+            ["six", 10],
+        ],
+        "words_list_is_ranked": False,
+    }
+    mock_counts_collection.update_one.return_value = None
+
+    url = "https://example.com"
+    new_page = 2
+
+    update_page(url, new_page, mock_client)
+
+    mock_counts_collection.update_one.assert_called_once_with(
+        {"url_key": "https://example.com/"},
+        {"$set": {"current_page": new_page,
+                  "paginated_words_list": [["five", 5]]}}
+    )
+
+
+def test_it_updates_a_page_of_encoded_words():
+    from unittest.mock import MagicMock
+    mock_client = MagicMock()
+    mock_counts_collection = MagicMock()
+    mock_client.__getitem__.return_value = {
+        "counts_collection": mock_counts_collection
+    }
+    mock_counts_collection.find_one.return_value = encode_words(
+        ["one", "two", "three", "four", "five", "six"], [10, 10, 10, 5, 5, 5], True)
+    mock_counts_collection.update_one.return_value = None
+
+    url = "https://example.com"
+    new_page = 2
+
+    update_page(url, new_page, mock_client)
+
+    mock_counts_collection.update_one.assert_called_once_with(
+        {"url_key": "https://example.com/"},
+        {"$set": {"current_page": new_page,
+                  "paginated_words_list": [["six", 5]]}}
+    )
+
+
 def test_it_raises_when_url_has_not_been_searched_for_display():
     from unittest.mock import MagicMock
     mock_client = MagicMock()
@@ -306,7 +792,7 @@ def test_it_raises_when_url_has_not_been_searched_for_display():
     mock_client.__getitem__.return_value = {
         "counts_collection": mock_counts_collection
     }
-    mock_counts_collection.find.return_value = []
+    mock_counts_collection.find_one.return_value = None
 
     url = "https://example.com"
 
@@ -326,7 +812,6 @@ def test_it_raises_when_error_updating_display():
     mock_client.__getitem__.return_value = {
         "counts_collection": mock_counts_collection
     }
-    mock_counts_collection.find.return_value = [{"url": "https://example.com"}]
     mock_counts_collection.update_one.side_effect = Exception("mongo error")
 
     url = "https://example.com"
@@ -349,8 +834,6 @@ def test_it_updates_a_display():
     mock_client.__getitem__.return_value = {
         "counts_collection": mock_counts_collection
     }
-    mock_counts_collection.find.return_value = [{"url": "https://example.com"}]
-    mock_counts_collection.update_one.return_value = None
 
     url = "https://example.com"
     new_display = True
@@ -358,11 +841,27 @@ def test_it_updates_a_display():
     update_display(url, new_display, mock_client)
 
     mock_counts_collection.update_one.assert_called_once_with(
-        {"url": url},
+        {"url_key": "https://example.com/"},
         {"$set": {"display": True}},
     )
 
 
+def test_it_raises_when_the_url_is_removed_before_its_display_is_updated():
+    from unittest.mock import MagicMock
+    mock_client = MagicMock()
+    mock_counts_collection = MagicMock()
+    mock_client.__getitem__.return_value = {
+        "counts_collection": mock_counts_collection
+    }
+    mock_counts_collection.update_one.return_value.matched_count = 0
+
+    with pytest.raises(UrlError) as exc:
+        update_display("https://example.com", True, mock_client)
+
+    assert exc.value.message == "URL has not been analysed yet: https://example.com"
+    assert exc.value.code == 400
+
+
 def test_it_raises_when_error_getting_all_counts():
     from unittest.mock import MagicMock
     mock_client = MagicMock()
@@ -403,3 +902,340 @@ def test_it_gets_all_counts():
 
     mock_client["local_database"]["counts_collection"].find.assert_called_once(
     )
+
+
+def test_it_migrates_words_lists():
+    from unittest.mock import MagicMock
+    mock_client = MagicMock()
+    mock_counts_collection = MagicMock()
+    mock_client.__getitem__.return_value = {
+        "counts_collection": mock_counts_collection
+    }
+    mock_counts_collection.find.return_value = [
+        {"_id": 1, "words_list": [["sample", 6], ["text", 4]]},
+        {"_id": 2, "words_list": []},
+    ]
+    mock_counts_collection.bulk_write.return_value.modified_count = 2
+
+    assert migrate_words_lists(mock_client) == 2
+
+    mock_counts_collection.find.assert_called_once_with(
+        {"words_list": {"$exists": True}},
+        {"words_list": 1},
+    )
+    mock_counts_collection.bulk_write.assert_called_once_with([
+        UpdateOne({"_id": 1}, {
+            "$set": encode_words(["sample", "text"], [6, 4]),
+            "$unset": {"words_list": ""},
+        }),
+        UpdateOne({"_id": 2}, {
+            "$set": encode_words([], []),
+            "$unset": {"words_list": ""},
+        }),
+    ])
+
+
+def test_it_migrates_url_keys():
+    from unittest.mock import MagicMock
+    mock_client = MagicMock()
+    mock_counts_collection = MagicMock()
+    mock_client.__getitem__.return_value = {
+        "counts_collection": mock_counts_collection
+    }
+    mock_counts_collection.find.return_value = [
+        {"_id": 1, "url": "HTTPS://Example.com:443"},
+    ]
+    mock_counts_collection.bulk_write.return_value.modified_count = 1
+
+    assert migrate_url_keys(mock_client) == 1
+
+    mock_counts_collection.find.assert_called_once_with(
+        {"url_key": {"$exists": False}}, {"url": 1})
+    mock_counts_collection.bulk_write.assert_called_once_with([
+        UpdateOne({"_id": 1}, {"$set": {"url_key": "https://example.com/"}}),
+    ])
+
+
+def test_it_creates_a_unique_url_key_index():
+    from unittest.mock import MagicMock
+    mock_client = MagicMock()
+    mock_counts_collection = MagicMock()
+    mock_client.__getitem__.return_value = {
+        "counts_collection": mock_counts_collection
+    }
+
+    create_indexes(mock_client)
+
+    mock_counts_collection.create_index.assert_called_once_with(
+        "url_key", unique=True, partialFilterExpression={"url_key": {"$type": "string"}})
+
+
+def test_it_raises_when_a_new_count_was_stored_by_another_process():
+    from unittest.mock import MagicMock
+    mock_client = MagicMock()
+    mock_counts_collection = MagicMock()
+    mock_client.__getitem__.return_value = {
+        "counts_collection": mock_counts_collection
+    }
+    mock_counts_collection.find_one.return_value = None
+    mock_counts_collection.insert_one.side_effect = DuplicateKeyError("E11000 duplicate key error")
+
+    with patch("urllib.request.urlopen", return_value=make_response(b"<body><p>x</p></body>")):
+        with pytest.raises(UrlError) as exc:
+            add_new_count("https://example.com", mock_client)
+
+    assert exc.value.message == "already searched for analysis of URL: https://example.com"
+    assert exc.value.code == 400
+
+
+def test_it_stores_validators_with_a_new_count():
+    from unittest.mock import MagicMock
+    mock_client = MagicMock()
+    mock_counts_collection = MagicMock()
+    mock_client.__getitem__.return_value = {
+        "counts_collection": mock_counts_collection
+    }
+    mock_counts_collection.find_one.return_value = None
+
+    mock_response = make_response(b"<body><p>sample</p></body>", headers={
+        "ETag": '"v1"',
+        "Last-Modified": "Wed, 01 Jan 2025 00:00:00 GMT",
+    })
+
+    with patch("urllib.request.urlopen", return_value=mock_response):
+        add_new_count("https://example.com", mock_client)
+
+    info = mock_counts_collection.insert_one.call_args.args[0]
+    assert info["etag"] == '"v1"'
+    assert info["last_modified"] == "Wed, 01 Jan 2025 00:00:00 GMT"
+
+
+def test_it_reuses_the_stored_count_when_revalidated():
+    from unittest.mock import MagicMock
+    mock_client = MagicMock()
+    mock_counts_collection = MagicMock()
+    mock_client.__getitem__.return_value = {
+        "counts_collection": mock_counts_collection
+    }
+    url = "https://example.com"
+    mock_counts_collection.find_one.return_value = {
+        "display": False,
+        "etag": '"v1"',
+        "last_modified": "Wed, 01 Jan 2025 00:00:00 GMT",
+    }
+    metrics.reset()
+
+    with patch("urllib.request.urlopen",
+               return_value=make_response(b"", 304, {"ETag": '"v1"'})) as mock_urlopen:
+        assert recount(url, mock_client) == "revalidated"
+
+    request = mock_urlopen.call_args.args[0]
+    assert request.get_header("If-none-match") == '"v1"'
+    assert request.get_header(
+        "If-modified-since") == "Wed, 01 Jan 2025 00:00:00 GMT"
+    mock_counts_collection.update_one.assert_called_once_with(
+        {"url_key": "https://example.com/"}, {"$set": {"etag": '"v1"', "fetch_outcome": "revalidated"}})
+    mock_counts_collection.replace_one.assert_not_called()
+    assert metrics.snapshot() == {"revalidation.revalidated": 1}
+
+
+def test_it_recounts_a_changed_page():
+    from unittest.mock import MagicMock
+    mock_client = MagicMock()
+    mock_counts_collection = MagicMock()
+    mock_client.__getitem__.return_value = {
+        "counts_collection": mock_counts_collection
+    }
+    url = "https://example.com"
+    mock_counts_collection.find_one.return_value = {
+        "display": False, "etag": '"v1"'}
+    metrics.reset()
+
+    mock_response = make_response(
+        b"<body><p>new text</p></body>", headers={"ETag": '"v2"'})
+    with patch("urllib.request.urlopen", return_value=mock_response):
+        assert recount(url, mock_client) == "refetched"
+
+    filter, info = mock_counts_collection.replace_one.call_args.args
+    assert filter == {"url_key": "https://example.com/"}
+    assert info["word_count"] == 2
+    assert info["display"] is False
+    assert info["etag"] == '"v2"'
+    assert info["fetch_outcome"] == "refetched"
+    assert metrics.snapshot()["revalidation.refetched"] == 1
+
+
+def test_it_recounts_a_url_spelt_differently_from_the_stored_one():
+    from unittest.mock import MagicMock
+    mock_client = MagicMock()
+    mock_counts_collection = MagicMock()
+    mock_client.__getitem__.return_value = {
+        "counts_collection": mock_counts_collection
+    }
+    mock_counts_collection.find_one.return_value = {"url": "https://example.com", "display": True}
+
+    with patch("urllib.request.urlopen",
+               return_value=make_response(b"<body><p>new text</p></body>")) as mock_urlopen:
+        assert recount("HTTPS://Example.com:443/#top", mock_client) == "refetched"
+
+    assert mock_urlopen.call_args.args[0].full_url == "https://example.com"
+    filter, info = mock_counts_collection.replace_one.call_args.args
+    assert filter == {"url_key": "https://example.com/"}
+    assert info["url"] == "https://example.com"
+
+
+def test_it_raises_when_the_url_is_removed_before_it_is_recounted():
+    from unittest.mock import MagicMock
+    mock_client = MagicMock()
+    mock_counts_collection = MagicMock()
+    mock_client.__getitem__.return_value = {
+        "counts_collection": mock_counts_collection
+    }
+    mock_counts_collection.find_one.side_effect = [{"_id": 1}, None]
+
+    with pytest.raises(UrlError) as exc:
+        recount("https://example.com", mock_client)
+
+    assert exc.value.message == "URL has not been analysed yet: https://example.com"
+    assert exc.value.code == 400
+
+
+def test_it_recounts_a_crawled_site_by_crawling_it_again():
+    from unittest.mock import MagicMock
+    mock_client = MagicMock()
+    mock_counts_collection = MagicMock()
+    mock_pages_collection = MagicMock()
+    mock_client.__getitem__.return_value = {
+        "counts_collection": mock_counts_collection,
+        "pages_collection": mock_pages_collection,
+    }
+    url = "https://example.com/"
+    mock_counts_collection.find_one.return_value = {"display": False, "crawled_pages": 2}
+    pages = {
+        "https://example.com/": b"<body><p>home <a href='/a'>a</a></p></body>",
+        "https://example.com/a": b"<body><p>page a</p></body>",
+    }
+    metrics.reset()
+
+    with patch("urllib.request.urlopen",
+               side_effect=lambda request, **kwargs: make_response(pages[request.full_url])):
+        assert recount(url, mock_client) == "refetched"
+
+    mock_pages_collection.delete_many.assert_called_once_with({"site": url})
+    page_docs = mock_pages_collection.insert_many.call_args.args[0]
+    assert [doc["url"] for doc in page_docs] == ["https://example.com/", "https://example.com/a"]
+    filter, info = mock_counts_collection.replace_one.call_args.args
+    assert filter == {"url_key": "https://example.com/"}
+    assert info["crawled_pages"] == 2
+    assert info["word_count"] == 4
+    assert info["display"] is False
+    assert info["fetch_outcome"] == "refetched"
+    assert metrics.snapshot()["revalidation.refetched"] == 1
+
+
+def test_it_only_parses_identical_pages_once():
+    from unittest.mock import MagicMock
+    mock_client = MagicMock()
+    mock_counts_collection = MagicMock()
+    mock_client.__getitem__.return_value = {
+        "counts_collection": mock_counts_collection
+    }
+    mock_counts_collection.find_one.return_value = None
+    parse_cache = ParseCache(max_entries=4, max_body_size=1024)
+    body = b"<body><p>sample text sample</p></body>"
+
+    with patch("db.mongo.count_information", wraps=count_information) as mock_count:
+        for url in ("https://example.com", "https://example.com/?mirror=1"):
+            with patch("urllib.request.urlopen", return_value=make_response(body)):
+                add_new_count(url, mock_client, parse_cache=parse_cache)
+
+    mock_count.assert_called_once()
+    first, second = (call.args[0]
+                     for call in mock_counts_collection.insert_one.call_args_list)
+    assert second["url"] == "https://example.com/?mirror=1"
+    assert second["word_count"] == first["word_count"] == 3
+    assert second["words_blob"] == first["words_blob"]
+
+
+def test_it_parses_identical_pages_again_with_another_engine():
+    from unittest.mock import MagicMock
+    mock_client = MagicMock()
+    mock_counts_collection = MagicMock()
+    mock_client.__getitem__.return_value = {
+        "counts_collection": mock_counts_collection
+    }
+    mock_counts_collection.find_one.return_value = None
+    parse_cache = ParseCache(max_entries=4, max_body_size=1024)
+    body = b"<body><p>sample text sample</p></body>"
+
+    with patch("db.mongo.count_information", wraps=count_information) as mock_count:
+        for url, engine in (("https://example.com", Parser),
+                            ("https://example.com/?mirror=1", Scanner)):
+            with patch("urllib.request.urlopen", return_value=make_response(body)):
+                add_new_count(url, mock_client, engine=engine, parse_cache=parse_cache)
+
+    assert [call.args[1] for call in mock_count.call_args_list] == [Parser, Scanner]
+
+
+def test_it_raises_when_reading_html_times_out():
+    from unittest.mock import MagicMock
+    mock_client = MagicMock()
+    mock_counts_collection = MagicMock()
+    mock_client.__getitem__.return_value = {
+        "counts_collection": mock_counts_collection
+    }
+    mock_counts_collection.find_one.return_value = None
+
+    mock_response = MagicMock(headers={})
+    mock_response.read1.side_effect = TimeoutError("timed out")
+
+    with patch("urllib.request.urlopen", return_value=mock_response) as mock_urlopen:
+        with pytest.raises(UrlError) as exc:
+            add_new_count("https://example.com", mock_client,
+                          budget=FetchBudget(read_timeout=5))
+
+    assert exc.value.message == "error reading HTML for URL: https://example.com, err: read timed out after 5 seconds"
+    assert exc.value.code == 504
+    assert mock_urlopen.call_args.kwargs == {"timeout": 5}
+    mock_counts_collection.insert_one.assert_not_called()
+
+
+def test_it_raises_when_the_page_is_too_large():
+    from unittest.mock import MagicMock
+    mock_client = MagicMock()
+    mock_counts_collection = MagicMock()
+    mock_client.__getitem__.return_value = {
+        "counts_collection": mock_counts_collection
+    }
+    mock_counts_collection.find_one.return_value = None
+
+    with patch("urllib.request.urlopen", return_value=make_response(b"x" * 100)):
+        with pytest.raises(UrlError) as exc:
+            add_new_count("https://example.com", mock_client,
+                          budget=FetchBudget(max_body_size=10))
+
+    assert exc.value.message == "error reading HTML for URL: https://example.com, err: response body is over 10 bytes"
+    assert exc.value.code == 502
+    mock_counts_collection.insert_one.assert_not_called()
+
+
+def test_it_adds_a_truncated_count_when_partial_counts_are_allowed():
+    from unittest.mock import MagicMock
+    mock_client = MagicMock()
+    mock_counts_collection = MagicMock()
+    mock_client.__getitem__.return_value = {
+        "counts_collection": mock_counts_collection
+    }
+    mock_counts_collection.find_one.return_value = None
+    parse_cache = ParseCache(max_entries=4, max_body_size=1024)
+    body = "<body><p>one two caf\u00e9 three four</p></body>".encode("utf-8")
+
+    with patch("urllib.request.urlopen", return_value=make_response(body)):
+        add_new_count("https://example.com", mock_client, parse_cache=parse_cache,
+                      budget=FetchBudget(max_body_size=21, allow_partial=True))
+
+    info = mock_counts_collection.insert_one.call_args.args[0]
+    assert info["word_count"] == 2
+    assert info["is_truncated"] is True
+    assert info["truncated_reason"] == "max_body_size"
+    assert parse_cache.get(parse_cache.read([body])[0]) is None
@@ -0,0 +1,99 @@
+from unittest.mock import MagicMock, patch
+
+from db.parse_cache import ParseCache
+from libs.counting import count_information
+from libs.metrics import metrics
+from libs.scanning import Scanner
+
+first_body = [b"<body><p>sample text ", b"sample</p></body>"]
+second_body = [b"<body><p>other words</p></body>"]
+
+
+def count(chunks):
+    return count_information(chunk.decode("utf-8") for chunk in chunks)
+
+
+def test_it_caches_count_information_by_body():
+    cache = ParseCache(max_entries=4, max_body_size=1024)
+    metrics.reset()
+
+    key, chunks = cache.read(iter(first_body))
+    assert cache.get(key) is None
+    count_info = count(chunks)
+    cache.put(key, count_info)
+
+    same_key, _ = cache.read([b"".join(first_body)])
+    other_key, _ = cache.read(second_body)
+    assert same_key == key
+    assert other_key != key
+    assert cache.get(same_key) == count_info
+    assert metrics.snapshot() == {"parse_cache.hit": 1, "parse_cache.miss": 1}
+
+
+def test_it_keys_by_tokenizer_version_engine_and_word_bound():
+    cache = ParseCache(max_entries=4, max_body_size=1024)
+
+    key, _ = cache.read(first_body)
+    scanner_key, _ = cache.read(first_body, engine=Scanner)
+    approximate_key, _ = cache.read(first_body, max_words=10)
+    with patch("db.parse_cache.TOKENIZER_VERSION", 999):
+        new_version_key, _ = cache.read(first_body)
+
+    assert len({key, scanner_key, approximate_key, new_version_key}) == 4
+
+
+def test_it_evicts_the_least_recently_used_result():
+    cache = ParseCache(max_entries=2, max_body_size=1024)
+    bodies = [[b"<body><p>one</p></body>"], [b"<body><p>two</p></body>"],
+              [b"<body><p>three</p></body>"]]
+    keys = [cache.read(body)[0] for body in bodies]
+
+    cache.put(keys[0], count(bodies[0]))
+    cache.put(keys[1], count(bodies[1]))
+    cache.get(keys[0])
+    cache.put(keys[2], count(bodies[2]))
+
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[2]) is not None
+
+
+def test_it_streams_bodies_over_the_size_limit_without_caching():
+    cache = ParseCache(max_entries=4, max_body_size=8)
+
+    key, chunks = cache.read(iter(first_body))
+
+    assert key is None
+    assert list(chunks) == first_body
+
+
+def test_it_shares_results_through_the_persistent_tier():
+    collection = MagicMock()
+    writer = ParseCache(max_entries=4, max_body_size=1024, collection=collection)
+    key, chunks = writer.read(first_body)
+    count_info = count(chunks)
+    writer.put(key, count_info)
+
+    filter, entry = collection.replace_one.call_args.args
+    assert filter == {"_id": key}
+    collection.find_one.return_value = dict(entry, _id=key)
+    metrics.reset()
+
+    reader = ParseCache(max_entries=4, max_body_size=1024, collection=collection)
+    cached = reader.get(key)
+
+    assert cached["word_count"] == 3
+    assert list(cached["words_list"]) == list(count_info["words_list"])
+    assert reader.get(key) is not None
+    assert metrics.snapshot() == {
+        "parse_cache.hit": 1, "parse_cache.persistent_hit": 1}
+
+
+def test_it_skips_the_persistent_tier_when_it_fails():
+    collection = MagicMock()
+    collection.find_one.side_effect = Exception("mongo error")
+    cache = ParseCache(max_entries=4, max_body_size=1024, collection=collection)
+    metrics.reset()
+
+    assert cache.get("key") is None
+    assert metrics.snapshot() == {"parse_cache.error": 1, "parse_cache.miss": 1}
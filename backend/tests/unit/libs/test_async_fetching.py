@@ -0,0 +1,241 @@
+import asyncio
+import threading
+import time
+import urllib.error
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from libs.async_fetching import AsyncFetchClient, read_body
+from libs.fetching import FetchBudget, FetchBudgetError
+
+PAGE = b"<html><body><p>sample text</p></body></html>"
+BLOCK = b"x" * 1024 * 1024
+HUGE_BODY_SIZE = 1024 * len(BLOCK)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        if self.path == "/redirect":
+            self.send_response(302)
+            self.send_header("Location", "/page")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path == "/huge-redirect":
+            self.send_response(302)
+            self.send_header("Location", "/page")
+            self.send_header("Content-Length", str(HUGE_BODY_SIZE))
+            self.end_headers()
+            try:
+                for _ in range(HUGE_BODY_SIZE // len(BLOCK)):
+                    self.wfile.write(BLOCK)
+            except OSError:
+                self.close_connection = True
+            return
+        if self.path == "/etag" and self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.send_header("ETag", '"v1"')
+            self.end_headers()
+            return
+        if self.path == "/missing":
+            self.send_error(404)
+            return
+        if self.path == "/chunked":
+            self.send_response(200)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for chunk in (PAGE[:10], PAGE[10:]):
+                self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+            self.wfile.write(b"0\r\n\r\n")
+            return
+        if self.path == "/slow":
+            time.sleep(0.5)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(PAGE)))
+        self.send_header("ETag", '"v1"')
+        self.end_headers()
+        self.wfile.write(PAGE)
+        # Drop the kept-alive connection without telling the client.
+        if self.path == "/drop":
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.connections = 0
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_client():
+    return AsyncFetchClient(max_connections_per_host=2, max_hosts=4, dns_cache_ttl=60)
+
+
+async def fetch(client, url, headers=None):
+    async with await client.open(url, headers) as response:
+        return response.status, await read_body(response)
+
+
+def test_it_reuses_connections_to_the_same_host(stub_server):
+    url = f"http://127.0.0.1:{stub_server.server_port}/page"
+    client = make_client()
+
+    async def main():
+        pages = [await fetch(client, url) for _ in range(3)]
+        client.close()
+        return pages
+
+    assert asyncio.run(main()) == [(200, PAGE)] * 3
+    assert stub_server.connections == 1
+
+
+def test_it_fetches_many_pages_at_once(stub_server):
+    url = f"http://127.0.0.1:{stub_server.server_port}/slow"
+    client = make_client()
+
+    async def main():
+        pages = await asyncio.gather(*(fetch(client, url) for _ in range(10)))
+        client.close()
+        return pages
+
+    start = time.perf_counter()
+    assert asyncio.run(main()) == [(200, PAGE)] * 10
+    assert time.perf_counter() - start < 2.5
+
+
+def test_it_reads_chunked_bodies(stub_server):
+    client = make_client()
+    url = f"http://127.0.0.1:{stub_server.server_port}/chunked"
+
+    async def main():
+        pages = [await fetch(client, url) for _ in range(2)]
+        client.close()
+        return pages
+
+    assert asyncio.run(main()) == [(200, PAGE)] * 2
+    assert stub_server.connections == 1
+
+
+def test_it_follows_redirects_and_returns_not_modified_responses(stub_server):
+    client = make_client()
+    base = f"http://127.0.0.1:{stub_server.server_port}"
+
+    async def main():
+        response = await client.open(f"{base}/redirect")
+        async with response:
+            assert response.url.endswith("/page")
+            assert await read_body(response) == PAGE
+        not_modified = await fetch(client, f"{base}/etag", {"If-None-Match": '"v1"'})
+        client.close()
+        return not_modified
+
+    assert asyncio.run(main()) == (304, b"")
+    assert stub_server.connections == 1
+
+
+def test_it_does_not_read_large_redirect_bodies(stub_server):
+    client = make_client()
+
+    async def main():
+        response = await client.open(f"http://127.0.0.1:{stub_server.server_port}/huge-redirect")
+        async with response:
+            body = await read_body(response)
+        client.close()
+        return body
+
+    start = time.monotonic()
+    assert asyncio.run(main()) == PAGE
+    assert time.monotonic() - start < 5
+    assert stub_server.connections == 2
+
+
+def test_it_raises_http_errors_like_urlopen(stub_server):
+    client = make_client()
+
+    with pytest.raises(urllib.error.HTTPError) as exc:
+        asyncio.run(client.open(f"http://127.0.0.1:{stub_server.server_port}/missing"))
+
+    assert exc.value.code == 404
+
+
+def test_it_retries_on_a_new_connection_when_a_kept_alive_one_was_closed(stub_server):
+    client = make_client()
+    url = f"http://127.0.0.1:{stub_server.server_port}/drop"
+
+    async def main():
+        first = await fetch(client, url)
+        # Let the closed connection's end of file arrive.
+        await asyncio.sleep(0.05)
+        second = await fetch(client, url)
+        client.close()
+        return [first, second]
+
+    assert asyncio.run(main()) == [(200, PAGE)] * 2
+    assert stub_server.connections == 2
+
+
+def test_it_applies_the_budget_read_timeout(stub_server):
+    client = make_client()
+    budget = FetchBudget(connect_timeout=1, read_timeout=0.05)
+
+    with pytest.raises(urllib.error.URLError) as exc:
+        asyncio.run(client.open(
+            f"http://127.0.0.1:{stub_server.server_port}/slow", budget=budget))
+
+    assert isinstance(exc.value.reason, TimeoutError)
+
+
+def test_it_raises_url_errors_for_unsupported_urls():
+    with pytest.raises(urllib.error.URLError):
+        asyncio.run(make_client().open("ftp://example.com/page"))
+
+
+class SlowResponse:
+    def __init__(self, chunks, delay):
+        self.chunks = list(chunks)
+        self.delay = delay
+
+    async def read1(self, size):
+        await asyncio.sleep(self.delay)
+        return self.chunks.pop(0) if self.chunks else b""
+
+
+def test_it_reads_bodies_within_the_budget():
+    budget = FetchBudget(max_body_size=6, allow_partial=True)
+
+    assert asyncio.run(read_body(SlowResponse([b"abcd", b"efgh", b"ijkl"], 0), budget)) == (
+        b"abcdefgh")
+
+
+def test_it_raises_when_the_budget_deadline_is_hit():
+    budget = FetchBudget(deadline=0.02)
+    budget.start()
+
+    with pytest.raises(FetchBudgetError) as exc:
+        asyncio.run(read_body(SlowResponse([b"abcd"] * 10, 0.01), budget))
+
+    assert exc.value.reason == "deadline"
+
+
+def test_it_cuts_the_body_short_when_a_read_times_out_with_partial_bodies_allowed():
+    budget = FetchBudget(read_timeout=0.01, allow_partial=True)
+
+    assert asyncio.run(read_body(SlowResponse([b"abcd"], 0.1), budget)) == b""
+    assert budget.truncated == "read_timeout"
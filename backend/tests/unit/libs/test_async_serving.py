@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+from libs.async_serving import AsyncBaseHTTPRequestHandler, start_server
+
+
+class EchoHandler(AsyncBaseHTTPRequestHandler):
+    async def do_GET(self):
+        await asyncio.sleep(0.05)
+        body = f"{self.path} {self.headers['X-Test']}".encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_request(self, code):
+        pass
+
+
+async def send(port, request):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(request)
+    response = await reader.read()
+    writer.close()
+    await writer.wait_closed()
+    return response
+
+
+def serve(*requests):
+    async def main():
+        server = await start_server(EchoHandler, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            return await asyncio.gather(*(send(port, request) for request in requests))
+
+    return asyncio.run(main())
+
+
+def test_it_handles_requests_concurrently():
+    request = b"GET /count?url=x HTTP/1.1\r\nHost: localhost\r\nX-Test: yes\r\n\r\n"
+
+    start = time.perf_counter()
+    responses = serve(*[request] * 20)
+
+    # Each request waits 50 ms, 1 s if they were handled one at a time.
+    assert time.perf_counter() - start < 0.5
+
+    for response in responses:
+        head, body = response.split(b"\r\n\r\n", 1)
+        assert head.startswith(b"HTTP/1.0 200 OK\r\n")
+        assert b"\r\nDate: " in head
+        assert body == b"/count?url=x yes"
+
+
+def test_it_responds_with_errors_for_bad_and_unsupported_requests():
+    bad, unsupported = serve(b"NONSENSE\r\n\r\n", b"POST / HTTP/1.1\r\n\r\n")
+
+    assert bad.startswith(b"HTTP/1.0 400 Bad Request\r\n")
+    assert unsupported.startswith(b"HTTP/1.0 501 Not Implemented\r\n")
+    assert unsupported.endswith(b"Unsupported method ('POST')")
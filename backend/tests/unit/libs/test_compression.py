@@ -0,0 +1,72 @@
+import gzip
+
+import pytest
+
+from libs import compression
+from libs.compression import ResponseCompressor, negotiate_encoding
+from libs.metrics import metrics
+
+CONTENT = b"<table><tr><td>word</td><td>1</td></tr></table>" * 50
+
+
+@pytest.fixture
+def with_brotli(monkeypatch):
+    monkeypatch.setattr(compression, "ENCODINGS", ("br", "gzip"))
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("gzip, deflate, br", "br"),
+    ("gzip;q=1.0, br;q=0.5", "gzip"),
+    ("deflate", None),
+    ("br;q=0, gzip;q=0", None),
+    ("*", "br"),
+    ("*;q=0.5, br;q=0", "gzip"),
+    ("GZIP", "gzip"),
+    ("", None),
+])
+def test_it_negotiates_the_encoding(with_brotli, accept_encoding, expected):
+    assert negotiate_encoding(accept_encoding) == expected
+
+
+def test_it_only_negotiates_brotli_when_it_is_installed(monkeypatch):
+    monkeypatch.setattr(compression, "ENCODINGS", ("gzip",))
+
+    assert negotiate_encoding("br") is None
+    assert negotiate_encoding("br, gzip") == "gzip"
+
+
+def test_it_compresses_content_with_gzip():
+    compressor = ResponseCompressor(min_size=100, max_entries=0)
+
+    body, encoding = compressor.compress(CONTENT, "gzip")
+
+    assert encoding == "gzip"
+    assert len(body) < len(CONTENT)
+    assert gzip.decompress(body) == CONTENT
+
+
+def test_it_does_not_compress_content_below_the_minimum_size():
+    compressor = ResponseCompressor(min_size=len(CONTENT) + 1, max_entries=0)
+
+    assert compressor.compress(CONTENT, "gzip") == (CONTENT, None)
+
+
+def test_it_does_not_compress_content_when_no_encoding_is_accepted():
+    compressor = ResponseCompressor(min_size=100, max_entries=0)
+
+    assert compressor.compress(CONTENT, "identity") == (CONTENT, None)
+
+
+def test_it_reuses_compressed_content():
+    metrics.reset()
+    compressor = ResponseCompressor(min_size=100, max_entries=1)
+
+    first = compressor.compress(CONTENT, "gzip")
+    second = compressor.compress(CONTENT, "gzip")
+    other = compressor.compress(CONTENT + b"<p>more</p>", "gzip")
+    evicted = compressor.compress(CONTENT, "gzip")
+
+    assert first == second == evicted
+    assert gzip.decompress(other[0]) == CONTENT + b"<p>more</p>"
+    assert metrics.snapshot()["compression.hit"] == 1
+    assert metrics.snapshot()["compression.miss"] == 3
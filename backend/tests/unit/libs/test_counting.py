@@ -1,6 +1,6 @@
 from pathlib import Path
 
-from libs.counting import count_information
+from libs.counting import Parser, count_information
 
 
 def test_it_returns_the_correct_count_information():
@@ -30,3 +30,40 @@ def test_it_returns_the_correct_count_information():
             ['purposes', 1],
         ]
     }
+
+
+def test_it_counts_words_after_void_elements():
+    html = "<html><body><p>line one<br>line two<img src='x.png'> end</p><p>after</p></body></html>"
+
+    assert count_information(html) == {
+        "word_count": 6,
+        "words_list": [['line', 2], ['one', 1], ['two', 1], ['end', 1], ['after', 1]],
+    }
+
+
+def test_it_implicitly_closes_paragraphs_and_list_items():
+    html = "<body><ul><li>first<li>second</ul><p>one<p>two<div>skipped</div></body><p>outside"
+
+    assert count_information(html) == {
+        "word_count": 4,
+        "words_list": [['first', 1], ['second', 1], ['one', 1], ['two', 1]],
+    }
+
+
+def test_it_ignores_end_tags_that_were_never_opened():
+    parser = Parser()
+    parser.feed("<body><p>kept</span></br></em>still kept</p></body>")
+
+    assert parser.word_count == 3
+    assert parser.currently_opened_tags == []
+    assert parser.body_depth == 0
+
+
+def test_it_counts_words_split_across_chunks():
+    current_dir = Path(__file__).resolve().parent
+
+    with open(current_dir / '../' / '../' / 'fixtures' / 'sample1.html', 'r') as file:
+        sample_html = file.read()
+    chunks = (sample_html[i:i + 7] for i in range(0, len(sample_html), 7))
+
+    assert count_information(chunks) == count_information(sample_html)
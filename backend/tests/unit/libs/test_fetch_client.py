@@ -0,0 +1,193 @@
+import threading
+import time
+import urllib.error
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from libs.fetch_client import DnsCache, FetchClient
+from libs.fetching import FetchBudget, read_chunks
+
+PAGE = b"<html><body><p>sample text</p></body></html>"
+BLOCK = b"x" * 1024 * 1024
+HUGE_BODY_SIZE = 1024 * len(BLOCK)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        if self.path == "/redirect":
+            self.send_response(302)
+            self.send_header("Location", "/page")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path == "/huge-redirect":
+            self.send_response(302)
+            self.send_header("Location", "/page")
+            self.send_header("Content-Length", str(HUGE_BODY_SIZE))
+            self.end_headers()
+            try:
+                for _ in range(HUGE_BODY_SIZE // len(BLOCK)):
+                    self.wfile.write(BLOCK)
+            except OSError:
+                self.close_connection = True
+            return
+        if self.path == "/etag" and self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.send_header("ETag", '"v1"')
+            self.end_headers()
+            return
+        if self.path == "/slow":
+            time.sleep(0.5)
+        if self.path == "/missing":
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(PAGE)))
+        self.send_header("ETag", '"v1"')
+        self.end_headers()
+        self.wfile.write(PAGE)
+        # Drop the kept-alive connection without telling the client.
+        if self.path == "/drop":
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.connections = 0
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_client():
+    return FetchClient(max_connections_per_host=2, max_hosts=4, dns_cache_ttl=60)
+
+
+def fetch(client, url):
+    with client.open(url) as response:
+        return b"".join(read_chunks(response, 8))
+
+
+def test_it_reuses_connections_to_the_same_host(stub_server):
+    url = f"http://127.0.0.1:{stub_server.server_port}/page"
+    client = make_client()
+
+    assert [fetch(client, url) for _ in range(3)] == [PAGE] * 3
+    assert stub_server.connections == 1
+    client.close()
+
+
+def test_it_follows_redirects_on_the_same_connection(stub_server):
+    client = make_client()
+
+    with client.open(f"http://127.0.0.1:{stub_server.server_port}/redirect") as response:
+        assert response.read() == PAGE
+        assert response.url.endswith("/page")
+    assert stub_server.connections == 1
+    client.close()
+
+
+def test_it_does_not_read_large_redirect_bodies(stub_server):
+    client = make_client()
+
+    start = time.monotonic()
+    with client.open(f"http://127.0.0.1:{stub_server.server_port}/huge-redirect") as response:
+        assert response.read() == PAGE
+    assert time.monotonic() - start < 5
+    assert stub_server.connections == 2
+    client.close()
+
+
+def test_it_raises_http_errors_like_urlopen(stub_server):
+    client = make_client()
+
+    with pytest.raises(urllib.error.HTTPError) as exc:
+        client.open(f"http://127.0.0.1:{stub_server.server_port}/missing")
+
+    assert exc.value.code == 404
+    client.close()
+
+
+def test_it_returns_not_modified_responses_on_the_same_connection(stub_server):
+    client = make_client()
+    url = f"http://127.0.0.1:{stub_server.server_port}/etag"
+
+    with client.open(url) as response:
+        assert response.read() == PAGE
+        etag = response.headers["ETag"]
+    with client.open(url, {"If-None-Match": etag}) as response:
+        assert response.status == 304
+        assert response.read() == b""
+    assert stub_server.connections == 1
+    client.close()
+
+
+def test_it_retries_on_a_new_connection_when_a_kept_alive_one_was_closed(stub_server):
+    client = make_client()
+    url = f"http://127.0.0.1:{stub_server.server_port}/drop"
+
+    assert fetch(client, url) == PAGE
+    assert fetch(client, url) == PAGE
+    assert stub_server.connections == 2
+    client.close()
+
+
+def test_it_does_not_reuse_partially_read_connections(stub_server):
+    client = make_client()
+    url = f"http://127.0.0.1:{stub_server.server_port}/page"
+
+    with client.open(url) as response:
+        response.read(4)
+    assert fetch(client, url) == PAGE
+    assert stub_server.connections == 2
+    client.close()
+
+
+def test_it_applies_the_budget_read_timeout(stub_server):
+    client = make_client()
+    budget = FetchBudget(connect_timeout=1, read_timeout=0.05)
+
+    with pytest.raises(urllib.error.URLError) as exc:
+        client.open(f"http://127.0.0.1:{stub_server.server_port}/slow", budget=budget)
+
+    assert isinstance(exc.value.reason, TimeoutError)
+    client.close()
+
+
+def test_it_raises_url_errors_for_unsupported_urls():
+    with pytest.raises(urllib.error.URLError):
+        make_client().open("ftp://example.com/page")
+
+
+def test_it_caches_resolved_addresses():
+    calls = []
+
+    def resolver(host, port, type):
+        calls.append(host)
+        return [(None, type, 0, "", ("10.0.0.1", port)), (None, type, 0, "", ("10.0.0.1", port))]
+
+    cache = DnsCache(60, resolver)
+    assert cache.resolve("example.com", 80) == ["10.0.0.1"]
+    assert cache.resolve("example.com", 80) == ["10.0.0.1"]
+    assert calls == ["example.com"]
+
+    uncached = DnsCache(0, resolver)
+    uncached.resolve("example.com", 80)
+    uncached.resolve("example.com", 80)
+    assert calls == ["example.com"] * 3
@@ -0,0 +1,152 @@
+import gzip
+import io
+import urllib.error
+import zlib
+from unittest.mock import patch
+
+import pytest
+
+from libs import fetching
+from libs.fetching import (
+    ACCEPT_ENCODING,
+    ContentEncodingError,
+    FetchBudget,
+    FetchBudgetError,
+    decode_chunks,
+    open_url,
+    read_chunks,
+)
+from libs.metrics import metrics
+
+
+def make_response(body, content_encoding):
+    response = io.BytesIO(body)
+    response.headers = {"Content-Encoding": content_encoding}
+    return response
+
+
+def test_it_reads_a_response_in_chunks():
+    response = io.BytesIO(b"0123456789")
+
+    assert list(read_chunks(response, 4)) == [b"0123", b"4567", b"89"]
+
+
+def test_it_decodes_characters_split_across_chunks():
+    encoded = "café – naïve".encode("utf-8")
+    chunks = [encoded[i:i + 1] for i in range(len(encoded))]
+
+    assert "".join(decode_chunks(chunks)) == "café – naïve"
+
+
+def test_it_raises_when_chunks_end_mid_character():
+    with pytest.raises(UnicodeDecodeError):
+        list(decode_chunks([b"caf\xc3"]))
+
+
+def test_it_returns_not_modified_responses_to_conditional_requests():
+    not_modified = urllib.error.HTTPError(
+        "https://example.com", 304, "Not Modified", {}, io.BytesIO())
+
+    with patch("urllib.request.urlopen", side_effect=not_modified):
+        response = open_url("https://example.com",
+                            headers={"If-None-Match": '"v1"'})
+
+    assert response.status == 304
+
+
+def test_it_raises_error_responses_to_conditional_requests():
+    not_found = urllib.error.HTTPError(
+        "https://example.com", 404, "Not Found", {}, io.BytesIO())
+
+    with patch("urllib.request.urlopen", side_effect=not_found):
+        with pytest.raises(urllib.error.HTTPError):
+            open_url("https://example.com",
+                     headers={"If-None-Match": '"v1"'})
+
+
+def test_it_raises_when_a_response_is_over_the_budget():
+    budget = FetchBudget(max_body_size=6)
+
+    with pytest.raises(FetchBudgetError) as exc:
+        list(read_chunks(io.BytesIO(b"0123456789"), 4, budget))
+
+    assert exc.value.reason == "max_body_size"
+
+
+def test_it_cuts_a_response_short_at_the_budget_when_partial_bodies_are_allowed():
+    budget = FetchBudget(max_body_size=6, allow_partial=True)
+
+    assert list(read_chunks(io.BytesIO(b"0123456789"), 4, budget)) == [b"0123", b"45"]
+    assert budget.truncated == "max_body_size"
+
+
+def test_it_stops_reading_at_the_deadline():
+    budget = FetchBudget(deadline=0, allow_partial=True)
+    budget.start()
+
+    assert list(read_chunks(io.BytesIO(b"0123456789"), 4, budget)) == []
+    assert budget.truncated == "deadline"
+
+
+def test_it_decodes_a_cut_short_character_with_replacement():
+    encoded = "café".encode("utf-8")[:-1]
+
+    assert "".join(decode_chunks([encoded], errors="replace")) == "caf\ufffd"
+
+
+def test_it_accepts_compressed_responses():
+    with patch("urllib.request.urlopen") as mock_urlopen:
+        open_url("https://example.com")
+
+    request = mock_urlopen.call_args.args[0]
+    assert request.get_header("Accept-encoding") == ACCEPT_ENCODING
+
+
+def test_it_decompresses_gzip_responses_and_records_bytes_on_wire():
+    body = b"sample text " * 1000
+    compressed = gzip.compress(body)
+    metrics.reset()
+
+    chunks = list(read_chunks(make_response(compressed, "gzip"), 64))
+
+    assert b"".join(chunks) == body
+    assert max(len(chunk) for chunk in chunks) <= 64
+    assert metrics.snapshot() == {
+        "fetch.bytes_decoded": len(body),
+        "fetch.bytes_on_wire": len(compressed),
+    }
+
+
+def test_it_decompresses_zlib_and_raw_deflate_responses():
+    body = b"sample text " * 100
+    raw = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    raw_deflate = raw.compress(body) + raw.flush()
+
+    assert b"".join(read_chunks(make_response(zlib.compress(body), "deflate"), 16)) == body
+    assert b"".join(read_chunks(make_response(raw_deflate, "deflate"), 16)) == body
+
+
+def test_it_limits_the_decompressed_body_size():
+    budget = FetchBudget(max_body_size=1000, allow_partial=True)
+    response = make_response(gzip.compress(b"0" * 1_000_000), "gzip")
+
+    assert len(b"".join(read_chunks(response, 64, budget))) == 1000
+    assert budget.truncated == "max_body_size"
+
+
+def test_it_bounds_each_step_of_decompressing_brotli_responses():
+    if fetching.brotli is None:
+        pytest.skip("brotli 1.2+ is not installed")
+    body = b"0" * 10_000_000
+
+    chunks = list(read_chunks(make_response(fetching.brotli.compress(body), "br")))
+
+    assert b"".join(chunks) == body
+    assert max(len(chunk) for chunk in chunks) <= 2 * fetching.CHUNK_SIZE
+
+
+def test_it_raises_for_unsupported_or_corrupt_encodings():
+    with pytest.raises(ContentEncodingError):
+        list(read_chunks(make_response(b"body", "compress")))
+    with pytest.raises(ContentEncodingError):
+        list(read_chunks(make_response(b"not gzip", "gzip")))
@@ -0,0 +1,166 @@
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from db.mongo import UrlError
+from libs.jobs import DONE, FAILED, PENDING, JobQueue, JobQueueFullError, JobStore
+
+
+def run_job(func, *args):
+    queue = JobQueue(max_workers=1, max_queue=0, store=JobStore(timeout=60))
+    job = queue.submit("https://example.com", func, *args)
+    queue.close()
+    return queue.store.get(job.id)
+
+
+def test_it_finishes_a_job():
+    calls = []
+
+    job = run_job(calls.append, "sample")
+
+    assert job.status == DONE
+    assert job.error is None
+    assert calls == ["sample"]
+
+
+def test_it_fails_a_job_with_the_message_and_code_of_its_error():
+    def fail():
+        raise UrlError("already searched for analysis of URL: https://example.com", 400)
+
+    job = run_job(fail)
+
+    assert job.status == FAILED
+    assert job.error.message == "already searched for analysis of URL: https://example.com"
+    assert job.error.code == 400
+
+
+def test_it_fails_a_job_with_an_unexpected_error_as_a_500():
+    def fail():
+        raise ValueError("unexpected")
+
+    job = run_job(fail)
+
+    assert (job.status, job.error.message, job.error.code) == (FAILED, "unexpected", 500)
+
+
+def test_it_times_out_stuck_jobs():
+    release = threading.Event()
+    store = JobStore(timeout=60)
+    queue = JobQueue(max_workers=1, max_queue=0, store=store)
+    job = queue.submit("https://example.com", release.wait)
+
+    assert store.get(job.id).status == PENDING
+    with patch("libs.jobs.time.monotonic", return_value=job.created + 61):
+        assert store.get(job.id).status == FAILED
+    assert job.error.code == 504
+
+    # A stuck job that finishes later stays failed.
+    release.set()
+    queue.close()
+    assert store.get(job.id).status == FAILED
+
+
+def test_it_rejects_jobs_while_a_timed_out_job_is_still_running():
+    release, ran = threading.Event(), threading.Event()
+    store = JobStore(timeout=60)
+    queue = JobQueue(max_workers=1, max_queue=1, store=store)
+    stuck_job = queue.submit("https://example.com/stuck", release.wait)
+    waiting_job = queue.submit("https://example.com/waiting", ran.set)
+
+    with patch("libs.jobs.time.monotonic", return_value=stuck_job.created + 61):
+        assert store.get(stuck_job.id).status == FAILED
+    with pytest.raises(JobQueueFullError) as exc:
+        queue.submit("https://example.com/rejected", lambda: None)
+    assert exc.value.message == "count job queue is full"
+
+    release.set()
+    assert ran.wait(5)
+    queue.close()
+    assert store.get(waiting_job.id).status == DONE
+
+
+def test_it_removes_old_jobs():
+    store = JobStore(timeout=60)
+    old_job = store.add("https://example.com/old")
+    store.finish(old_job.id)
+
+    with patch("libs.jobs.time.monotonic", return_value=old_job.finished + 121):
+        new_job = store.add("https://example.com/new")
+
+    assert store.get(old_job.id) is None
+    assert store.get(new_job.id) is new_job
+
+
+def test_it_does_not_find_unknown_jobs():
+    assert JobStore(timeout=60).get("unknown") is None
+
+
+def test_it_keeps_jobs_in_a_collection():
+    from unittest.mock import MagicMock
+    collection = MagicMock()
+    store = JobStore(timeout=60, collection=collection)
+
+    with patch("libs.jobs.time.time", return_value=1000):
+        job = store.add("https://example.com")
+
+    collection.delete_many.assert_called_once_with({"expires": {"$lt": 1000}})
+    collection.insert_one.assert_called_once_with({
+        "_id": job.id, "label": "https://example.com", "status": PENDING,
+        "created": 1000, "expires": 1120,
+    })
+
+
+def test_it_gets_a_job_added_by_another_process_from_a_collection():
+    from unittest.mock import MagicMock
+    collection = MagicMock()
+    collection.find_one.return_value = {
+        "_id": "abc", "label": "https://example.com", "status": FAILED, "created": 1000,
+        "finished": 1010, "error_message": "URL error", "error_code": 400,
+    }
+
+    job = JobStore(timeout=60, collection=collection).get("abc")
+
+    collection.find_one.assert_called_once_with({"_id": "abc"})
+    assert (job.id, job.label, job.status) == ("abc", "https://example.com", FAILED)
+    assert (job.error.message, job.error.code) == ("URL error", 400)
+
+
+def test_it_finishes_only_pending_jobs_in_a_collection():
+    from unittest.mock import MagicMock
+    collection = MagicMock()
+    store = JobStore(timeout=60, collection=collection)
+
+    with patch("libs.jobs.time.time", return_value=1000):
+        store.finish("abc")
+
+    collection.update_one.assert_called_once_with(
+        {"_id": "abc", "status": PENDING},
+        {"$set": {"status": DONE, "finished": 1000, "expires": 1120}})
+
+
+def test_it_times_out_stuck_jobs_in_a_collection():
+    from unittest.mock import MagicMock
+    collection = MagicMock()
+    pending = {"_id": "abc", "label": "https://example.com", "status": PENDING, "created": 1000}
+    collection.find_one.side_effect = [pending, {
+        **pending, "status": FAILED, "finished": 1061,
+        "error_message": "job timed out after 60 seconds", "error_code": 504}]
+    store = JobStore(timeout=60, collection=collection)
+
+    with patch("libs.jobs.time.time", return_value=1061):
+        job = store.get("abc")
+
+    collection.update_one.assert_called_once_with(
+        {"_id": "abc", "status": PENDING},
+        {"$set": {"status": FAILED, "finished": 1061, "expires": 1181,
+                  "error_message": "job timed out after 60 seconds", "error_code": 504}})
+    assert (job.status, job.error.code) == (FAILED, 504)
+
+
+def test_it_does_not_find_unknown_jobs_in_a_collection():
+    from unittest.mock import MagicMock
+    collection = MagicMock()
+    collection.find_one.return_value = None
+
+    assert JobStore(timeout=60, collection=collection).get("unknown") is None
@@ -0,0 +1,108 @@
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+
+from libs.counting import Parser, count_information
+from libs.metrics import metrics
+from libs.pooling import (
+    CountingPool,
+    CountingPoolFullError,
+    CountingPoolTimeoutError,
+)
+
+
+class SlowParser(Parser):
+    def feed(self, data):
+        time.sleep(30)
+        super().feed(data)
+
+
+@pytest.fixture
+def sample_html():
+    current_dir = Path(__file__).resolve().parent
+
+    with open(current_dir / '../' / '../' / 'fixtures' / 'sample1.html', 'r') as file:
+        return file.read()
+
+
+def make_pool(size_threshold=0, timeout=30, max_queue=0):
+    return CountingPool(
+        max_workers=1,
+        max_queue=max_queue,
+        max_tasks_per_worker=2,
+        size_threshold=size_threshold,
+        timeout=timeout,
+    )
+
+
+def test_it_counts_large_pages_in_a_worker_process(sample_html):
+    pool = make_pool()
+    try:
+        chunks = [sample_html[i:i + 50] for i in range(0, len(sample_html), 50)]
+        for _ in range(3):
+            assert pool.count(chunks) == count_information(sample_html)
+    finally:
+        pool.close()
+
+
+def test_it_counts_small_pages_inline(sample_html):
+    pool = make_pool(size_threshold=len(sample_html) + 1)
+    pool._executor = MagicMock()
+
+    assert pool.count([sample_html]) == count_information(sample_html)
+    pool._executor.submit.assert_not_called()
+
+
+def test_it_raises_when_counting_times_out_and_holds_the_slot():
+    pool = make_pool(timeout=0.01)
+    executor = pool._executor = MagicMock()
+    running_future = Future()
+    running_future.set_running_or_notify_cancel()
+    executor.submit.return_value = running_future
+
+    try:
+        with pytest.raises(CountingPoolTimeoutError) as exc:
+            pool.submit("<body><p>slow</p></body>")
+        assert exc.value.message == "counting timed out after 0.01 seconds"
+
+        with pytest.raises(CountingPoolFullError) as exc:
+            pool.submit("<body><p>waiting</p></body>")
+        assert exc.value.message == "counting pool is full"
+
+        running_future.set_result({})
+        assert pool._executor is not executor
+        pool._executor.shutdown()
+        pool._executor = MagicMock()
+        pool._executor.submit.return_value = Future()
+        pool._executor.submit.return_value.set_result({"word_count": 0})
+        assert pool.submit("<body></body>") == {"word_count": 0}
+    finally:
+        pool.close()
+
+
+def test_it_recycles_a_worker_still_counting_a_timed_out_page(sample_html):
+    metrics.reset()
+    pool = make_pool(timeout=0.5)
+    try:
+        assert pool.submit(sample_html) == count_information(sample_html)
+        stuck_worker, = pool._executor._processes.values()
+
+        with pytest.raises(CountingPoolTimeoutError):
+            pool.submit(sample_html, engine=SlowParser)
+
+        assert metrics.snapshot()["counting_pool.recycled"] == 1
+        deadline = time.monotonic() + 5
+        while True:
+            try:
+                assert pool.submit(sample_html) == count_information(sample_html)
+                break
+            except CountingPoolFullError:
+                assert time.monotonic() < deadline
+                time.sleep(0.05)
+        stuck_worker.join(5)
+        assert not stuck_worker.is_alive()
+    finally:
+        pool.close()
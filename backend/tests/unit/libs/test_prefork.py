@@ -0,0 +1,109 @@
+import http.client
+import signal
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+SRC = Path(__file__).resolve().parents[3] / "src"
+
+# A supervisor of two single threaded workers answering with their process ID.
+SERVER = f"""
+import os, signal, sys, threading, time
+sys.path.insert(0, {str(SRC)!r})
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from libs.prefork import Supervisor, adopt_socket, listen
+
+class PidHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/crash":
+            os._exit(3)
+        time.sleep(0.2)
+        body = str(os.getpid()).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def worker():
+    server = HTTPServer(("127.0.0.1", 0), PidHandler, False)
+    adopt_socket(server, sock)
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(
+        target=server.shutdown).start())
+    server.serve_forever(0.01)
+    server.server_close()
+
+sock = listen(("127.0.0.1", 0), 16)
+print(sock.getsockname()[1], flush=True)
+Supervisor(2, worker, shutdown_timeout=5, restart_delay=0).run()
+"""
+
+
+@pytest.fixture
+def supervisor(tmp_path):
+    script = tmp_path / "server.py"
+    script.write_text(SERVER)
+    process = subprocess.Popen([sys.executable, str(script)], stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL, text=True)
+    process.port = int(process.stdout.readline())
+    yield process
+    if process.poll() is None:
+        process.kill()
+        process.wait()
+
+
+def get(port, path="/"):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    try:
+        connection.request("GET", path)
+        return connection.getresponse().read().decode()
+    finally:
+        connection.close()
+
+
+def worker_pids(port):
+    # Each worker handles one request at a time, so concurrent requests reach both.
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        return set(executor.map(lambda _: get(port), range(4)))
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def test_it_shares_the_socket_between_workers_and_replaces_crashed_ones(supervisor):
+    pids = worker_pids(supervisor.port)
+    assert len(pids) == 2
+
+    with pytest.raises((http.client.HTTPException, ConnectionError)):
+        get(supervisor.port, "/crash")
+
+    def is_replaced():
+        new_pids = worker_pids(supervisor.port)
+        return len(new_pids) == 2 and new_pids != pids
+
+    assert wait_for(is_replaced)
+
+
+def test_it_restarts_workers_one_at_a_time_and_stops_gracefully(supervisor):
+    pids = worker_pids(supervisor.port)
+
+    supervisor.send_signal(signal.SIGHUP)
+    # Requests keep being answered throughout the rolling restart.
+    assert wait_for(lambda: not worker_pids(supervisor.port) & pids)
+
+    supervisor.send_signal(signal.SIGTERM)
+    assert supervisor.wait(timeout=10) == 0
+    with pytest.raises(ConnectionError):
+        get(supervisor.port)
@@ -0,0 +1,44 @@
+import random
+
+import pytest
+
+from libs.ranking import RankedWords
+
+
+def fully_sorted(counts):
+    words_list = [[word, count] for word, count in counts.items()]
+    words_list.sort(key=lambda item: item[1], reverse=True)
+    return words_list
+
+
+@pytest.fixture
+def counts():
+    rng = random.Random(0)
+    return {f"word{i}": rng.randint(1, 20) for i in range(1000)}
+
+
+def test_it_ranks_the_same_as_a_full_sort(counts):
+    assert list(RankedWords(counts)) == fully_sorted(counts)
+
+
+def test_it_ranks_only_the_requested_pages(counts):
+    ranked_words = RankedWords(counts)
+
+    assert ranked_words[0:5] == fully_sorted(counts)[0:5]
+    assert ranked_words[10:15] == fully_sorted(counts)[10:15]
+    assert ranked_words[7] == fully_sorted(counts)[7]
+    assert not ranked_words.is_fully_ranked
+
+    assert ranked_words[-1] == fully_sorted(counts)[-1]
+    assert ranked_words.is_fully_ranked
+
+
+def test_it_behaves_like_a_list():
+    ranked_words = RankedWords({"one": 1, "two": 2, "also_one": 1})
+
+    assert len(ranked_words) == 3
+    assert ranked_words == [["two", 2], ["one", 1], ["also_one", 1]]
+    assert ranked_words[5:10] == []
+    with pytest.raises(IndexError):
+        ranked_words[3]
+    assert RankedWords({}) == []
@@ -0,0 +1,90 @@
+import asyncio
+import gzip
+import time
+import urllib.error
+
+import pytest
+
+from libs.fetching import FetchBudget, open_url, read_chunks
+from libs.replay import AsyncReplayTransport, ReplayTransport, record_pages
+
+PAGE = b"<html><body><p>sample text</p></body></html>"
+
+
+def make_transport(**kwargs):
+    return ReplayTransport({
+        "https://example.com/": {"body": PAGE, "headers": {"ETag": '"v1"'}},
+        "https://example.com/gzip": {
+            "body": gzip.compress(PAGE), "headers": {"Content-Encoding": "gzip"}},
+        "https://example.com/gone": {"body": b"", "status": 410},
+    }, **kwargs)
+
+
+def fetch(transport, url, headers=None):
+    with open_url(url, transport, headers) as response:
+        return response.status, b"".join(read_chunks(response, 8))
+
+
+def test_it_replays_recorded_pages():
+    transport = make_transport()
+
+    assert fetch(transport, "https://example.com/") == (200, PAGE)
+    assert fetch(transport, "https://example.com/gzip") == (200, PAGE)
+    assert fetch(transport, "https://example.com/", {"If-None-Match": '"v1"'}) == (304, b"")
+
+
+def test_it_raises_http_errors_like_urlopen():
+    transport = make_transport()
+
+    with pytest.raises(urllib.error.HTTPError) as exc:
+        transport.open("https://example.com/missing")
+    assert exc.value.code == 404
+    with pytest.raises(urllib.error.HTTPError) as exc:
+        transport.open("https://example.com/gone")
+    assert exc.value.code == 410
+
+
+def test_it_simulates_latency_and_bandwidth():
+    transport = make_transport(latency=0.02, bandwidth=len(PAGE) / 0.02)
+
+    start = time.perf_counter()
+    fetch(transport, "https://example.com/")
+
+    assert time.perf_counter() - start >= 0.04
+
+
+def test_it_times_out_when_the_latency_is_over_the_read_timeout():
+    transport = make_transport(latency=1)
+
+    with pytest.raises(urllib.error.URLError) as exc:
+        transport.open("https://example.com/", budget=FetchBudget(read_timeout=0.01))
+
+    assert isinstance(exc.value.reason, TimeoutError)
+
+
+def test_it_replays_pages_recorded_to_a_directory(tmp_path):
+    urls = ["https://example.com/", "https://example.com/gzip"]
+
+    assert record_pages(urls, tmp_path, make_transport()) == 2
+    transport = ReplayTransport.from_directory(tmp_path)
+
+    assert fetch(transport, "https://example.com/") == (200, PAGE)
+    assert fetch(transport, "https://example.com/gzip") == (200, PAGE)
+    assert transport.pages["https://example.com/gzip"]["headers"] == {"Content-Encoding": "gzip"}
+
+
+def test_it_replays_recorded_pages_without_blocking():
+    transport = AsyncReplayTransport(
+        {"https://example.com/": {"body": PAGE}}, latency=0.05, bandwidth=len(PAGE) / 0.01)
+
+    async def fetch_async():
+        async with await transport.open("https://example.com/") as response:
+            return await response.read()
+
+    async def main():
+        return await asyncio.gather(*(fetch_async() for _ in range(10)))
+
+    start = time.perf_counter()
+    assert asyncio.run(main()) == [PAGE] * 10
+    # Ten fetches of 60 ms each wait at once rather than one after another.
+    assert time.perf_counter() - start < 0.3
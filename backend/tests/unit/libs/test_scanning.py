@@ -0,0 +1,109 @@
+from pathlib import Path
+
+import pytest
+
+from libs.counting import Parser, count_information
+from libs.engines import get_engine
+from libs.scanning import Scanner
+
+fixtures_dir = Path(__file__).resolve().parent / '../' / '../' / 'fixtures'
+
+conformance_html = [
+    "<html><body><p>Plain paragraph text.</p></body></html>",
+    "<body><h1 class=\"title\" data-x='a > b'>Quoted attribute values</h1></body>",
+    "<body><p>Before<!-- a <p>commented</p> out --> after</p></body>",
+    "<body><p>Split<!--c-->word and <!-->empty comment</p></body>",
+    "<body><p>Script <script>var a = '<p>not counted</p>';</script> skipped</p></body>",
+    "<body><p>Style <STYLE type=text/css>p > a { color: red }</STYLE> skipped</p></body>",
+    "<body><p>Entities &amp; caf&eacute; &lt;tag&gt; fish&nbsp;chips &#65;&#x42;C</p></body>",
+    "<body><p>A literal < sign and 1 < 2, plus a tag-less > sign</p></body>",
+    "<body><p>Line<br>break<br/>and<img src=\"x.png\" alt=\"<p>\"/>images</p></body>",
+    "<body><ul><li>One<li>Two</ul><p>Unclosed<p>paragraphs<div>in div</div></body>",
+    "<body><p>Stray</span> end</b> tags</ p></p> here</body>",
+    "<!DOCTYPE html><?xml version=\"1.0\"?><body><p>Decl<![CDATA[ x ]]>and pi</p></body>",
+    "<body><p>Self closing <p/> paragraph and <em/>emphasis</em></p></body>",
+    "<body><P>Upper CASE <B>Tags</B></P></BODY>",
+    "<head><title>Title words</title></head><body><section>Section words</section></body>",
+    "<body><p>Unterminated at the end <a href=\"x",
+    "<body><p>Trailing text with no end tag",
+    "<body><body><p>Nested body</p></body><p>after nested</p></body>",
+    "<b ><body></ b>world.",
+    "<body><p>Spaced</ p >end <b>tags</b\n> and </ b x>bogus</p></body>",
+    "<body><p>one <b class=\"x>two</b> three</p> four <i>five</i></body>",
+    "<body><b \"<p x='a>b'>stray quote\n</b></body>",
+    "<body><p>Cut <b title='y<p>short</p> tag</p></body>",
+    "<b <i/><body></b>two. </ b>",
+    "<body><p>Self <br/> closing <a href=x/>unquoted</a> and <b <i/>name</p></body>",
+]
+
+
+def parse(engine, html, chunk_size=None):
+    parser = engine()
+    if chunk_size is None:
+        parser.feed(html)
+    else:
+        for i in range(0, len(html), chunk_size):
+            parser.feed(html[i:i + chunk_size])
+    parser.close()
+    return parser.word_count, list(parser.words_list.items())
+
+
+@pytest.mark.parametrize("html", conformance_html)
+def test_it_scans_the_same_as_the_parser(html):
+    assert parse(Scanner, html) == parse(Parser, html)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64])
+@pytest.mark.parametrize("html", conformance_html)
+def test_it_scans_chunks_the_same_as_a_whole_document(html, chunk_size):
+    assert parse(Scanner, html, chunk_size) == parse(Parser, html)
+
+
+@pytest.mark.parametrize("fixture", ["sample1.html", "sample2.html"])
+def test_it_counts_fixtures_the_same_as_the_parser(fixture):
+    with open(fixtures_dir / fixture, 'r') as file:
+        sample_html = file.read()
+
+    assert count_information(sample_html, Scanner) == count_information(
+        sample_html, Parser)
+
+
+def test_it_gets_engines_by_name():
+    assert get_engine("html_parser") is Parser
+    assert get_engine("scanner") is Scanner
+
+    with pytest.raises(ValueError) as exc:
+        get_engine("regex")
+    assert str(
+        exc.value) == "unknown counting engine: regex, expected one of: html_parser, scanner"
+
+
+@pytest.mark.parametrize("engine", [Parser, Scanner])
+def test_it_collects_links_in_the_counting_pass(engine):
+    html = ("<body><p>See <a href=\"/about\">about</a>, <A class=x HREF='b?x=1&amp;y=2'>b</A>,"
+            " <a href=c.html>c</a>, <a name=\"top\">no link</a> and"
+            " <a data-href=\"x\" href=\" /d \">d</a></p></body>")
+
+    count_info = count_information(
+        [html[i:i + 7] for i in range(0, len(html), 7)], engine, collect_links=True)
+
+    assert count_info["links"] == ["/about", "b?x=1&y=2", "c.html", "/d"]
+    assert count_info["word_count"] == 8
+    assert "links" not in count_information(html, engine)
+
+
+@pytest.mark.parametrize("engine", [Parser, Scanner])
+def test_it_counts_long_text_without_buffering_it_whole(engine, monkeypatch):
+    html = "<body><p>" + "one two&amp;three four, fiv" * 50 + "e</p></body>"
+    expected = parse(engine, html)
+    monkeypatch.setattr("libs.counting.MAX_PENDING_DATA_SIZE", 16)
+
+    parser = engine()
+    parser.feed(html[:9])
+    for i in range(9, len(html) - 11, 5):
+        parser.feed(html[i:i + 5])
+        assert parser.pending_size <= 2 * 16 + 5
+    parser.feed(html[-11:])
+    parser.close()
+
+    assert (parser.word_count, list(parser.words_list.items())) == expected
@@ -0,0 +1,96 @@
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+from libs.serving import PooledHTTPServer
+
+
+class BlockingHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.started.release()
+        self.server.release.wait()
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def make_server():
+    servers = []
+
+    def make(max_workers, max_queue):
+        server = PooledHTTPServer(("127.0.0.1", 0), BlockingHandler, max_workers=max_workers,
+                                  max_queue=max_queue, backlog=16, retry_after=3)
+        server.started = threading.Semaphore(0)
+        server.release = threading.Event()
+        threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield make
+    for server in servers:
+        server.release.set()
+        server.shutdown()
+        server.server_close()
+
+
+def get(server):
+    with urllib.request.urlopen(f"http://127.0.0.1:{server.server_port}/", timeout=5) as response:
+        return response.status, response.read()
+
+
+def test_it_handles_requests_concurrently(make_server):
+    server = make_server(max_workers=2, max_queue=0)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [executor.submit(get, server) for _ in range(2)]
+        # Both requests are being handled at once before either is released.
+        assert server.started.acquire(timeout=5)
+        assert server.started.acquire(timeout=5)
+        server.release.set()
+
+    assert [future.result() for future in futures] == [(200, b"ok")] * 2
+
+
+def test_it_rejects_requests_with_retry_after_when_saturated(make_server):
+    server = make_server(max_workers=1, max_queue=0)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        busy = executor.submit(get, server)
+        assert server.started.acquire(timeout=5)
+
+        with pytest.raises(urllib.error.HTTPError) as exc:
+            get(server)
+        server.release.set()
+
+    assert exc.value.code == 503
+    assert exc.value.headers["Retry-After"] == "3"
+    assert busy.result() == (200, b"ok")
+
+
+def test_it_reports_connections_waiting_for_a_worker(make_server):
+    server = make_server(max_workers=1, max_queue=1)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        busy = executor.submit(get, server)
+        assert server.started.acquire(timeout=5)
+        assert not server.has_waiting_connections()
+
+        waiting = executor.submit(get, server)
+        deadline = time.monotonic() + 5
+        while not server.has_waiting_connections() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert server.has_waiting_connections()
+        server.release.set()
+
+    assert [busy.result(), waiting.result()] == [(200, b"ok")] * 2
+    assert not server.has_waiting_connections()
@@ -0,0 +1,99 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from libs.metrics import metrics
+from libs.single_flight import AsyncSingleFlight, SingleFlight
+
+
+def wait_for_waiters(num_waiters):
+    while metrics.snapshot().get("single_flight.coalesced", 0) < num_waiters:
+        threading.Event().wait(0.001)
+
+
+def test_it_shares_one_call_between_concurrent_callers():
+    metrics.reset()
+    single_flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def func():
+        calls.append(1)
+        release.wait()
+        return "result"
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [executor.submit(single_flight.do, "key", func) for _ in range(3)]
+        wait_for_waiters(2)
+        release.set()
+
+    assert [future.result() for future in futures] == ["result"] * 3
+    assert calls == [1]
+
+
+def test_it_raises_the_error_of_the_shared_call_for_every_caller():
+    metrics.reset()
+    single_flight = SingleFlight()
+    release = threading.Event()
+
+    def func():
+        release.wait()
+        raise ValueError("failed")
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [executor.submit(single_flight.do, "key", func) for _ in range(3)]
+        wait_for_waiters(2)
+        release.set()
+
+    for future in futures:
+        with pytest.raises(ValueError, match="failed"):
+            future.result()
+
+
+def test_it_runs_the_call_again_once_finished():
+    single_flight = SingleFlight()
+    calls = []
+
+    single_flight.do("key", calls.append, 1)
+    single_flight.do("key", calls.append, 2)
+    single_flight.do("other", calls.append, 3)
+
+    assert calls == [1, 2, 3]
+
+
+def test_it_shares_one_coroutine_between_concurrent_awaits():
+    metrics.reset()
+    single_flight = AsyncSingleFlight()
+    calls = []
+
+    async def func():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def main():
+        results = await asyncio.gather(*(single_flight.do("key", func) for _ in range(3)))
+        return results, await single_flight.do("key", func)
+
+    results, next_result = asyncio.run(main())
+
+    assert results == ["result"] * 3
+    assert next_result == "result"
+    assert len(calls) == 2
+    assert metrics.snapshot()["single_flight.coalesced"] == 2
+
+
+def test_it_raises_the_coroutine_error_for_every_await():
+    single_flight = AsyncSingleFlight()
+
+    async def func():
+        await asyncio.sleep(0.01)
+        raise ValueError("failed")
+
+    async def main():
+        return await asyncio.gather(*(single_flight.do("key", func) for _ in range(2)),
+                                    return_exceptions=True)
+
+    assert [str(err) for err in asyncio.run(main())] == ["failed"] * 2
@@ -0,0 +1,105 @@
+import pickle
+from collections import Counter
+
+from libs.counting import count_information, count_summary
+from libs.summaries import HeavyHitters, WordCounts
+
+first_html = "<body><p>one two two three</p></body>"
+second_html = "<body><p>four three three</p></body>"
+third_html = "<body><p>one five</p></body>"
+
+
+def test_it_merges_summaries_as_if_counted_together():
+    merged = count_summary(first_html).merge(count_summary(second_html))
+
+    assert merged == WordCounts(
+        7, {"one": 1, "two": 2, "three": 3, "four": 1})
+    assert merged.to_count_information() == count_information(
+        "<body><p>one two two three four three three</p></body>")
+
+
+def test_it_merges_associatively_without_changing_the_inputs():
+    first, second, third = (count_summary(html)
+                            for html in (first_html, second_html, third_html))
+
+    assert first.merge(second).merge(third) == first.merge(second.merge(third))
+    assert WordCounts.merge_all([first, second, third]) == first.merge(
+        second).merge(third)
+    assert first == count_summary(first_html)
+
+
+def test_it_ranks_a_summary():
+    summary = count_summary(first_html)
+
+    assert summary.ranked() == [["two", 2], ["one", 1], ["three", 1]]
+
+
+def test_it_serialises_a_summary():
+    summary = count_summary(first_html)
+
+    assert summary.to_dict() == {
+        "word_count": 4,
+        "vocabulary": ["one", "two", "three"],
+        "counts": [1, 2, 1],
+    }
+    assert WordCounts.from_dict(summary.to_dict()) == summary
+    assert pickle.loads(pickle.dumps(summary)) == summary
+
+
+def test_it_bounds_approximate_counts_and_their_error():
+    words = ["common"] * 50 + [f"rare{i}" for i in range(200)] + ["often"] * 30
+    counts = HeavyHitters(4)
+    for word in words:
+        counts.update([word])
+
+    assert len(counts) <= 8
+    assert 0 < counts.error <= len(words) // 5
+    assert 50 - counts.error <= counts["common"] <= 50
+    assert 30 - counts.error <= counts["often"] <= 30
+
+
+def test_it_bounds_the_words_held_while_counting_a_long_text_at_once(monkeypatch):
+    monkeypatch.setattr("libs.summaries.MIN_BATCH_SIZE", 1)
+    words = ["common"] * 50 + [f"rare{i}" for i in range(200)] + ["often"] * 30
+    counts = HeavyHitters(4)
+    held = []
+    compact = counts._compact
+
+    def record_compact():
+        held.append(len(counts))
+        compact()
+
+    counts._compact = record_compact
+    counts.update(words)
+    counts.update(dict(Counter(words)))
+
+    assert held and max(held) <= 12
+    assert len(counts) <= 8
+    assert 100 - counts.error <= counts["common"] <= 100
+    assert 60 - counts.error <= counts["often"] <= 60
+
+
+def test_it_counts_approximately_with_an_exact_total():
+    html = "<body><p>" + " ".join(
+        ["top"] * 40 + [f"word{i}" for i in range(100)]) + "</p></body>"
+    count_info = count_information(html, max_words=3)
+
+    assert count_info["word_count"] == 140
+    assert count_info["is_approximate"] is True
+    assert len(count_info["words_list"].counts) <= 6
+    assert count_info["words_list"][0][0] == "top"
+    assert 40 - count_info["max_count_error"] <= count_info["words_list"][0][1] <= 40
+    assert "is_approximate" not in count_information(html)
+
+
+def test_it_merges_and_serialises_approximate_summaries():
+    exact = count_summary(first_html)
+    approximate = count_summary(second_html, max_words=1)
+    merged = exact.merge(approximate)
+
+    assert merged.is_approximate
+    assert merged.word_count == 7
+    assert not exact.is_approximate
+    assert merged.max_count_error >= approximate.max_count_error
+    assert WordCounts.from_dict(merged.to_dict()) == merged
+    assert pickle.loads(pickle.dumps(merged)).max_count_error == merged.max_count_error
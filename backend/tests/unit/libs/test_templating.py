@@ -1,4 +1,4 @@
-from libs.templating import counts_html, reset_html
+from libs.templating import counts_html, pending_html, reset_html
 from utils import normalise_whitespace
 
 
@@ -12,6 +12,10 @@ def test_reset_html():
         hx-swap="outerHTML" hx-include="[name='url']">
         Count
     </button>
+    <button hx-get="http://localhost:8080/count/crawl" hx-trigger="click" hx-target="#counts"
+        hx-swap="outerHTML" hx-include="[name='url']">
+        Crawl
+    </button>
 </form>""")
 
 
@@ -60,6 +64,10 @@ def test_counts_html():
     <div>
         <div class="url-header">
             <h4>https://www.sample1.com - 12</h4>
+            <button class="counts-button" hx-get="http://localhost:8080/count?url=https://www.sample1.com&recount=true" hx-trigger="click"
+                hx-target="#counts" hx-swap="outerHTML">
+                Recount
+            </button>
             <button class="counts-button" hx-get="http://localhost:8080/count?url=https://www.sample1.com&display=false" hx-trigger="click"
                 hx-target="#counts" hx-swap="outerHTML">
                 Close
@@ -101,6 +109,10 @@ def test_counts_html():
     <div>
         <div class="url-header">
             <h4>https://www.sample2.com - 1</h4>
+            <button class="counts-button" hx-get="http://localhost:8080/count?url=https://www.sample2.com&recount=true" hx-trigger="click"
+                hx-target="#counts" hx-swap="outerHTML">
+                Recount
+            </button>
             <button class="counts-button" hx-get="http://localhost:8080/count?url=https://www.sample2.com&display=true" hx-trigger="click"
                 hx-target="#counts" hx-swap="outerHTML">
                 Open
@@ -110,6 +122,10 @@ def test_counts_html():
     <div>
         <div class="url-header">
             <h4>https://www.sample3.com - 31</h4>
+            <button class="counts-button" hx-get="http://localhost:8080/count?url=https://www.sample3.com&recount=true" hx-trigger="click"
+                hx-target="#counts" hx-swap="outerHTML">
+                Recount
+            </button>
             <button class="counts-button" hx-get="http://localhost:8080/count?url=https://www.sample3.com&display=false" hx-trigger="click"
                 hx-target="#counts" hx-swap="outerHTML">
                 Close
@@ -158,3 +174,68 @@ def test_counts_html():
         </div>
     </div>
 </div>""")
+
+
+def test_counts_html_marks_approximate_counts():
+    word_counts = [
+        {
+            "word_count": 12,
+            "paginated_words_list": [['sample', 6]],
+            "current_page": 1,
+            "num_pages": 1,
+            "url": "https://www.sample1.com",
+            "display": True,
+            "is_approximate": True,
+        },
+    ]
+
+    assert "<th>Approximate count</th>" in counts_html(word_counts)
+
+
+def test_counts_html_marks_truncated_counts():
+    word_counts = [
+        {
+            "word_count": 12,
+            "paginated_words_list": [['sample', 6]],
+            "current_page": 1,
+            "num_pages": 1,
+            "url": "https://www.sample1.com",
+            "display": False,
+            "is_truncated": True,
+        },
+    ]
+
+    assert "<h4>https://www.sample1.com - 12 (truncated)</h4>" in counts_html(word_counts)
+
+
+def test_counts_html_marks_crawled_site_counts():
+    word_counts = [
+        {
+            "word_count": 12,
+            "paginated_words_list": [['sample', 6]],
+            "current_page": 1,
+            "num_pages": 1,
+            "url": "https://www.sample1.com",
+            "display": False,
+            "crawled_pages": 3,
+        },
+    ]
+
+    assert "<h4>https://www.sample1.com - 12 (3 pages)</h4>" in counts_html(word_counts)
+
+
+def test_counts_html_shows_errors_inline():
+    errors = {"https://www.sample2.com": "error fetching HTML"}
+
+    html = counts_html([], errors)
+
+    assert '<div class="count-error">' in html
+    assert "<h4>https://www.sample2.com - error fetching HTML</h4>" in html
+
+
+def test_pending_html_polls_for_the_job():
+    html = pending_html([], "abc123", "https://www.sample2.com", 1.5)
+
+    assert 'hx-get="http://localhost:8080/count/job?id=abc123"' in html
+    assert 'hx-trigger="load delay:1.5s"' in html
+    assert "<h4>https://www.sample2.com - counting...</h4>" in html
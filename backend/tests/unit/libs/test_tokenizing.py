@@ -0,0 +1,80 @@
+import re
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+from libs.counting import Parser
+from libs.tokenizing import WORD_PATTERN, count_words, tokenize
+
+fixtures_dir = Path(__file__).resolve().parent / '../' / '../' / 'fixtures'
+
+
+def legacy_tokenize(data):
+    """The original Parser.handle_data word rules, kept as the golden reference."""
+    final_list = []
+    for word in re.split(r"\s", data):
+        updated_word = re.sub("[.,!?]+$", "", word)
+        if not re.search("[^a-zA-Z0-9]", updated_word) and updated_word != "":
+            final_list.append(updated_word.lower())
+    return final_list
+
+
+class LegacyParser(Parser):
+    def handle_data(self, data):
+        if self.currently_opened_tags.count("body") == 1 and self.currently_opened_tags[-1] in self.accepted_html_tags:
+            words = legacy_tokenize(data)
+            self.words_list.update(words)
+            self.word_count += len(words)
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    "   ",
+    "Hello world",
+    "Sample text, sample text, sample text.",
+    "Wait... what?! Really!?",
+    "e.g. a.b c,d end.",
+    "don't stop-me now",
+    "tabs\tand\nnew\r\nlines\x0bvertical\x0cfeed",
+    "non\u00a0breaking\u2003em space\x1cseparator",
+    "caf\u00e9 na\u00efve \u212aelvin K",
+    "MiXeD CaSe 123 ABC123!!",
+    "trailing punctuation,,, ,. !?",
+    "(brackets) [square] {curly}",
+    "ascii\x1cfile\x1dgroup\x1erecord\x1funit separators",
+    "a..b ,x x, 9! !9 ...",
+])
+def test_it_tokenizes_the_same_as_the_legacy_rules(text):
+    assert tokenize(text) == legacy_tokenize(text)
+
+
+@pytest.mark.parametrize("text", [
+    "Sample text, sample text, sample text.",
+    "tabs\tand\nnew\r\nlines\x0bvertical\x0cfeed\x1cseparator",
+    "a..b ,x x, 9! !9 ... 1.5 A1b2!?",
+])
+def test_it_tokenizes_ascii_the_same_as_the_word_pattern(text):
+    assert tokenize(text) == WORD_PATTERN.findall(text.lower())
+
+
+def test_it_counts_words_into_a_counter():
+    counter = Counter({"sample": 1})
+
+    assert count_words("Sample text, sample!", counter) == 3
+    assert counter == Counter({"sample": 3, "text": 1})
+
+
+@pytest.mark.parametrize("fixture", ["sample1.html", "sample2.html"])
+def test_it_parses_fixtures_the_same_as_the_legacy_parser(fixture):
+    with open(fixtures_dir / fixture, 'r') as file:
+        sample_html = file.read()
+
+    parser = Parser()
+    parser.feed(sample_html)
+    legacy_parser = LegacyParser()
+    legacy_parser.feed(sample_html)
+
+    assert parser.word_count == legacy_parser.word_count
+    assert list(parser.words_list.items()) == list(
+        legacy_parser.words_list.items())
@@ -0,0 +1,192 @@
+import asyncio
+from unittest.mock import MagicMock, patch
+
+from async_main import AsyncHTTPRequestHandler
+from db.mongo import UrlError
+
+
+class TestableAsyncHTTPRequestHandler(AsyncHTTPRequestHandler):
+    def __init__(self):
+        self.send_header = MagicMock()
+        self.end_headers = MagicMock()
+        self.send_response = MagicMock()
+        self.wfile = MagicMock()
+        self.requestline = "request line"
+        self.client_address = "client address"
+        self.request_version = "1"
+        self.command = "GET"
+        self.headers = {}
+        self.mongo_client = {}
+        self.fetch_client = MagicMock()
+
+
+def assert_response(handler, code, content=None):
+    handler.send_response.assert_called_once_with(code)
+    handler.send_header.assert_any_call("Access-Control-Allow-Origin", "*")
+    handler.send_header.assert_any_call(
+        "Access-Control-Allow-Methods", "GET, OPTIONS")
+    handler.send_header.assert_any_call(
+        "Cache-Control", "no-cache, no-store, must-revalidate")
+    handler.end_headers.assert_called_once()
+    if content is not None:
+        handler.wfile.write.assert_called_once_with(content)
+
+
+def test_it_responds_with_options():
+    handler = TestableAsyncHTTPRequestHandler()
+
+    asyncio.run(handler.do_OPTIONS())
+
+    assert_response(handler, 204)
+    handler.wfile.write.assert_not_called()
+
+
+def test_it_responds_with_reset_html():
+    handler = TestableAsyncHTTPRequestHandler()
+
+    handler.path = "/reset"
+    result = "<div>mock reset template</div>"
+
+    with patch("async_main.reset_html", return_value=result):
+        asyncio.run(handler.do_GET())
+
+    assert_response(handler, 200, result.encode("utf-8"))
+
+
+def test_it_responds_with_error_html_when_reset_templating_exception_occurs():
+    handler = TestableAsyncHTTPRequestHandler()
+
+    handler.path = "/reset"
+
+    with patch("async_main.reset_html", side_effect=Exception("reset template error")):
+        asyncio.run(handler.do_GET())
+
+    assert_response(
+        handler, 500,
+        b"Exception during rendering of reset_form_template: reset template error")
+
+
+def test_it_responds_with_counts_html():
+    handler = TestableAsyncHTTPRequestHandler()
+
+    handler.path = "/count?url=https://www.example.com"
+    result = "<div>mock counts</div>"
+
+    with patch("async_main.add_new_count") as mock_add_new_count:
+        with patch("async_main.get_counts", return_value=[]):
+            with patch("async_main.counts_html", return_value=result):
+                asyncio.run(handler.do_GET())
+
+    mock_add_new_count.assert_awaited_once_with(
+        "https://www.example.com", handler.mongo_client, handler.fetch_client,
+        counting_pool=None, parse_cache=None)
+    assert_response(handler, 200, result.encode("utf-8"))
+
+
+def test_it_responds_with_error_html_when_add_new_count_url_error_occurs():
+    handler = TestableAsyncHTTPRequestHandler()
+
+    handler.path = "/count?url=https://www.example.com"
+
+    with patch("async_main.add_new_count", side_effect=UrlError("URL error", 400)):
+        asyncio.run(handler.do_GET())
+
+    assert_response(handler, 400, b"UrlError during addition of new URL count: URL error")
+
+
+def test_it_responds_with_error_html_when_add_new_count_exception_occurs():
+    handler = TestableAsyncHTTPRequestHandler()
+
+    handler.path = "/count?url=https://www.example.com"
+
+    with patch("async_main.add_new_count", side_effect=Exception("exception")):
+        asyncio.run(handler.do_GET())
+
+    assert_response(handler, 500, b"Exception during addition of new URL count: exception")
+
+
+def test_it_updates_the_page():
+    handler = TestableAsyncHTTPRequestHandler()
+
+    handler.path = "/count?url=https://www.example.com&page=2"
+
+    with patch("async_main.update_page") as mock_update_page:
+        with patch("async_main.get_counts", return_value=[]):
+            with patch("async_main.counts_html", return_value="<div>counts</div>"):
+                asyncio.run(handler.do_GET())
+
+    mock_update_page.assert_awaited_once_with(
+        "https://www.example.com", 2, handler.mongo_client)
+    assert_response(handler, 200, b"<div>counts</div>")
+
+
+def test_it_responds_with_error_html_when_update_page_url_error_occurs():
+    handler = TestableAsyncHTTPRequestHandler()
+
+    handler.path = "/count?url=https://www.example.com&page=2"
+
+    with patch("async_main.update_page", side_effect=UrlError("URL error", 500)):
+        asyncio.run(handler.do_GET())
+
+    assert_response(handler, 500, b"UrlError during updating of page: URL error")
+
+
+def test_it_responds_with_error_html_when_update_display_exception_occurs():
+    handler = TestableAsyncHTTPRequestHandler()
+
+    handler.path = "/count?url=https://www.example.com&display=false"
+
+    with patch("async_main.update_display", side_effect=Exception("exception")) as mock_display:
+        asyncio.run(handler.do_GET())
+
+    mock_display.assert_awaited_once_with(
+        "https://www.example.com", False, handler.mongo_client)
+    assert_response(handler, 500, b"Exception during updating of display: exception")
+
+
+def test_it_responds_with_error_html_when_recount_url_error_occurs():
+    handler = TestableAsyncHTTPRequestHandler()
+
+    handler.path = "/count?url=https://www.example.com&recount=true"
+
+    with patch("async_main.recount", side_effect=UrlError("URL error", 400)) as mock_recount:
+        asyncio.run(handler.do_GET())
+
+    mock_recount.assert_awaited_once_with(
+        "https://www.example.com", handler.mongo_client, handler.fetch_client,
+        counting_pool=None, parse_cache=None)
+    assert_response(handler, 400, b"UrlError during recount of URL: URL error")
+
+
+def test_it_responds_with_error_html_when_get_counts_url_error_occurs():
+    handler = TestableAsyncHTTPRequestHandler()
+
+    handler.path = "/count?url=https://www.example.com"
+
+    with patch("async_main.add_new_count"):
+        with patch("async_main.get_counts", side_effect=UrlError("URL error", 500)):
+            asyncio.run(handler.do_GET())
+
+    assert_response(handler, 500, b"UrlError during getting of all counts: URL error")
+
+
+def test_it_responds_with_metrics():
+    handler = TestableAsyncHTTPRequestHandler()
+
+    handler.path = "/metrics"
+
+    with patch("async_main.metrics") as mock_metrics:
+        mock_metrics.snapshot.return_value = {"parse_cache.hits": 1}
+        asyncio.run(handler.do_GET())
+
+    assert_response(handler, 200, b'{"parse_cache.hits": 1}')
+
+
+def test_it_responds_with_error_html_when_404_not_found():
+    handler = TestableAsyncHTTPRequestHandler()
+
+    handler.path = "/count/batch?urls=https://www.example.com"
+
+    asyncio.run(handler.do_GET())
+
+    assert_response(handler, 404, b"Not Found")
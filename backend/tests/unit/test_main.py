@@ -1,7 +1,13 @@
+import gzip
+import http.client
+import threading
 from unittest.mock import MagicMock, patch
 
 from main import HTTPRequestHandler
 from db.mongo import UrlError
+from libs.compression import ResponseCompressor
+from libs.jobs import DONE, JobError, JobQueue, JobStore
+from libs.serving import PooledHTTPServer
 
 
 class TestableHTTPRequestHandler(HTTPRequestHandler):
@@ -13,10 +19,19 @@ class TestableHTTPRequestHandler(HTTPRequestHandler):
         self.requestline = "request line"
         self.client_address = "client address"
         self.request_version = "1"
+        self.command = "GET"
+        self.close_connection = False
+        self.server = MagicMock(spec=PooledHTTPServer)
+        self.server.has_waiting_connections.return_value = False
         self.headers = {}
         self.mongo_client = {}
 
 
+class QuietHTTPRequestHandler(HTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
 def test_it_completes_response_with_no_content():
     handler = TestableHTTPRequestHandler()
 
@@ -43,16 +58,91 @@ def test_it_completes_response_with_content():
         "Access-Control-Allow-Methods", "GET, OPTIONS")
     handler.send_header.assert_any_call(
         "Cache-Control", "no-cache, no-store, must-revalidate")
+    handler.send_header.assert_any_call("Content-Length", "7")
     handler.end_headers.assert_called_once()
     handler.wfile.write.assert_called_once_with(content)
 
 
+def test_it_completes_response_with_compressed_content():
+    handler = TestableHTTPRequestHandler()
+    handler.response_compressor = ResponseCompressor(min_size=10, max_entries=0)
+    handler.headers = {"Accept-Encoding": "gzip"}
+
+    content = b"content " * 100
+    handler.complete_response(200, content)
+
+    body = handler.wfile.write.call_args.args[0]
+    assert gzip.decompress(body) == content
+    handler.send_header.assert_any_call("Content-Encoding", "gzip")
+    handler.send_header.assert_any_call("Content-Length", str(len(body)))
+    handler.send_header.assert_any_call("Vary", "Accept-Encoding")
+
+
+def test_it_completes_response_with_uncompressed_content_when_not_accepted():
+    handler = TestableHTTPRequestHandler()
+    handler.response_compressor = ResponseCompressor(min_size=10, max_entries=0)
+
+    content = b"content " * 100
+    handler.complete_response(200, content)
+
+    handler.wfile.write.assert_called_once_with(content)
+    handler.send_header.assert_any_call("Vary", "Accept-Encoding")
+    assert "Content-Encoding" not in [call.args[0] for call in handler.send_header.call_args_list]
+
+
+def test_it_keeps_the_connection_alive():
+    handler = TestableHTTPRequestHandler()
+
+    handler.complete_response(200, b"content")
+
+    handler.send_header.assert_any_call("Connection", "keep-alive")
+    handler.send_header.assert_any_call("Keep-Alive", "timeout=5, max=99")
+
+
+def test_it_closes_the_connection_after_the_maximum_requests():
+    handler = TestableHTTPRequestHandler()
+    handler.requests_handled = 99
+
+    handler.complete_response(200, b"content")
+
+    handler.send_header.assert_any_call("Connection", "close")
+
+
+def test_it_closes_the_connection_when_connections_are_waiting():
+    handler = TestableHTTPRequestHandler()
+    handler.server.has_waiting_connections.return_value = True
+
+    handler.complete_response(200, b"content")
+
+    handler.send_header.assert_any_call("Connection", "close")
+
+
+def test_it_closes_the_connection_when_the_request_has_a_body():
+    handler = TestableHTTPRequestHandler()
+    handler.headers = {"Content-Length": "12"}
+
+    handler.complete_response(200, b"content")
+
+    handler.send_header.assert_any_call("Connection", "close")
+
+
+def test_it_completes_unavailable_responses_with_retry_after():
+    handler = TestableHTTPRequestHandler()
+
+    handler.complete_response(503, b"counting pool is full")
+
+    handler.send_response.assert_called_once_with(503)
+    handler.send_header.assert_any_call("Retry-After", "1")
+
+
 def test_it_responds_with_options():
     handler = TestableHTTPRequestHandler()
 
+    handler.command = "OPTIONS"
     handler.do_OPTIONS()
 
     handler.send_response.assert_called_once_with(204)
+    handler.send_header.assert_any_call("Access-Control-Max-Age", "600")
     handler.send_header.assert_any_call("Access-Control-Allow-Origin", "*")
     handler.send_header.assert_any_call(
         "Access-Control-Allow-Methods", "GET, OPTIONS")
@@ -227,6 +317,23 @@ def test_it_responds_with_error_html_when_update_display_exception_occurs():
         handler.wfile.write.assert_called_once_with(error)
 
 
+def test_it_responds_with_error_html_when_recount_url_error_occurs():
+    handler = TestableHTTPRequestHandler()
+
+    handler.path = "/count?url=https://www.example.com&recount=true"
+
+    with patch("main.recount", side_effect=UrlError("URL error", 400)) as mock_recount:
+        handler.do_GET()
+
+        error = "UrlError during recount of URL: URL error".encode("utf-8")
+
+        mock_recount.assert_called_once()
+        assert mock_recount.call_args.args[0] == "https://www.example.com"
+        handler.send_response.assert_called_once_with(400)
+        handler.end_headers.assert_called_once()
+        handler.wfile.write.assert_called_once_with(error)
+
+
 def test_it_responds_with_error_html_when_get_counts_url_error_occurs():
     handler = TestableHTTPRequestHandler()
 
@@ -296,6 +403,177 @@ def test_it_responds_with_counts_html():
                     result.encode("utf-8"))
 
 
+def test_it_responds_with_batch_counts_html():
+    handler = TestableHTTPRequestHandler()
+
+    handler.path = "/count/batch?urls=https%3A%2F%2Fwww.example.com%0Ahttps%3A%2F%2Fwww.example.org"
+    errors = {"https://www.example.org": "error fetching HTML"}
+    result = "<div>mock counts</div>"
+
+    with patch("main.add_new_counts", return_value=errors) as mock_add_new_counts:
+        with patch("main.get_counts", return_value=[]):
+            with patch("main.counts_html", return_value=result) as mock_counts_html:
+                handler.do_GET()
+
+    assert mock_add_new_counts.call_args.args[0] == [
+        "https://www.example.com", "https://www.example.org"]
+    mock_counts_html.assert_called_once_with([], errors)
+    handler.send_response.assert_called_once_with(200)
+    handler.wfile.write.assert_called_once_with(result.encode("utf-8"))
+
+
+def test_it_responds_with_error_html_when_batch_has_no_urls():
+    handler = TestableHTTPRequestHandler()
+
+    handler.path = "/count/batch?urls="
+
+    with patch("main.add_new_counts") as mock_add_new_counts:
+        handler.do_GET()
+
+    mock_add_new_counts.assert_not_called()
+    handler.send_response.assert_called_once_with(400)
+
+
+def test_it_responds_with_pending_html_when_counting_in_a_job():
+    handler = TestableHTTPRequestHandler()
+    handler.job_queue = JobQueue(max_workers=1, max_queue=0, store=JobStore(timeout=60))
+
+    handler.path = "/count?url=https://www.example.com"
+    result = "<div>mock pending counts</div>"
+
+    with patch("main.add_new_count") as mock_add_new_count:
+        with patch("main.get_counts", return_value=[]):
+            with patch("main.pending_html", return_value=result) as mock_pending_html:
+                handler.do_GET()
+                handler.job_queue.close()
+
+    assert mock_add_new_count.call_args.args == ("https://www.example.com", {})
+    job_id = mock_pending_html.call_args.args[1]
+    assert mock_pending_html.call_args.args[2] == "https://www.example.com"
+    assert handler.job_queue.store.get(job_id).status == DONE
+    handler.send_response.assert_called_once_with(200)
+    handler.wfile.write.assert_called_once_with(result.encode("utf-8"))
+
+
+def test_it_responds_with_pending_html_while_a_job_is_pending():
+    handler = TestableHTTPRequestHandler()
+    handler.job_queue = JobQueue(max_workers=1, max_queue=0, store=JobStore(timeout=60))
+    job = handler.job_queue.store.add("https://www.example.com")
+
+    handler.path = f"/count/job?id={job.id}"
+
+    with patch("main.get_counts", return_value=[]):
+        with patch("main.pending_html", return_value="<div>pending</div>") as mock_pending_html:
+            handler.do_GET()
+
+    mock_pending_html.assert_called_once_with([], job.id, "https://www.example.com", 1)
+    handler.send_response.assert_called_once_with(200)
+
+
+def test_it_responds_with_counts_html_when_a_job_is_done():
+    handler = TestableHTTPRequestHandler()
+    handler.job_queue = JobQueue(max_workers=1, max_queue=0, store=JobStore(timeout=60))
+    job = handler.job_queue.store.add("https://www.example.com")
+    handler.job_queue.store.finish(job.id)
+
+    handler.path = f"/count/job?id={job.id}"
+
+    with patch("main.get_counts", return_value=[]):
+        with patch("main.counts_html", return_value="<div>counts</div>"):
+            handler.do_GET()
+
+    handler.send_response.assert_called_once_with(200)
+    handler.wfile.write.assert_called_once_with(b"<div>counts</div>")
+
+
+def test_it_responds_with_error_html_when_a_job_failed():
+    handler = TestableHTTPRequestHandler()
+    handler.job_queue = JobQueue(max_workers=1, max_queue=0, store=JobStore(timeout=60))
+    job = handler.job_queue.store.add("https://www.example.com")
+    handler.job_queue.store.finish(job.id, JobError("URL error", 400))
+
+    handler.path = f"/count/job?id={job.id}"
+
+    with patch("main.get_counts", return_value=[]):
+        with patch("main.counts_html", return_value="<div>error</div>") as mock_counts_html:
+            handler.do_GET()
+
+    mock_counts_html.assert_called_once_with([], {"https://www.example.com": "URL error"})
+    handler.send_response.assert_called_once_with(200)
+    handler.wfile.write.assert_called_once_with(b"<div>error</div>")
+
+
+def test_it_responds_with_error_html_when_the_job_queue_is_full():
+    handler = TestableHTTPRequestHandler()
+    handler.job_queue = JobQueue(max_workers=1, max_queue=0, store=JobStore(timeout=60))
+    release = threading.Event()
+    handler.job_queue.submit("https://www.example.com/stuck", release.wait)
+
+    handler.path = "/count?url=https://www.example.com"
+    try:
+        with patch("main.add_new_count") as mock_add_new_count:
+            handler.do_GET()
+    finally:
+        release.set()
+        handler.job_queue.close()
+
+    mock_add_new_count.assert_not_called()
+    handler.send_response.assert_called_once_with(503)
+    handler.send_header.assert_any_call("Retry-After", "1")
+    handler.wfile.write.assert_called_once_with(b"count job queue is full")
+
+
+def test_it_responds_with_error_html_when_a_job_is_not_found():
+    handler = TestableHTTPRequestHandler()
+
+    handler.path = "/count/job?id=unknown"
+    handler.do_GET()
+
+    handler.send_response.assert_called_once_with(404)
+
+
+def test_it_responds_with_crawled_counts_html():
+    handler = TestableHTTPRequestHandler()
+
+    handler.path = "/count/crawl?url=https%3A%2F%2Fwww.example.com"
+    errors = {"https://www.example.com/missing": "error fetching HTML"}
+
+    with patch("main.crawl_site", return_value=errors) as mock_crawl_site:
+        with patch("main.get_counts", return_value=[]):
+            with patch("main.counts_html", return_value="<div>counts</div>") as mock_counts_html:
+                handler.do_GET()
+
+    assert mock_crawl_site.call_args.args[0] == "https://www.example.com"
+    mock_counts_html.assert_called_once_with([], errors)
+    handler.send_response.assert_called_once_with(200)
+
+
+def test_it_responds_with_error_html_when_crawl_url_error_occurs():
+    handler = TestableHTTPRequestHandler()
+
+    handler.path = "/count/crawl?url=https://www.example.com"
+
+    with patch("main.crawl_site", side_effect=UrlError("URL error", 400)):
+        handler.do_GET()
+
+    handler.send_response.assert_called_once_with(400)
+    handler.wfile.write.assert_called_once_with(
+        "UrlError during crawl of URL: URL error".encode("utf-8"))
+
+
+def test_it_responds_with_metrics():
+    handler = TestableHTTPRequestHandler()
+
+    handler.path = "/metrics"
+
+    with patch("main.metrics") as mock_metrics:
+        mock_metrics.snapshot.return_value = {"parse_cache.hit": 2}
+        handler.do_GET()
+
+    handler.send_response.assert_called_once_with(200)
+    handler.wfile.write.assert_called_once_with(b'{"parse_cache.hit": 2}')
+
+
 def test_it_responds_with_error_html_when_404_not_found():
     handler = TestableHTTPRequestHandler()
 
@@ -312,3 +590,29 @@ def test_it_responds_with_error_html_when_404_not_found():
         "Cache-Control", "no-cache, no-store, must-revalidate")
     handler.end_headers.assert_called_once()
     handler.wfile.write.assert_called_once_with("Not Found".encode("utf-8"))
+
+
+def test_it_serves_requests_on_a_kept_alive_connection():
+    server = PooledHTTPServer(
+        ("127.0.0.1", 0),
+        lambda *args, **kwargs: QuietHTTPRequestHandler(*args, mongo_client={}, **kwargs),
+        max_workers=2, max_queue=2, backlog=16, retry_after=1)
+    threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True).start()
+    connection = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=5)
+    try:
+        responses = []
+        sockets = []
+        for _ in range(2):
+            connection.request("GET", "/reset")
+            response = connection.getresponse()
+            responses.append((response.status, response.getheader("Connection"),
+                              len(response.read()) == int(response.getheader("Content-Length"))))
+            sockets.append(connection.sock)
+
+        assert responses == [(200, "keep-alive", True)] * 2
+        # The second response came over the same socket as the first.
+        assert sockets[0] is not None and sockets[0] is sockets[1]
+    finally:
+        connection.close()
+        server.shutdown()
+        server.server_close()